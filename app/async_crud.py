@@ -0,0 +1,159 @@
+import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, models, schemas
+
+# VARIANTES ASSÍNCRONAS DAS FUNÇÕES DE crud.py. A LÓGICA CONTINUA EM UM ÚNICO LUGAR: CADA FUNÇÃO
+# EXECUTA A VERSÃO SÍNCRONA VIA AsyncSession.run_sync, E O I/O COM O BANCO PASSA PELO DRIVER ASSÍNCRONO.
+# OS OBJETOS DEVOLVIDOS JÁ VÊM COM OS ATRIBUTOS NECESSÁRIOS CARREGADOS (LAZY LOAD FORA DO run_sync FALHA).
+
+
+async def get_active_documents(db: AsyncSession) -> list[models.MonitoredDocument]:
+    return await db.run_sync(crud.get_active_documents)
+
+
+async def get_active_documents_from_id(db: AsyncSession, start_id: int) -> list[models.MonitoredDocument]:
+    return await db.run_sync(crud.get_active_documents_from_id, start_id)
+
+
+async def get_active_documents_page(db: AsyncSession, limit: int, after_id: int | None = None) -> list[models.MonitoredDocument]:
+    return await db.run_sync(crud.get_active_documents_page, limit, after_id)
+
+
+async def get_latest_analyses_for_documents(db: AsyncSession, document_ids: list[int], per_document: int, include_payload: bool = False, max_analysis_id: int | None = None) -> dict[int, list[models.Analysis]]:
+    return await db.run_sync(crud.get_latest_analyses_for_documents, document_ids, per_document, include_payload, max_analysis_id)
+
+
+async def get_last_two_analyses_for_documents(db: AsyncSession, document_ids: list[int], include_payload: bool = True) -> dict[int, list[models.Analysis]]:
+    return await db.run_sync(crud.get_last_two_analyses_for_documents, document_ids, include_payload)
+
+
+async def get_max_analysis_id(db: AsyncSession) -> int:
+    return await db.run_sync(crud.get_max_analysis_id)
+
+
+async def create_analysis(db: AsyncSession, document_id: int, analysis_data: dict, unique_id: int, analytics_id: int) -> models.Analysis:
+    return await db.run_sync(crud.create_analysis, document_id, analysis_data, unique_id, analytics_id)
+
+
+async def get_last_two_analyses(db: AsyncSession, document_id: int) -> list[models.Analysis]:
+    return await db.run_sync(crud.get_last_two_analyses, document_id)
+
+
+async def update_analysis_with_summary(db: AsyncSession, analysis_id: int, summary: str, usage: dict):
+    return await db.run_sync(crud.update_analysis_with_summary, analysis_id, summary, usage)
+
+
+async def create_monitored_document(db: AsyncSession, doc: schemas.MonitoredDocumentCreate) -> models.MonitoredDocument:
+    return await db.run_sync(crud.create_monitored_document, doc)
+
+
+async def get_document(db: AsyncSession, document_id: int) -> models.MonitoredDocument | None:
+    return await db.run_sync(crud.get_document, document_id)
+
+
+async def get_due_documents(db: AsyncSession, now: datetime.datetime, limit: int) -> list[models.MonitoredDocument]:
+    return await db.run_sync(crud.get_due_documents, now, limit)
+
+
+async def get_unscheduled_documents(db: AsyncSession, limit: int) -> list[models.MonitoredDocument]:
+    return await db.run_sync(crud.get_unscheduled_documents, limit)
+
+
+async def schedule_documents(db: AsyncSession, next_runs: dict[int, datetime.datetime]) -> int:
+    return await db.run_sync(crud.schedule_documents, next_runs)
+
+
+async def get_jobs_since(db: AsyncSession, since_by_document: dict[int, datetime.datetime]) -> dict[int, dict[str, int]]:
+    return await db.run_sync(crud.get_jobs_since, since_by_document)
+
+
+async def update_document_cadence(db: AsyncSession, document_id: int, cadence_days: int | None, next_run_at: datetime.datetime) -> models.MonitoredDocument | None:
+    return await db.run_sync(crud.update_document_cadence, document_id, cadence_days, next_run_at)
+
+
+async def claim_document_leases(db: AsyncSession, document_ids: list[int], owner: str, now: datetime.datetime, expires_at: datetime.datetime) -> set[int]:
+    return await db.run_sync(crud.claim_document_leases, document_ids, owner, now, expires_at)
+
+
+async def renew_document_leases(db: AsyncSession, document_ids: list[int], owner: str, expires_at: datetime.datetime) -> set[int]:
+    return await db.run_sync(crud.renew_document_leases, document_ids, owner, expires_at)
+
+
+async def release_document_leases(db: AsyncSession, document_ids: list[int], owner: str) -> int:
+    return await db.run_sync(crud.release_document_leases, document_ids, owner)
+
+
+async def get_document_by_number(db: AsyncSession, document_number: str) -> models.MonitoredDocument | None:
+    return await db.run_sync(crud.get_document_by_number, document_number)
+
+
+async def get_document_ids_by_numbers(db: AsyncSession, document_numbers: set[str]) -> dict[str, int]:
+    return await db.run_sync(crud.get_document_ids_by_numbers, document_numbers)
+
+
+async def get_analysis_ids_by_analytics_ids(db: AsyncSession, analytics_ids: set[int]) -> dict[int, int]:
+    return await db.run_sync(crud.get_analysis_ids_by_analytics_ids, analytics_ids)
+
+
+async def get_existing_analytics_ids(db: AsyncSession, analytics_ids: set[int]) -> set[int]:
+    return await db.run_sync(crud.get_existing_analytics_ids, analytics_ids)
+
+
+async def get_backfill_checkpoint(db: AsyncSession, source: str) -> int:
+    return await db.run_sync(crud.get_backfill_checkpoint, source)
+
+
+async def save_backfill_checkpoint(db: AsyncSession, source: str, rows_done: int) -> models.BackfillCheckpoint:
+    return await db.run_sync(crud.save_backfill_checkpoint, source, rows_done)
+
+
+async def create_analysis_job(db: AsyncSession, document_id: int, analytics_id: int, unique_id: int, compare: bool = True) -> models.AnalysisJob:
+    return await db.run_sync(crud.create_analysis_job, document_id, analytics_id, unique_id, compare)
+
+
+async def update_analysis_job(db: AsyncSession, job_id: int, stage: str, **fields) -> models.AnalysisJob | None:
+    return await db.run_sync(lambda sync_db: crud.update_analysis_job(sync_db, job_id, stage, **fields))
+
+
+async def get_analysis_job(db: AsyncSession, job_id: int) -> models.AnalysisJob | None:
+    return await db.run_sync(crud.get_analysis_job, job_id)
+
+
+async def get_unfinished_analysis_jobs(db: AsyncSession) -> list[models.AnalysisJob]:
+    return await db.run_sync(crud.get_unfinished_analysis_jobs)
+
+
+async def get_document_ids_with_unfinished_jobs(db: AsyncSession) -> set[int]:
+    return await db.run_sync(crud.get_document_ids_with_unfinished_jobs)
+
+
+async def persist_analysis_batch(db: AsyncSession, new_analyses: list[dict], summaries: list[dict]) -> list[int]:
+    return await db.run_sync(crud.persist_analysis_batch, new_analyses, summaries)
+
+
+async def get_analyses_with_failed_sections(db: AsyncSession, limit: int, after_id: int = 0, max_attempts: int | None = None) -> list[models.Analysis]:
+    return await db.run_sync(crud.get_analyses_with_failed_sections, limit, after_id, max_attempts)
+
+
+async def save_repaired_sections(db: AsyncSession, analysis_id: int, repaired: dict, failed_sections: list[str]) -> models.Analysis | None:
+    return await db.run_sync(crud.save_repaired_sections, analysis_id, repaired, failed_sections)
+
+
+async def record_repair_attempt(db: AsyncSession, analysis_id: int):
+    return await db.run_sync(crud.record_repair_attempt, analysis_id)
+
+
+async def get_comparison_cache_entry(db: AsyncSession, cache_key: str) -> models.ComparisonCacheEntry | None:
+    return await db.run_sync(crud.get_comparison_cache_entry, cache_key)
+
+
+async def save_comparison_cache_entry(db: AsyncSession, cache_key: str, document: str, summary: dict, usage: dict | None) -> models.ComparisonCacheEntry:
+    return await db.run_sync(crud.save_comparison_cache_entry, cache_key, document, summary, usage)
+
+
+async def evict_comparison_cache(db: AsyncSession, max_age_days: int, max_rows: int) -> int:
+    return await db.run_sync(crud.evict_comparison_cache, max_age_days, max_rows)
+
+
+async def compact_inline_analyses(db: AsyncSession, batch_size: int = 200) -> int:
+    return await db.run_sync(crud.compact_inline_analyses, batch_size)
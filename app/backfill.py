@@ -0,0 +1,115 @@
+import asyncio
+import csv
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterator
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .logs import log_context, new_trace_id
+from .persistence import AnalysisWriter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillRecord:
+    row: int
+    analytics_id: int
+    consume_unique_id: int
+    document: str
+
+
+def read_csv_chunks(path: str, chunk_size: int, skip_rows: int = 0) -> Iterator[list[BackfillRecord]]:
+    # LÊ O CSV EM STREAMING: SÓ UM LOTE FICA EM MEMÓRIA. O DOCUMENTO É MANTIDO COMO TEXTO (ZEROS À ESQUERDA)
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        chunk = []
+        for row, line in enumerate(csv.DictReader(csv_file)):
+            if row < skip_rows:
+                continue
+            chunk.append(BackfillRecord(
+                row=row,
+                analytics_id=int(line["analytics_id"]),
+                consume_unique_id=int(line["consume_unique_id"]),
+                document=str(line["document"]).strip(),
+            ))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class BackfillEngine:
+    def __init__(self, tratum_service, writer: AnalysisWriter, concurrency: int | None = None, chunk_size: int | None = None):
+        self.tratum_service = tratum_service
+        self.writer = writer
+        self.concurrency = concurrency or settings.BACKFILL_CONCURRENCY
+        self.chunk_size = chunk_size or settings.BACKFILL_CHUNK_SIZE
+        self.progress: dict[str, dict] = {}
+
+    async def _process(self, record: BackfillRecord, document_ids: dict[str, int], existing: set[int], semaphore: asyncio.Semaphore) -> str:
+        document_id = document_ids.get(record.document)
+        if document_id is None:
+            logger.warning("Documento %s não encontrado na tabela 'monitored_documents'. Pulando.", record.document)
+            return "skipped"
+        if record.analytics_id in existing:
+            return "already_stored"
+        async with semaphore:
+            result_data = await self.tratum_service.fetch_existing_analysis(
+                analytics_id=record.analytics_id,
+                consume_unique_id=record.consume_unique_id,
+                document_number=record.document
+            )
+        if not result_data or not result_data.get("analysis_json"):
+            logger.warning("Não foi possível buscar os dados da análise ID %s (linha %s). Pulando.", record.analytics_id, record.row + 1)
+            return "failed"
+        await self.writer.add_analysis(
+            job_id=None,
+            document_id=document_id,
+            analysis_data=result_data["analysis_json"],
+            unique_id=result_data["unique_id"],
+            analytics_id=result_data["analytics_id"],
+            failed_sections=result_data.get("failed_sections")
+        )
+        logger.info("Análise do documento %s (ID: %s) salva.", record.document, record.analytics_id)
+        return "processed"
+
+    async def run_csv(self, path: str, restart: bool = False) -> dict:
+        # O CHECKPOINT SÓ AVANÇA QUANDO O LOTE INTEIRO TERMINA; LINHAS JÁ GRAVADAS SÃO RECONHECIDAS PELO analytics_id,
+        # ENTÃO RETOMAR NO MEIO DE UM LOTE NÃO DUPLICA ANÁLISES
+        source = f"csv:{path}"
+        async with AsyncSessionLocal() as db:
+            if restart:
+                await async_crud.save_backfill_checkpoint(db, source, 0)
+            start_row = await async_crud.get_backfill_checkpoint(db, source)
+        stats = {"source": source, "start_row": start_row, "rows_done": start_row, "processed": 0, "already_stored": 0, "skipped": 0, "failed": 0}
+        self.progress[source] = stats
+        if start_row:
+            logger.info("[BACKFILL] Retomando %s a partir da linha %s", source, start_row + 1)
+        logger.info("[BACKFILL] Iniciando %s com concorrência %s", source, self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.monotonic()
+        for chunk in read_csv_chunks(path, self.chunk_size, skip_rows=start_row):
+            async with AsyncSessionLocal() as db:
+                document_ids = await async_crud.get_document_ids_by_numbers(db, {record.document for record in chunk})
+                existing = await async_crud.get_existing_analytics_ids(db, {record.analytics_id for record in chunk})
+            tasks = []
+            for record in chunk:
+                # CADA TASK COPIA O CONTEXTO NA CRIAÇÃO: UM TRACE POR LINHA DO CSV
+                with log_context(trace_id=new_trace_id(), document=record.document):
+                    tasks.append(asyncio.create_task(self._process(record, document_ids, existing, semaphore)))
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for record, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    logger.error("Erro no backfill da análise ID %s (linha %s) -> %s", record.analytics_id, record.row + 1, result)
+                    result = "failed"
+                stats[result] += 1
+            stats["rows_done"] = chunk[-1].row + 1
+            async with AsyncSessionLocal() as db:
+                await async_crud.save_backfill_checkpoint(db, source, stats["rows_done"])
+            logger.info("[BACKFILL] %s: %s linhas concluídas (%s gravadas, %s com erro)", source, stats["rows_done"], stats["processed"], stats["failed"])
+        stats["elapsed_seconds"] = round(time.monotonic() - start, 2)
+        logger.info("[BACKFILL] Finalizado %s", source, extra={"stats": stats})
+        return stats
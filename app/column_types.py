@@ -0,0 +1,83 @@
+import json
+import zlib
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects import mysql
+from sqlalchemy.types import TypeDecorator
+from .config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZLIB_FIRST_BYTE = 0x78
+CODECS = ("zstd", "zlib", "none")
+
+
+def check_codec(codec: str | None = None):
+    # VALIDADO NA SUBIDA: SEM FALLBACK SILENCIOSO PARA zlib, E UMA RÉPLICA SEM 'zstandard' NÃO GRAVA NEM LÊ PELA METADE
+    codec = codec or settings.JSON_COMPRESSION_CODEC
+    if codec not in CODECS:
+        raise RuntimeError(f"JSON_COMPRESSION_CODEC inválido: '{codec}' (use {', '.join(CODECS)}).")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("JSON_COMPRESSION_CODEC=zstd, mas o pacote 'zstandard' não está instalado.")
+
+
+def compress_json(value, codec: str | None = None, level: int | None = None) -> bytes:
+    codec = codec or settings.JSON_COMPRESSION_CODEC
+    level = settings.JSON_COMPRESSION_LEVEL if level is None else level
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("JSON_COMPRESSION_CODEC=zstd, mas o pacote 'zstandard' não está instalado.")
+        return zstandard.ZstdCompressor(level=level).compress(raw)
+    if codec == "none":
+        return raw
+    return zlib.compress(raw, level)
+
+
+def decompress_json(data: bytes | str):
+    # O FORMATO É DETECTADO PELO CABEÇALHO, ENTÃO LINHAS EM TEXTO PURO (ANTERIORES À MIGRAÇÃO) CONTINUAM LEGÍVEIS
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("Payload comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+        return json.loads(zstandard.ZstdDecompressor().decompress(data))
+    if data and data[0] == ZLIB_FIRST_BYTE:
+        return json.loads(zlib.decompress(data))
+    return json.loads(data)
+
+
+def is_compressed(data: bytes | str | None) -> bool:
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        return False
+    data = bytes(data[:4])
+    return data.startswith(ZSTD_MAGIC) or (bool(data) and data[0] == ZLIB_FIRST_BYTE)
+
+
+class CompressedJSON(TypeDecorator):
+    # JSON GRAVADO COMPRIMIDO (zstd OU zlib) EM UMA COLUNA BINÁRIA
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, codec: str | None = None):
+        super().__init__()
+        self.codec = codec
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(mysql.LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_json(value, self.codec)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_json(value)
@@ -0,0 +1,67 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .diff import canonical, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class ComparisonCache:
+    def __init__(self, memory_entries: int | None = None, max_rows: int | None = None, max_age_days: int | None = None):
+        self.memory_entries = memory_entries or settings.COMPARISON_CACHE_MEMORY_ENTRIES
+        self.max_rows = max_rows or settings.COMPARISON_CACHE_MAX_ROWS
+        self.max_age_days = max_age_days or settings.COMPARISON_CACHE_MAX_AGE_DAYS
+        self._memory: OrderedDict[str, tuple[dict, dict | None]] = OrderedDict()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+    @staticmethod
+    def make_key(document: str, old_data: dict, new_data: dict, prompt_version: str) -> str:
+        # HASH CANÔNICO: OS RELATÓRIOS SÃO NORMALIZADOS PARA QUE CAMPOS VOLÁTEIS NÃO ALTEREM A CHAVE
+        payload = canonical([str(document), normalize(old_data), normalize(new_data), prompt_version])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: tuple[dict, dict | None]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> tuple[dict, dict | None] | None:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return self._memory[key]
+        async with AsyncSessionLocal() as db:
+            entry = await async_crud.get_comparison_cache_entry(db, key)
+            value = (entry.summary, entry.usage) if entry else None
+        if value is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["db_hits"] += 1
+        self._remember(key, value)
+        return value
+
+    async def set(self, key: str, document: str, summary: dict, usage: dict | None):
+        self._remember(key, (summary, usage))
+        async with AsyncSessionLocal() as db:
+            await async_crud.save_comparison_cache_entry(db, key, document, summary, usage)
+        self.counters["stores"] += 1
+
+    async def evict(self) -> int:
+        async with AsyncSessionLocal() as db:
+            removed = await async_crud.evict_comparison_cache(db, self.max_age_days, self.max_rows)
+        self.counters["evicted"] += removed
+        logger.info("Cache de comparações: %s entradas removidas", removed)
+        return removed
+
+    def stats(self) -> dict:
+        hits = self.counters["memory_hits"] + self.counters["db_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "memory_size": len(self._memory),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
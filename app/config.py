@@ -11,6 +11,78 @@ class Settings(BaseSettings):
     TRATUM_ORGANIZATION_ID: int
     TRATUM_PLAN_ID: int
     OPENAI_API_KEY: str
+    TRATUM_BASE_URL: str = "https://search.tratum.com.br"
+    OPENAI_BASE_URL: str | None = None
+    DATABASE_URL: str | None = None
+    ASYNC_DATABASE_URL: str | None = None
+    LOG_LEVEL: str = "INFO"
+    ANALYSIS_CONCURRENCY: int = 8
+    PIPELINE_PREFETCH_BATCH_SIZE: int = 200
+    PERSISTENCE_BATCH_SIZE: int = 50
+    PERSISTENCE_FLUSH_INTERVAL: float = 0.5
+    BACKFILL_CONCURRENCY: int = 4
+    BACKFILL_CHUNK_SIZE: int = 100
+    BACKFILL_CSV_PATH: str = "ids_analytics_and_consume.csv"
+    BACKFILL_MISSING_CSV_PATH: str = "missing_analytics_and_consume.csv"
+    TRATUM_MAX_CONNECTIONS: int = 50
+    TRATUM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    TRATUM_KEEPALIVE_EXPIRY: float = 60.0
+    TRATUM_HTTP2: bool = False
+    TRATUM_LIMIT_INITIAL: int = 8
+    TRATUM_LIMIT_MIN: int = 2
+    TRATUM_LIMIT_MAX: int = 40
+    TRATUM_LIMIT_BACKOFF_RATIO: float = 0.5
+    TRATUM_LIMIT_LATENCY_TOLERANCE: float = 2.0
+    TRATUM_CONNECT_TIMEOUT: float = 10.0
+    TRATUM_LOGIN_TIMEOUT: float = 30.0
+    TRATUM_INITIATE_TIMEOUT: float = 300.0
+    TRATUM_SUMMARY_TIMEOUT: float = 120.0
+    TRATUM_DETAIL_TIMEOUT: float = 120.0
+    TRATUM_DETAIL_MAX_RETRIES: int = 3
+    TRATUM_RETRY_BASE_DELAY: float = 1.0
+    TRATUM_RETRY_MAX_DELAY: float = 20.0
+    TRATUM_PAGE_SIZE: int = 100
+    TRATUM_TOKEN_REFRESH_MARGIN_MINUTES: int = 30
+    TRATUM_TOKEN_RETRY_SECONDS: float = 30.0
+    TRATUM_MAX_PAGES: int = 50
+    SECTION_REPAIR_BATCH_SIZE: int = 50
+    SECTION_REPAIR_INTERVAL_MINUTES: int = 60
+    SECTION_REPAIR_MAX_ATTEMPTS: int = 5
+    SCHEDULER_TICK_MINUTES: int = 5
+    SCHEDULER_DEFAULT_CADENCE_DAYS: int = 7
+    # JANELA EM QUE AS ANÁLISES DE UM PERÍODO SÃO DISTRIBUÍDAS; None = O PERÍODO INTEIRO DA CADÊNCIA
+    SCHEDULER_WINDOW_HOURS: float | None = None
+    SCHEDULER_MAX_DOCUMENTS_PER_TICK: int = 500
+    SCHEDULER_BATCH_SIZE: int = 50
+    # DOCUMENTO VENCIDO QUE NÃO FOI ANALISADO (FALHA, LEASE OU JOB EM CONFLITO) VOLTA DEPOIS DESTE INTERVALO
+    SCHEDULER_RETRY_MINUTES: int = 15
+    SCHEDULER_MAX_FAILED_PER_PERIOD: int = 3
+    # IDENTIFICA A RÉPLICA NOS LEASES; None = HOSTNAME + PID (ÚNICO POR WORKER DO uvicorn)
+    REPLICA_ID: str | None = None
+    LEASE_TTL_SECONDS: int = 300
+    JOB_RESUME_INTERVAL_MINUTES: int = 15
+    MIGRATION_LOCK_TIMEOUT_SECONDS: int = 600
+    POLL_INITIAL_INTERVAL: float = 5.0
+    POLL_MAX_INTERVAL: float = 60.0
+    POLL_BACKOFF_FACTOR: float = 1.5
+    POLL_DEADLINE_SECONDS: float = 360.0
+    POLL_PARKED_INTERVAL: float = 600.0
+    POLL_PARKED_MAX_AGE: float = 86400.0
+    POLL_MAX_REQUESTS_PER_SECOND: float = 5.0
+    COMPARISON_SKIP_UNCHANGED: bool = True
+    COMPARISON_PROMPT_TOKEN_BUDGET: int = 6000
+    COMPARISON_CACHE_MEMORY_ENTRIES: int = 1024
+    COMPARISON_CACHE_MAX_ROWS: int = 50000
+    COMPARISON_CACHE_MAX_AGE_DAYS: int = 90
+    OPENAI_MAX_CONCURRENCY: int = 8
+    OPENAI_REQUESTS_PER_MINUTE: int = 500
+    OPENAI_TOKENS_PER_MINUTE: int = 30000
+    OPENAI_ESTIMATED_COMPLETION_TOKENS: int = 800
+    OPENAI_MAX_RETRIES: int = 5
+    OPENAI_RETRY_BASE_DELAY: float = 1.0
+    OPENAI_RETRY_MAX_DELAY: float = 30.0
+    JSON_COMPRESSION_CODEC: str = "zlib"
+    JSON_COMPRESSION_LEVEL: int = 6
 
     model_config = SettingsConfigDict(env_file=".env")
 
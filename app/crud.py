@@ -1,6 +1,10 @@
-from sqlalchemy.orm import Session
+import datetime
+import hashlib
+from sqlalchemy.orm import Session, joinedload, undefer
 from . import models, schemas
-from sqlalchemy import desc
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from .diff import canonical
 
 def get_active_documents(db: Session) -> list[models.MonitoredDocument]:
     # BUSCA DOCUMENTOS ATIVOS PARA MONITORAMENTO
@@ -18,27 +22,184 @@ def get_active_documents_from_id(db: Session, start_id: int) -> list[models.Moni
         .all()
     )
 
-def create_analysis(db: Session, document_id: int, analysis_data: dict, unique_id: int, analytics_id: int) -> models.Analysis:
-    db_analysis = models.Analysis(
-        document_id=document_id,
-        analysis_json=analysis_data,
-        unique_id=unique_id,
-        analytics_id=analytics_id
+def section_hash(content) -> str:
+    return hashlib.sha256(canonical(content).encode("utf-8")).hexdigest()
+
+def store_sections(db: Session, analysis_data: dict) -> dict[str, str]:
+    return store_sections_bulk(db, [analysis_data])[0]
+
+def store_sections_bulk(db: Session, reports: list[dict]) -> list[dict[str, str]]:
+    # GRAVA CADA SEÇÃO UMA ÚNICA VEZ, ENDEREÇADA PELO HASH DO CONTEÚDO (UMA CONSULTA PARA TODOS OS RELATÓRIOS)
+    all_refs = [{section: section_hash(content) for section, content in report.items()} for report in reports]
+    hashes = {content_hash for refs in all_refs for content_hash in refs.values()}
+    existing = {
+        row.content_hash for row in
+        db.query(models.AnalysisSection.content_hash).filter(models.AnalysisSection.content_hash.in_(hashes))
+    } if hashes else set()
+    missing = {}
+    for report, refs in zip(reports, all_refs):
+        for section, content_hash in refs.items():
+            if content_hash not in existing:
+                missing[content_hash] = report[section]
+    if missing:
+        statement = (
+            insert(models.AnalysisSection)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+        )
+        now = datetime.datetime.now(models.br_tz)
+        db.execute(statement, [
+            {"content_hash": content_hash, "content": content, "created_at": now}
+            for content_hash, content in missing.items()
+        ])
+    return all_refs
+
+def get_active_documents_page(db: Session, limit: int, after_id: int | None = None) -> list[models.MonitoredDocument]:
+    # PAGINAÇÃO POR CHAVE (id > after_id) EM VEZ DE OFFSET
+    query = db.query(models.MonitoredDocument).filter(models.MonitoredDocument.is_active == True)
+    if after_id is not None:
+        query = query.filter(models.MonitoredDocument.id > after_id)
+    return query.order_by(models.MonitoredDocument.id.asc()).limit(limit).all()
+
+def get_latest_analyses_for_documents(db: Session, document_ids: list[int], per_document: int, include_payload: bool = False, max_analysis_id: int | None = None) -> dict[int, list[models.Analysis]]:
+    # BUSCA AS N ÚLTIMAS ANÁLISES DE VÁRIOS DOCUMENTOS EM UMA ÚNICA CONSULTA (FUNÇÃO DE JANELA)
+    result: dict[int, list[models.Analysis]] = {document_id: [] for document_id in document_ids}
+    if not document_ids or per_document <= 0:
+        return result
+    ranked = (
+        select(
+            models.Analysis.id.label("analysis_id"),
+            func.row_number().over(
+                partition_by=models.Analysis.document_id,
+                order_by=(models.Analysis.analysis_date.desc(), models.Analysis.id.desc())
+            ).label("position")
+        )
+        .where(models.Analysis.document_id.in_(document_ids))
+    )
+    if max_analysis_id is not None:
+        ranked = ranked.where(models.Analysis.id <= max_analysis_id)
+    ranked = ranked.subquery()
+    query = (
+        db.query(models.Analysis)
+        .join(ranked, ranked.c.analysis_id == models.Analysis.id)
+        .filter(ranked.c.position <= per_document)
+        .order_by(models.Analysis.document_id.asc(), ranked.c.position.asc())
     )
-    db.add(db_analysis)
+    if include_payload:
+        query = query.options(undefer(models.Analysis._analysis_json), undefer(models.Analysis.comparison_resume))
+    analyses = query.all()
+    if include_payload:
+        assemble_reports(db, analyses)
+    for db_analysis in analyses:
+        result[db_analysis.document_id].append(db_analysis)
+    return result
+
+def get_last_two_analyses_for_documents(db: Session, document_ids: list[int], include_payload: bool = True) -> dict[int, list[models.Analysis]]:
+    return get_latest_analyses_for_documents(db, document_ids, per_document=2, include_payload=include_payload)
+
+def get_max_analysis_id(db: Session) -> int:
+    return db.query(func.max(models.Analysis.id)).scalar() or 0
+
+def assemble_reports(db: Session, analyses: list[models.Analysis]):
+    # CARREGA AS SEÇÕES DE VÁRIAS ANÁLISES DE UMA VEZ, EVITANDO UMA CONSULTA POR ANÁLISE
+    hashes = {content_hash for db_analysis in analyses for content_hash in (db_analysis.section_refs or {}).values()}
+    if not hashes:
+        return
+    contents = {
+        row.content_hash: row.content
+        for row in db.query(models.AnalysisSection).filter(models.AnalysisSection.content_hash.in_(hashes))
+    }
+    for db_analysis in analyses:
+        if db_analysis.section_refs:
+            db_analysis.__dict__["_assembled_json"] = {
+                section: contents.get(content_hash) for section, content_hash in db_analysis.section_refs.items()
+            }
+
+def create_analysis(db: Session, document_id: int, analysis_data: dict, unique_id: int, analytics_id: int) -> models.Analysis:
+    # IDEMPOTENTE: SE O analytics_id JÁ EXISTIR, A LINHA EXISTENTE É ATUALIZADA EM VEZ DE DUPLICADA
+    analysis_id = upsert_analyses(db, [{
+        "document_id": document_id,
+        "analysis_data": analysis_data,
+        "unique_id": unique_id,
+        "analytics_id": analytics_id,
+    }])[0]
     db.commit()
-    db.refresh(db_analysis)
+    db_analysis = db.query(models.Analysis).filter(models.Analysis.id == analysis_id).first()
+    assemble_reports(db, [db_analysis])
     return db_analysis
 
-def get_last_two_analyses(db: Session, document_id: int) -> list[models.Analysis]:
-    # BUSCA AS DUAS ÚLTIMAS ANÁLISES
-    return (
-        db.query(models.Analysis)
-        .filter(models.Analysis.document_id == document_id)
-        .order_by(desc(models.Analysis.analysis_date))
-        .limit(2)
-        .all()
+# BANCOS COM UPSERT NATIVO; NOS DEMAIS O UPSERT É FEITO COM SELECT + UPDATE/INSERT
+UPSERT_DIALECTS = ("mysql", "sqlite", "postgresql")
+# NO CONFLITO O RELATÓRIO É SUBSTITUÍDO (DATA E RESUMO DA COMPARAÇÃO SÃO MANTIDOS)
+_UPSERT_COLUMNS = ("section_refs", "failed_sections", "unique_id")
+
+def _analysis_upsert_statement(dialect: str):
+    # INSERT QUE, QUANDO O analytics_id JÁ EXISTE, SÓ ATUALIZA O RELATÓRIO
+    table = models.Analysis.__table__
+    if dialect == "mysql":
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update(
+            **{column: statement.inserted[column] for column in _UPSERT_COLUMNS},
+            analysis_json=None,
+        )
+    statement = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.analytics_id],
+        set_={**{column: statement.excluded[column] for column in _UPSERT_COLUMNS}, "analysis_json": None},
     )
+
+def _upsert_analyses_individually(db: Session, rows: list[dict]) -> list[int]:
+    # SEM analytics_id NÃO HÁ CHAVE DE CONFLITO: INSERT SIMPLES. EM BANCO SEM UPSERT NATIVO, PROCURA PELO analytics_id ANTES
+    table = models.Analysis.__table__
+    existing = get_analysis_ids_by_analytics_ids(db, {row["analytics_id"] for row in rows if row["analytics_id"] is not None})
+    ids = []
+    for row in rows:
+        analysis_id = existing.get(row["analytics_id"])
+        if analysis_id is None:
+            analysis_id = db.execute(insert(table).values(**row)).inserted_primary_key[0]
+            if row["analytics_id"] is not None:
+                existing[row["analytics_id"]] = analysis_id
+        else:
+            db.execute(
+                update(table).where(table.c.id == analysis_id)
+                .values(**{column: row[column] for column in _UPSERT_COLUMNS}, analysis_json=None)
+            )
+        ids.append(analysis_id)
+    return ids
+
+def upsert_analyses(db: Session, new_analyses: list[dict]) -> list[int]:
+    # GRAVA VÁRIAS ANÁLISES EM UM ÚNICO INSERT MULTI-LINHA E DEVOLVE OS IDS NA MESMA ORDEM (SEM COMMIT)
+    now = datetime.datetime.now(models.br_tz)
+    all_refs = store_sections_bulk(db, [item["analysis_data"] for item in new_analyses])
+    rows = [
+        {
+            "document_id": item["document_id"],
+            "analysis_date": now,
+            "section_refs": refs,
+            "failed_sections": item.get("failed_sections") or None,
+            "unique_id": item["unique_id"],
+            "analytics_id": item.get("analytics_id"),
+        }
+        for item, refs in zip(new_analyses, all_refs)
+    ]
+    if db.get_bind().dialect.name not in UPSERT_DIALECTS:
+        return _upsert_analyses_individually(db, rows)
+    keyed = [index for index, row in enumerate(rows) if row["analytics_id"] is not None]
+    ids = [None] * len(rows)
+    if keyed:
+        db.execute(_analysis_upsert_statement(db.get_bind().dialect.name), [rows[index] for index in keyed])
+        # O MYSQL NÃO TEM RETURNING: OS IDS SÃO RECUPERADOS PELO analytics_id, QUE É ÚNICO
+        ids_by_analytics_id = get_analysis_ids_by_analytics_ids(db, {rows[index]["analytics_id"] for index in keyed})
+        for index in keyed:
+            ids[index] = ids_by_analytics_id[rows[index]["analytics_id"]]
+    unkeyed = [index for index, row in enumerate(rows) if row["analytics_id"] is None]
+    for index, analysis_id in zip(unkeyed, _upsert_analyses_individually(db, [rows[index] for index in unkeyed])):
+        ids[index] = analysis_id
+    return ids
+
+def get_last_two_analyses(db: Session, document_id: int) -> list[models.Analysis]:
+    # BUSCA AS DUAS ÚLTIMAS ANÁLISES (MESMA CONSULTA EM LOTE, COM UM ÚNICO DOCUMENTO)
+    return get_last_two_analyses_for_documents(db, [document_id])[document_id]
     
 def update_analysis_with_summary(db: Session, analysis_id: int, summary: str, usage: dict):
     # ADICIONA OS DADOS DE USO DE TOKENS
@@ -54,11 +215,341 @@ def update_analysis_with_summary(db: Session, analysis_id: int, summary: str, us
 
 def create_monitored_document(db: Session, doc: schemas.MonitoredDocumentCreate) -> models.MonitoredDocument:
     # CRIA UM NOVO DOCUMENTO PARA SER MONITORADO
-    db_doc = models.MonitoredDocument(document=doc.document, is_active=doc.is_active)
+    # next_run_at = AGORA: O DOCUMENTO NOVO ENTRA NO PRÓXIMO TICK DO AGENDADOR E DEPOIS SEGUE A CADÊNCIA
+    db_doc = models.MonitoredDocument(
+        document=doc.document,
+        is_active=doc.is_active,
+        cadence_days=doc.cadence_days,
+        next_run_at=datetime.datetime.now(models.br_tz).replace(tzinfo=None)
+    )
     db.add(db_doc)
     db.commit()
     db.refresh(db_doc)
     return db_doc
 
+def get_document(db: Session, document_id: int) -> models.MonitoredDocument | None:
+    return db.get(models.MonitoredDocument, document_id)
+
+def get_due_documents(db: Session, now: datetime.datetime, limit: int) -> list[models.MonitoredDocument]:
+    # DOCUMENTOS ATIVOS CUJO HORÁRIO AGENDADO JÁ PASSOU, OS MAIS ATRASADOS PRIMEIRO
+    return (
+        db.query(models.MonitoredDocument)
+        .filter(
+            models.MonitoredDocument.is_active == True,
+            models.MonitoredDocument.next_run_at <= now
+        )
+        .order_by(models.MonitoredDocument.next_run_at.asc(), models.MonitoredDocument.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+def get_unscheduled_documents(db: Session, limit: int) -> list[models.MonitoredDocument]:
+    return (
+        db.query(models.MonitoredDocument)
+        .filter(
+            models.MonitoredDocument.is_active == True,
+            models.MonitoredDocument.next_run_at.is_(None)
+        )
+        .order_by(models.MonitoredDocument.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+def schedule_documents(db: Session, next_runs: dict[int, datetime.datetime]) -> int:
+    # UM ÚNICO UPDATE EM LOTE (executemany) PARA TODOS OS DOCUMENTOS DO TICK
+    if not next_runs:
+        return 0
+    db.execute(
+        update(models.MonitoredDocument),
+        [{"id": document_id, "next_run_at": next_run_at} for document_id, next_run_at in next_runs.items()]
+    )
+    db.commit()
+    return len(next_runs)
+
+def get_jobs_since(db: Session, since_by_document: dict[int, datetime.datetime]) -> dict[int, dict[str, int]]:
+    # POR DOCUMENTO: JOBS CRIADOS DESDE O INÍCIO DO PERÍODO ATUAL, SEPARANDO OS FAILED DOS DEMAIS (EM ANDAMENTO OU CONCLUÍDOS)
+    counts = {document_id: {"live": 0, "failed": 0} for document_id in since_by_document}
+    if not since_by_document:
+        return counts
+    rows = db.query(models.AnalysisJob.document_id, models.AnalysisJob.stage, models.AnalysisJob.created_at).filter(
+        models.AnalysisJob.document_id.in_(list(since_by_document)),
+        models.AnalysisJob.created_at >= min(since_by_document.values())
+    )
+    for row in rows:
+        if row.created_at >= since_by_document[row.document_id]:
+            counts[row.document_id]["failed" if row.stage == models.JobStage.FAILED else "live"] += 1
+    return counts
+
+def update_document_cadence(db: Session, document_id: int, cadence_days: int | None, next_run_at: datetime.datetime) -> models.MonitoredDocument | None:
+    db_doc = db.get(models.MonitoredDocument, document_id)
+    if db_doc is None:
+        return None
+    db_doc.cadence_days = cadence_days
+    db_doc.next_run_at = next_run_at
+    db.commit()
+    db.refresh(db_doc)
+    return db_doc
+
+def claim_document_leases(db: Session, document_ids: list[int], owner: str, now: datetime.datetime, expires_at: datetime.datetime) -> set[int]:
+    # CLAIM CONDICIONAL: CRIA O LEASE QUE NÃO EXISTE E ASSUME SÓ O QUE EXPIROU (OU JÁ ERA DESTA RÉPLICA).
+    # O UPDATE RELÊ A LINHA MAIS RECENTE (MySQL/SQLite): DUAS RÉPLICAS NUNCA FICAM COM O MESMO DOCUMENTO
+    if not document_ids:
+        return set()
+    document_ids = sorted(set(document_ids))
+    statement = (
+        insert(models.DocumentLease)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    db.execute(statement, [{"document_id": document_id, "owner": owner, "expires_at": expires_at} for document_id in document_ids])
+    db.execute(
+        update(models.DocumentLease)
+        .where(
+            models.DocumentLease.document_id.in_(document_ids),
+            or_(models.DocumentLease.expires_at < now, models.DocumentLease.owner == owner)
+        )
+        .values(owner=owner, expires_at=expires_at)
+    )
+    claimed = {
+        row.document_id for row in
+        db.query(models.DocumentLease.document_id).filter(
+            models.DocumentLease.document_id.in_(document_ids),
+            models.DocumentLease.owner == owner
+        )
+    }
+    db.commit()
+    return claimed
+
+def renew_document_leases(db: Session, document_ids: list[int], owner: str, expires_at: datetime.datetime) -> set[int]:
+    # DEVOLVE OS LEASES QUE CONTINUAM DESTA RÉPLICA
+    if not document_ids:
+        return set()
+    db.execute(
+        update(models.DocumentLease)
+        .where(models.DocumentLease.document_id.in_(document_ids), models.DocumentLease.owner == owner)
+        .values(expires_at=expires_at)
+    )
+    renewed = {
+        row.document_id for row in
+        db.query(models.DocumentLease.document_id).filter(
+            models.DocumentLease.document_id.in_(document_ids),
+            models.DocumentLease.owner == owner
+        )
+    }
+    db.commit()
+    return renewed
+
+def release_document_leases(db: Session, document_ids: list[int], owner: str) -> int:
+    if not document_ids:
+        return 0
+    result = db.execute(
+        delete(models.DocumentLease)
+        .where(models.DocumentLease.document_id.in_(document_ids), models.DocumentLease.owner == owner)
+    )
+    db.commit()
+    return result.rowcount
+
 def get_document_by_number(db: Session, document_number: str) -> models.MonitoredDocument | None:
     return db.query(models.MonitoredDocument).filter(models.MonitoredDocument.document == str(document_number)).first()
+
+def get_document_ids_by_numbers(db: Session, document_numbers: set[str]) -> dict[str, int]:
+    # RESOLVE VÁRIOS NÚMEROS DE DOCUMENTO PARA IDS EM UMA ÚNICA CONSULTA
+    if not document_numbers:
+        return {}
+    rows = db.query(models.MonitoredDocument.id, models.MonitoredDocument.document).filter(
+        models.MonitoredDocument.document.in_({str(number) for number in document_numbers})
+    )
+    return {row.document: row.id for row in rows}
+
+def get_analysis_ids_by_analytics_ids(db: Session, analytics_ids: set[int]) -> dict[int, int]:
+    if not analytics_ids:
+        return {}
+    rows = db.query(models.Analysis.id, models.Analysis.analytics_id).filter(models.Analysis.analytics_id.in_(analytics_ids))
+    return {row.analytics_id: row.id for row in rows}
+
+def get_existing_analytics_ids(db: Session, analytics_ids: set[int]) -> set[int]:
+    # VERIFICAÇÃO PRÉVIA: IDS QUE JÁ ESTÃO NO BANCO NÃO PRECISAM SER BUSCADOS NA TRATUM
+    return set(get_analysis_ids_by_analytics_ids(db, analytics_ids))
+
+def get_backfill_checkpoint(db: Session, source: str) -> int:
+    db_checkpoint = db.query(models.BackfillCheckpoint).filter(models.BackfillCheckpoint.source == source).first()
+    return db_checkpoint.rows_done if db_checkpoint else 0
+
+def save_backfill_checkpoint(db: Session, source: str, rows_done: int) -> models.BackfillCheckpoint:
+    db_checkpoint = db.query(models.BackfillCheckpoint).filter(models.BackfillCheckpoint.source == source).first()
+    if db_checkpoint is None:
+        db_checkpoint = models.BackfillCheckpoint(source=source)
+        db.add(db_checkpoint)
+    db_checkpoint.rows_done = rows_done
+    db.commit()
+    return db_checkpoint
+
+def create_analysis_job(db: Session, document_id: int, analytics_id: int, unique_id: int, compare: bool = True) -> models.AnalysisJob:
+    # REGISTRA UMA ANÁLISE JÁ INICIADA (E PAGA) NA TRATUM
+    db_job = models.AnalysisJob(
+        document_id=document_id,
+        stage=models.JobStage.INITIATED,
+        analytics_id=analytics_id,
+        unique_id=unique_id,
+        compare=compare
+    )
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def update_analysis_job(db: Session, job_id: int, stage: str, **fields) -> models.AnalysisJob | None:
+    db_job = db.query(models.AnalysisJob).filter(models.AnalysisJob.id == job_id).first()
+    if db_job:
+        db_job.stage = stage
+        for key, value in fields.items():
+            setattr(db_job, key, value)
+        db.commit()
+        db.refresh(db_job)
+    return db_job
+
+def get_analysis_job(db: Session, job_id: int) -> models.AnalysisJob | None:
+    return db.query(models.AnalysisJob).filter(models.AnalysisJob.id == job_id).first()
+
+def _unfinished_analysis_jobs_query(db: Session):
+    # JOBS QUE AINDA TÊM ETAPAS PENDENTES (SEM COMPARAÇÃO, AGGREGATED JÁ É O FIM)
+    stage = models.AnalysisJob.stage
+    return db.query(models.AnalysisJob).filter(
+        stage.notin_([models.JobStage.COMPARED, models.JobStage.FAILED]),
+        or_(stage != models.JobStage.AGGREGATED, models.AnalysisJob.compare == True)
+    )
+
+def get_unfinished_analysis_jobs(db: Session) -> list[models.AnalysisJob]:
+    return (
+        _unfinished_analysis_jobs_query(db)
+        .options(joinedload(models.AnalysisJob.document))
+        .order_by(models.AnalysisJob.id.asc())
+        .all()
+    )
+
+def get_document_ids_with_unfinished_jobs(db: Session) -> set[int]:
+    query = _unfinished_analysis_jobs_query(db).with_entities(models.AnalysisJob.document_id).distinct()
+    return {row.document_id for row in query}
+
+def persist_analysis_batch(db: Session, new_analyses: list[dict], summaries: list[dict]) -> list[int]:
+    # GRAVA UM LOTE INTEIRO (ANÁLISES NOVAS, ETAPAS DOS JOBS E RESUMOS) COM INSERT/UPDATE EM LOTE E UM ÚNICO COMMIT
+    now = datetime.datetime.now(models.br_tz)
+    analysis_ids = []
+    if new_analyses:
+        analysis_ids = upsert_analyses(db, new_analyses)
+        job_updates = [
+            {"id": item["job_id"], "stage": models.JobStage.AGGREGATED, "analysis_id": analysis_id, "updated_at": now}
+            for item, analysis_id in zip(new_analyses, analysis_ids) if item.get("job_id")
+        ]
+        if job_updates:
+            db.execute(update(models.AnalysisJob), job_updates)
+    if summaries:
+        db.execute(update(models.Analysis), [
+            {
+                "id": item["analysis_id"],
+                "comparison_resume": item["summary"],
+                "prompt_tokens": item["usage"].get("prompt_tokens"),
+                "completion_tokens": item["usage"].get("completion_tokens"),
+                "total_tokens": item["usage"].get("total_tokens"),
+            }
+            for item in summaries
+        ])
+        job_updates = [
+            {"id": item["job_id"], "stage": models.JobStage.COMPARED, "updated_at": now}
+            for item in summaries if item.get("job_id")
+        ]
+        if job_updates:
+            db.execute(update(models.AnalysisJob), job_updates)
+    db.commit()
+    return analysis_ids
+
+def get_analyses_with_failed_sections(db: Session, limit: int, after_id: int = 0, max_attempts: int | None = None) -> list[models.Analysis]:
+    query = (
+        db.query(models.Analysis)
+        .options(undefer(models.Analysis._analysis_json), joinedload(models.Analysis.document_owner))
+        .filter(models.Analysis.failed_sections.isnot(None), models.Analysis.id > after_id)
+    )
+    if max_attempts is not None:
+        query = query.filter(models.Analysis.repair_attempts < max_attempts)
+    analyses = (
+        query
+        .order_by(models.Analysis.id.asc())
+        .limit(limit)
+        .all()
+    )
+    assemble_reports(db, analyses)
+    return analyses
+
+def save_repaired_sections(db: Session, analysis_id: int, repaired: dict, failed_sections: list[str]) -> models.Analysis | None:
+    # JUNTA AS SEÇÕES RECUPERADAS AO RELATÓRIO GRAVADO; AS QUE AINDA FALHARAM CONTINUAM PENDENTES
+    db_analysis = (
+        db.query(models.Analysis)
+        .options(undefer(models.Analysis._analysis_json))
+        .filter(models.Analysis.id == analysis_id)
+        .first()
+    )
+    if db_analysis is None:
+        return None
+    assemble_reports(db, [db_analysis])
+    analysis_data = {**(db_analysis.analysis_json or {}), **repaired}
+    db_analysis._analysis_json = None
+    db_analysis.section_refs = store_sections(db, analysis_data)
+    db_analysis.__dict__["_assembled_json"] = analysis_data
+    db_analysis.failed_sections = failed_sections or None
+    db_analysis.repair_attempts = (db_analysis.repair_attempts or 0) + 1
+    db.commit()
+    return db_analysis
+
+def record_repair_attempt(db: Session, analysis_id: int):
+    db.execute(
+        update(models.Analysis)
+        .where(models.Analysis.id == analysis_id)
+        .values(repair_attempts=func.coalesce(models.Analysis.repair_attempts, 0) + 1)
+    )
+    db.commit()
+
+def get_comparison_cache_entry(db: Session, cache_key: str) -> models.ComparisonCacheEntry | None:
+    db_entry = db.query(models.ComparisonCacheEntry).filter(models.ComparisonCacheEntry.cache_key == cache_key).first()
+    if db_entry:
+        db_entry.last_used_at = datetime.datetime.now(models.br_tz)
+        db.commit()
+    return db_entry
+
+def save_comparison_cache_entry(db: Session, cache_key: str, document: str, summary: dict, usage: dict | None) -> models.ComparisonCacheEntry:
+    db_entry = db.query(models.ComparisonCacheEntry).filter(models.ComparisonCacheEntry.cache_key == cache_key).first()
+    if db_entry is None:
+        db_entry = models.ComparisonCacheEntry(cache_key=cache_key, document=document)
+        db.add(db_entry)
+    db_entry.summary = summary
+    db_entry.usage = usage
+    db_entry.last_used_at = datetime.datetime.now(models.br_tz)
+    db.commit()
+    return db_entry
+
+def evict_comparison_cache(db: Session, max_age_days: int, max_rows: int) -> int:
+    # REMOVE ENTRADAS ANTIGAS E, SE AINDA PASSAR DO LIMITE, AS MENOS USADAS RECENTEMENTE
+    entry = models.ComparisonCacheEntry
+    cutoff = datetime.datetime.now(models.br_tz) - datetime.timedelta(days=max_age_days)
+    removed = db.query(entry).filter(entry.created_at < cutoff).delete(synchronize_session=False)
+    overflow = db.query(entry).count() - max_rows
+    if overflow > 0:
+        oldest_keys = [row.cache_key for row in db.query(entry.cache_key).order_by(entry.last_used_at.asc()).limit(overflow)]
+        removed += db.query(entry).filter(entry.cache_key.in_(oldest_keys)).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+def compact_inline_analyses(db: Session, batch_size: int = 200) -> int:
+    # MOVE O JSON DE ANÁLISES LEGADAS PARA analysis_sections, UM LOTE POR VEZ
+    batch = (
+        db.query(models.Analysis)
+        .filter(models.Analysis._analysis_json.isnot(None))
+        .order_by(models.Analysis.id.asc())
+        .limit(batch_size)
+        .all()
+    )
+    for db_analysis in batch:
+        analysis_data = db_analysis._analysis_json
+        db_analysis._analysis_json = None
+        db_analysis.section_refs = store_sections(db, analysis_data)
+    db.commit()
+    return len(batch)
@@ -0,0 +1,119 @@
+import json
+from dataclasses import dataclass, field
+
+COMPARED_SECTIONS = ("summary", "qsa", "divida_ativa", "certidoes", "faturamento", "history_rfb")
+
+# CAMPOS QUE MUDAM A CADA CONSULTA SEM REPRESENTAR MUDANÇA NO PERFIL DE RISCO
+VOLATILE_KEYS = {
+    "id", "timestamp", "date", "datetime", "time", "token",
+    "createdAt", "updatedAt", "deletedAt", "created_at", "updated_at", "deleted_at",
+    "requestDate", "queryDate", "consultationDate", "lastUpdate", "lastUpdated",
+    # IDS DA CONSULTA NA TRATUM: MUDAM A CADA ANÁLISE PAGA
+    "userPlanConsumeUniqueId", "userPlanConsumeAnalyticsId", "userPlanConsumeGovernmentDebtorSummaryId",
+}
+MAX_REPORTED_PATHS = 20
+
+
+def is_volatile_key(key: str) -> bool:
+    # SÓ A LISTA EXPLÍCITA: CAMPOS COMO dueDate OU creditorId TERMINAM IGUAL, MAS SÃO DADOS DO RELATÓRIO
+    return key in VOLATILE_KEYS
+
+
+def canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def normalize(value):
+    # REMOVE CAMPOS VOLÁTEIS E TORNA A ORDEM DE LISTAS IRRELEVANTE
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items() if not is_volatile_key(str(key))}
+    if isinstance(value, list):
+        return sorted((normalize(item) for item in value), key=canonical)
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+@dataclass
+class SectionDiff:
+    section: str
+    added: int = 0
+    removed: int = 0
+    modified: int = 0
+    paths: list[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    def _record(self, path: str):
+        if len(self.paths) < MAX_REPORTED_PATHS:
+            self.paths.append(path)
+
+    def as_dict(self) -> dict:
+        return {"added": self.added, "removed": self.removed, "modified": self.modified, "paths": self.paths}
+
+
+@dataclass
+class ReportDiff:
+    sections: dict[str, SectionDiff]
+
+    @property
+    def has_material_changes(self) -> bool:
+        return any(section.changed for section in self.sections.values())
+
+    @property
+    def changed_sections(self) -> list[str]:
+        return [name for name, section in self.sections.items() if section.changed]
+
+    def as_dict(self) -> dict:
+        return {name: section.as_dict() for name, section in self.sections.items() if section.changed}
+
+
+def _diff_values(old, new, path: str, result: SectionDiff):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() | new.keys():
+            child = f"{path}.{key}"
+            if key not in new:
+                result.removed += 1
+                result._record(child)
+            elif key not in old:
+                result.added += 1
+                result._record(child)
+            else:
+                _diff_values(old[key], new[key], child, result)
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        # LISTAS SÃO COMPARADAS COMO MULTICONJUNTOS (JÁ NORMALIZADAS)
+        old_items: dict[str, int] = {}
+        for item in old:
+            key = canonical(item)
+            old_items[key] = old_items.get(key, 0) + 1
+        for item in new:
+            key = canonical(item)
+            if old_items.get(key):
+                old_items[key] -= 1
+            else:
+                result.added += 1
+                result._record(f"{path}[+]")
+        removed = sum(old_items.values())
+        if removed:
+            result.removed += removed
+            result._record(f"{path}[-]")
+        return
+    if old != new:
+        result.modified += 1
+        result._record(path)
+
+
+def diff_reports(old_report: dict | None, new_report: dict | None, sections: tuple[str, ...] = COMPARED_SECTIONS) -> ReportDiff:
+    old_report = old_report or {}
+    new_report = new_report or {}
+    result = {}
+    for section in sections:
+        section_diff = SectionDiff(section=section)
+        _diff_values(normalize(old_report.get(section)), normalize(new_report.get(section)), section, section_diff)
+        result[section] = section_diff
+    return ReportDiff(sections=result)
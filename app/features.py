@@ -0,0 +1,188 @@
+import json
+import math
+import re
+from .diff import ReportDiff, is_volatile_key
+
+# O FORMATO EXATO DOS PAYLOADS DA TRATUM VARIA POR SEÇÃO: A EXTRAÇÃO É FEITA PELO NOME DOS CAMPOS
+INDICATOR_GROUPS = {
+    "lawsuits": re.compile(r"lawsuit|process|juridic|judicial", re.IGNORECASE),
+    "protests": re.compile(r"protest", re.IGNORECASE),
+    "active_debt": re.compile(r"debt|divida|dívida|debtor", re.IGNORECASE),
+}
+VALUE_KEY = re.compile(r"value|valor|amount|montante|saldo|balance", re.IGNORECASE)
+NAME_KEY = re.compile(r"^(name|nome|razaoSocial|corporateName|socialName)$", re.IGNORECASE)
+ROLE_KEY = re.compile(r"qualif|role|cargo|position", re.IGNORECASE)
+CERT_NAME_KEY = re.compile(r"^(name|nome|type|tipo|description|descricao|certificate|certidao)$", re.IGNORECASE)
+CERT_STATUS_KEY = re.compile(r"status|situa|result|resultado", re.IGNORECASE)
+CLEAN_CERT_STATUS = re.compile(r"negativ|regular|nada consta|emitid|ok|valid", re.IGNORECASE)
+
+# ORDEM EM QUE AS SEÇÕES SÃO REDUZIDAS QUANDO O PROMPT PASSA DO ORÇAMENTO (MENOR PRIORIDADE PRIMEIRO)
+TRIM_ORDER = ("history_rfb", "faturamento", "divida_ativa", "certidoes", "qsa")
+MAX_LIST_ITEMS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    # APROXIMAÇÃO CONSERVADORA (~4 CARACTERES POR TOKEN); USA tiktoken SE ESTIVER INSTALADO
+    try:
+        import tiktoken
+    except ImportError:
+        return math.ceil(len(text) / 4)
+    return len(tiktoken.get_encoding("o200k_base").encode(text))
+
+
+def _numeric(value) -> float | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def _iter_leaves(value, path: str = ""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if is_volatile_key(str(key)):
+                continue
+            yield from _iter_leaves(item, f"{path}.{key}" if path else str(key))
+    elif not isinstance(value, list):
+        yield path, value
+
+
+def _first_list(value) -> list:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        for item in value.values():
+            if isinstance(item, list):
+                return item
+        for item in value.values():
+            found = _first_list(item)
+            if found:
+                return found
+    return []
+
+
+def _pick(item: dict, pattern: re.Pattern):
+    for key, value in item.items():
+        if pattern.search(str(key)) and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def _summary_indicators(summary) -> dict:
+    indicators = {group: {} for group in INDICATOR_GROUPS}
+    for path, value in _iter_leaves(summary or {}):
+        if _numeric(value) is None:
+            continue
+        for group, pattern in INDICATOR_GROUPS.items():
+            if pattern.search(path):
+                indicators[group][path] = value
+                break
+    return indicators
+
+
+def _debt_features(divida_ativa) -> dict:
+    items = _first_list(divida_ativa)
+    total = 0.0
+    top = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        value = next((_numeric(v) for k, v in item.items() if VALUE_KEY.search(str(k)) and _numeric(v) is not None), None)
+        if value is not None:
+            total += value
+            top.append(value)
+    return {"count": len(items), "total_value": round(total, 2), "largest_values": sorted(top, reverse=True)[:5]}
+
+
+def _qsa_features(qsa) -> dict:
+    members = []
+    for item in _first_list(qsa):
+        if not isinstance(item, dict):
+            continue
+        name = _pick(item, NAME_KEY)
+        if name is None:
+            continue
+        role = _pick(item, ROLE_KEY)
+        members.append(f"{name} ({role})" if role else str(name))
+    return {"count": len(members), "members": sorted(members)[:MAX_LIST_ITEMS]}
+
+
+def _certificate_features(certidoes) -> dict:
+    certificates = []
+    issues = []
+    for item in _first_list(certidoes):
+        if not isinstance(item, dict):
+            continue
+        name = _pick(item, CERT_NAME_KEY)
+        status = _pick(item, CERT_STATUS_KEY)
+        certificates.append({"name": name, "status": status})
+        if status is not None and not CLEAN_CERT_STATUS.search(str(status)):
+            issues.append(f"{name}: {status}")
+    return {"count": len(certificates), "issues": issues[:MAX_LIST_ITEMS], "certificates": certificates[:MAX_LIST_ITEMS]}
+
+
+def _scalar_features(section) -> dict:
+    return {
+        path: value for path, value in _iter_leaves(section or {})
+        if isinstance(value, (int, float, bool)) or (isinstance(value, str) and len(value) <= 80)
+    }
+
+
+def extract_features(report: dict | None) -> dict:
+    # REDUZ O RELATÓRIO COMPLETO AOS INDICADORES QUE O SCHEMA DE SAÍDA DA COMPARAÇÃO PRECISA
+    report = report or {}
+    history = _first_list(report.get("history_rfb"))
+    return {
+        "summary_indicators": _summary_indicators(report.get("summary")),
+        "divida_ativa": _debt_features(report.get("divida_ativa")),
+        "qsa": _qsa_features(report.get("qsa")),
+        "certidoes": _certificate_features(report.get("certidoes")),
+        "faturamento": _scalar_features(report.get("faturamento")),
+        "history_rfb": {"count": len(history), "latest": history[:5]},
+    }
+
+
+def feature_deltas(old_features: dict, new_features: dict, report_diff: ReportDiff | None = None) -> dict:
+    deltas = {}
+    for group in INDICATOR_GROUPS:
+        old_group = old_features["summary_indicators"][group]
+        new_group = new_features["summary_indicators"][group]
+        for path in old_group.keys() | new_group.keys():
+            old_value, new_value = old_group.get(path), new_group.get(path)
+            if old_value != new_value:
+                deltas[path] = {"previous": old_value, "current": new_value}
+    for section in ("divida_ativa", "qsa", "certidoes", "history_rfb"):
+        old_count, new_count = old_features[section]["count"], new_features[section]["count"]
+        if old_count != new_count:
+            deltas[f"{section}.count"] = {"previous": old_count, "current": new_count}
+    old_debt, new_debt = old_features["divida_ativa"]["total_value"], new_features["divida_ativa"]["total_value"]
+    if old_debt != new_debt:
+        deltas["divida_ativa.total_value"] = {"previous": old_debt, "current": new_debt}
+    old_members, new_members = set(old_features["qsa"]["members"]), set(new_features["qsa"]["members"])
+    if old_members != new_members:
+        deltas["qsa.members"] = {"joined": sorted(new_members - old_members), "left": sorted(old_members - new_members)}
+    if report_diff is not None:
+        deltas["changed_sections"] = report_diff.as_dict()
+    return deltas
+
+
+def trim_to_budget(old_features: dict, new_features: dict, deltas: dict, render, token_budget: int) -> tuple[str, list[str]]:
+    # REMOVE DETALHES DAS SEÇÕES MENOS IMPORTANTES ATÉ O PROMPT CABER NO ORÇAMENTO DE TOKENS
+    old_features = json.loads(json.dumps(old_features, default=str))
+    new_features = json.loads(json.dumps(new_features, default=str))
+    trimmed = []
+    prompt = render(old_features, new_features, deltas)
+    for section in TRIM_ORDER:
+        if estimate_tokens(prompt) <= token_budget:
+            break
+        for features in (old_features, new_features):
+            count = features[section].get("count") if isinstance(features[section], dict) else None
+            features[section] = {"count": count, "omitted": True} if count is not None else {"omitted": True}
+        trimmed.append(section)
+        prompt = render(old_features, new_features, deltas)
+    if estimate_tokens(prompt) > token_budget and "changed_sections" in deltas:
+        deltas = {key: value for key, value in deltas.items() if key != "changed_sections"}
+        trimmed.append("changed_sections")
+        prompt = render(old_features, new_features, deltas)
+    return prompt, trimmed
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+import openai
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class RateGovernor:
+    def __init__(
+        self,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_concurrency: int | None = None,
+        max_retries: int | None = None,
+        base_delay: float | None = None,
+        max_delay: float | None = None,
+    ):
+        self.requests_per_minute = requests_per_minute or settings.OPENAI_REQUESTS_PER_MINUTE
+        self.tokens_per_minute = tokens_per_minute or settings.OPENAI_TOKENS_PER_MINUTE
+        self.max_retries = settings.OPENAI_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay or settings.OPENAI_RETRY_BASE_DELAY
+        self.max_delay = max_delay or settings.OPENAI_RETRY_MAX_DELAY
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.OPENAI_MAX_CONCURRENCY)
+        # FILA FIFO: QUEM CHEGA PRIMEIRO RESERVA O ORÇAMENTO PRIMEIRO
+        self._queue_lock = asyncio.Lock()
+        self._request_budget = float(self.requests_per_minute)
+        self._token_budget = float(self.tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self.counters = {"requests": 0, "retries": 0, "throttled_waits": 0, "queued": 0, "in_flight": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self._updated_at) / 60
+        self._updated_at = now
+        self._request_budget = min(self.requests_per_minute, self._request_budget + elapsed_minutes * self.requests_per_minute)
+        self._token_budget = min(self.tokens_per_minute, self._token_budget + elapsed_minutes * self.tokens_per_minute)
+
+    async def _reserve(self, estimated_tokens: int):
+        estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+        self.counters["queued"] += 1
+        try:
+            async with self._queue_lock:
+                while True:
+                    self._refill()
+                    if self._request_budget >= 1 and self._token_budget >= estimated_tokens:
+                        self._request_budget -= 1
+                        self._token_budget -= estimated_tokens
+                        return
+                    missing_requests = max(1 - self._request_budget, 0) / self.requests_per_minute
+                    missing_tokens = max(estimated_tokens - self._token_budget, 0) / self.tokens_per_minute
+                    self.counters["throttled_waits"] += 1
+                    await asyncio.sleep(max(missing_requests, missing_tokens) * 60)
+        finally:
+            self.counters["queued"] -= 1
+
+    def settle(self, estimated_tokens: int, actual_tokens: int | None):
+        # CORRIGE O ORÇAMENTO DE TOKENS COM O USO REAL INFORMADO PELA API
+        if actual_tokens is not None:
+            self._token_budget -= actual_tokens - min(estimated_tokens, self.tokens_per_minute)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        attempt = 0
+        while True:
+            await self._reserve(estimated_tokens)
+            async with self._semaphore:
+                self.counters["in_flight"] += 1
+                self.counters["requests"] += 1
+                try:
+                    return await call()
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logger.warning("OpenAI indisponível ou limitando requisições (%s). Nova tentativa em %.1fs.", type(e).__name__, delay)
+                finally:
+                    self.counters["in_flight"] -= 1
+            self.counters["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            **self.counters,
+            "request_budget": round(self._request_budget, 2),
+            "token_budget": round(self._token_budget, 2),
+        }
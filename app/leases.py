@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+import logging
+import os
+import socket
+from typing import Iterable
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .metrics import LEASE_CONFLICTS, LEASES_LOST
+from .scheduling import local_now
+
+logger = logging.getLogger(__name__)
+
+
+def default_replica_id() -> str:
+    return settings.REPLICA_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseManager:
+    # COORDENA VÁRIAS RÉPLICAS (WORKERS DO uvicorn OU CONTAINERS) PELO BANCO: UM DOCUMENTO SÓ É PROCESSADO POR QUEM TEM O LEASE.
+    # O LEASE É RENOVADO ENQUANTO O DOCUMENTO ESTÁ EM ANDAMENTO AQUI; SE A RÉPLICA CAIR, ELE EXPIRA E OUTRA PODE RETOMAR O JOB
+    def __init__(self, owner: str | None = None, ttl_seconds: int | None = None):
+        self.owner = owner or default_replica_id()
+        self.ttl = datetime.timedelta(seconds=ttl_seconds or settings.LEASE_TTL_SECONDS)
+        self._held: set[int] = set()
+        self._renew_task: asyncio.Task | None = None
+
+    async def start(self):
+        if self._renew_task is None:
+            self._renew_task = asyncio.create_task(self._renew_loop())
+
+    async def close(self):
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            try:
+                await self._renew_task
+            except asyncio.CancelledError:
+                pass
+            self._renew_task = None
+        # ENCERRAMENTO NORMAL: OUTRAS RÉPLICAS NÃO PRECISAM ESPERAR A EXPIRAÇÃO
+        await self.release(self._held)
+
+    async def claim(self, document_ids: Iterable[int]) -> set[int]:
+        # DOCUMENTOS QUE ESTA RÉPLICA JÁ ESTÁ PROCESSANDO TAMBÉM FICAM DE FORA
+        requested = set(document_ids) - self._held
+        if not requested:
+            return set()
+        now = local_now()
+        async with AsyncSessionLocal() as db:
+            claimed = await async_crud.claim_document_leases(db, list(requested), self.owner, now, now + self.ttl)
+        self._held |= claimed
+        if len(claimed) < len(requested):
+            LEASE_CONFLICTS.inc(len(requested) - len(claimed))
+        return claimed
+
+    async def release(self, document_ids: Iterable[int]):
+        released = set(document_ids) & self._held
+        if not released:
+            return
+        self._held -= released
+        try:
+            async with AsyncSessionLocal() as db:
+                await async_crud.release_document_leases(db, list(released), self.owner)
+        except Exception as e:
+            # O LEASE EXPIRA SOZINHO; SÓ ATRASA QUEM QUISER O DOCUMENTO
+            logger.warning("Não foi possível liberar %s leases -> %s", len(released), e)
+
+    async def _renew_loop(self):
+        while True:
+            await asyncio.sleep(self.ttl.total_seconds() / 3)
+            held = set(self._held)
+            if not held:
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    renewed = await async_crud.renew_document_leases(db, list(held), self.owner, local_now() + self.ttl)
+            except Exception as e:
+                logger.warning("Falha ao renovar %s leases; nova tentativa em %.0fs -> %s", len(held), self.ttl.total_seconds() / 3, e)
+                continue
+            # SÓ OS QUE CONTINUAM AQUI SAEM DO CONJUNTO; UM LEASE LIBERADO DURANTE A RENOVAÇÃO NÃO É PERDA
+            lost = (held - renewed) & self._held
+            if lost:
+                self._held -= lost
+                LEASES_LOST.inc(len(lost))
+                logger.error("%s leases expiraram e foram assumidos por outra réplica: %s", len(lost), sorted(lost))
+
+    def stats(self) -> dict:
+        return {"owner": self.owner, "held": len(self._held), "ttl_seconds": int(self.ttl.total_seconds())}
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from collections import deque
+from .config import settings
+
+# STATUS QUE INDICAM SOBRECARGA DO SERVIDOR (O LIMITE DEVE CAIR)
+OVERLOAD_STATUSES = {429, 502, 503, 504}
+# AMOSTRAS DE LATÊNCIA POR CHAVE: HISTÓRICO LONGO (LINHA DE BASE) E JANELA CURTA (SITUAÇÃO ATUAL)
+LATENCY_HISTORY_SAMPLES = 500
+LATENCY_RECENT_SAMPLES = 20
+LATENCY_MIN_SAMPLES = 50
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class AdaptiveLimiter:
+    # LIMITE DE CONCORRÊNCIA AIMD: CRESCE +1 POR "JANELA" DE SUCESSOS E CAI PELA METADE EM 429/5xx/TIMEOUT.
+    # LATÊNCIA SUBINDO ACIMA DA LINHA DE BASE DA ROTA TAMBÉM REDUZ O LIMITE, ANTES MESMO DOS ERROS.
+    def __init__(
+        self,
+        initial_limit: int | None = None,
+        min_limit: int | None = None,
+        max_limit: int | None = None,
+        backoff_ratio: float | None = None,
+        latency_tolerance: float | None = None,
+    ):
+        self.min_limit = min_limit or settings.TRATUM_LIMIT_MIN
+        self.max_limit = max_limit or settings.TRATUM_LIMIT_MAX
+        self.limit = float(min(max(initial_limit or settings.TRATUM_LIMIT_INITIAL, self.min_limit), self.max_limit))
+        self.backoff_ratio = backoff_ratio or settings.TRATUM_LIMIT_BACKOFF_RATIO
+        self.latency_tolerance = latency_tolerance or settings.TRATUM_LIMIT_LATENCY_TOLERANCE
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._resume_handle: asyncio.TimerHandle | None = None
+        self._last_decrease = 0.0
+        # POR ROTA (MODELO DA URL): AMOSTRAS DE LATÊNCIA EM SEGUNDOS
+        self._history: dict[str, deque[float]] = {}
+        self._recent: dict[str, deque[float]] = {}
+        self.counters = {"requests": 0, "overloads": 0, "latency_backoffs": 0, "increases": 0}
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit) and time.monotonic() >= self._paused_until
+
+    def _wake(self):
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+        if self._waiters and self._paused_until > time.monotonic() and self._resume_handle is None:
+            # DURANTE A PAUSA NENHUM release VAI ACORDAR A FILA: AGENDA O FIM DA PAUSA (UM ÚNICO TIMER POR VEZ)
+            self._resume_handle = asyncio.get_running_loop().call_later(self._paused_until - time.monotonic(), self._resume)
+
+    def _resume(self):
+        self._resume_handle = None
+        self._wake()
+
+    async def acquire(self):
+        if not self._waiters and self._has_capacity():
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wake()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A VAGA FOI CONCEDIDA JUNTO COM O CANCELAMENTO: DEVOLVE PARA O PRÓXIMO DA FILA
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _decrease(self, ratio: float):
+        now = time.monotonic()
+        # NO MÁXIMO UMA REDUÇÃO POR JANELA: AS RESPOSTAS DE UMA MESMA RAJADA NÃO DERRUBAM O LIMITE VÁRIAS VEZES
+        window = max((_percentile(samples, 0.5) for samples in self._recent.values()), default=1.0)
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * ratio)
+
+    def _latency_degraded(self, key: str, latency: float) -> bool:
+        history = self._history.setdefault(key, deque(maxlen=LATENCY_HISTORY_SAMPLES))
+        recent = self._recent.setdefault(key, deque(maxlen=LATENCY_RECENT_SAMPLES))
+        history.append(latency)
+        recent.append(latency)
+        if len(history) < LATENCY_MIN_SAMPLES or len(recent) < LATENCY_RECENT_SAMPLES:
+            return False
+        # MEDIANA RECENTE CONTRA O P90 DO HISTÓRICO: UMA MISTURA NORMAL DE CHAMADAS RÁPIDAS E LENTAS NÃO DISPARA,
+        # SÓ UMA LENTIDÃO GERAL DA ROTA
+        return _percentile(recent, 0.5) > _percentile(history, 0.9) * self.latency_tolerance
+
+    def release(self, key: str, latency: float | None, overloaded: bool = False, retry_after: float | None = None):
+        self.in_flight -= 1
+        self.counters["requests"] += 1
+        if overloaded:
+            self.counters["overloads"] += 1
+            self._decrease(self.backoff_ratio)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        elif latency is not None:
+            if self._latency_degraded(key, latency):
+                self.counters["latency_backoffs"] += 1
+                self._decrease(0.9)
+            # SEM ERRO NEM TIMEOUT O CRESCIMENTO ADITIVO CONTINUA: A REDUÇÃO POR LATÊNCIA (UMA POR JANELA) SÓ O EQUILIBRA
+            if self.in_flight + 1 >= int(self.limit) / 2 and self.limit < self.max_limit:
+                # SÓ CRESCE QUANDO O LIMITE ESTÁ SENDO USADO; +1/limite POR SUCESSO = +1 POR JANELA COMPLETA
+                self.counters["increases"] += 1
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self._wake()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "paused_for_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 2),
+            "baseline_p90_latency_ms": {key: round(_percentile(samples, 0.9) * 1000, 1) for key, samples in self._history.items()},
+            "recent_p50_latency_ms": {key: round(_percentile(samples, 0.5) * 1000, 1) for key, samples in self._recent.items()},
+        }
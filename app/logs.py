@@ -0,0 +1,97 @@
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import uuid
+from contextlib import contextmanager
+from .config import settings
+
+# IDENTIFICADORES DA EXECUÇÃO ATUAL. CADA TASK DO asyncio HERDA UMA CÓPIA DO CONTEXTO NA CRIAÇÃO,
+# ENTÃO O trace_id DE UM DOCUMENTO ACOMPANHA O gather DAS SEÇÕES, A COMPARAÇÃO E AS CHAMADAS AO BANCO.
+trace_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+document_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("document", default=None)
+
+# ATRIBUTOS PADRÃO DO LogRecord; O QUE NÃO ESTIVER AQUI VEIO DE extra= E VAI PARA O JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def log_context(trace_id: str | None = None, document: str | None = None):
+    # SÓ SOBRESCREVE O QUE FOI INFORMADO; AO SAIR, RESTAURA O CONTEXTO ANTERIOR
+    tokens = []
+    if trace_id is not None:
+        tokens.append((trace_id_var, trace_id_var.set(trace_id)))
+    if document is not None:
+        tokens.append((document_var, document_var.set(document)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id, document = trace_id_var.get(), document_var.get()
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if document:
+            entry["document"] = document
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    # A LINHA JSON É MONTADA AQUI, NA TASK QUE FEZ O LOG (ONDE ESTÃO OS contextvars);
+    # A THREAD DO QueueListener SÓ ESCREVE NO STDOUT, SEM BLOQUEAR O EVENT LOOP
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+def configure_logging(level: str | None = None):
+    global _listener
+    logger = logging.getLogger("app")
+    logger.setLevel((level or settings.LOG_LEVEL).upper())
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _PreformattedQueueHandler(log_queue)
+    handler.setFormatter(JsonFormatter())
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(message)s"))
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    logger.handlers = [handler]
+    logger.propagate = False
+
+
+def shutdown_logging():
+    # ESVAZIA A FILA ANTES DE ENCERRAR O PROCESSO
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
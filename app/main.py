@@ -1,47 +1,74 @@
 import asyncio
 import datetime
-import pandas as pd
+import logging
 from typing import Any
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from contextlib import asynccontextmanager
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from . import crud, models, schemas, services
-from .database import engine, get_db, SessionLocal
+from . import async_crud, backfill, column_types, crud, leases, logs, metrics, migrations, models, schemas, services, pipeline, persistence, repair, scheduling
+from .config import settings
+from .database import AsyncSessionLocal, async_engine, engine, get_db
+
+logs.configure_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("INICIANDO A APLICAÇÃO")
+    logger.info("Iniciando a aplicação")
+    column_types.check_codec()
+    with migrations.schema_lock(engine):
+        models.Base.metadata.create_all(bind=engine)
+        migrations.run_migrations(engine)
+    await tratum_service.start()
     await tratum_service.get_token()
+    await lease_manager.start()
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(analysis_job, 'date')
+    # TICK CURTO E RECORRENTE: CADA UM ANALISA SÓ OS DOCUMENTOS QUE VENCERAM, MANTENDO A CARGA PLANA
+    scheduler.add_job(
+        cadence_scheduler.tick, 'interval',
+        minutes=settings.SCHEDULER_TICK_MINUTES,
+        next_run_time=datetime.datetime.now(),
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(comparison_service.cache.evict, 'interval', hours=24)
+    scheduler.add_job(section_repairer.run, 'interval', minutes=settings.SECTION_REPAIR_INTERVAL_MINUTES)
+    # JOBS DE UMA RÉPLICA QUE CAIU FICAM SEM LEASE RENOVADO; QUALQUER OUTRA OS RETOMA APÓS A EXPIRAÇÃO
+    scheduler.add_job(analysis_pipeline.resume_unfinished_jobs, 'interval', minutes=settings.JOB_RESUME_INTERVAL_MINUTES, max_instances=1, coalesce=True)
     scheduler.start()
-    print("SCHEDULER INICIADO")
+    logger.info("Scheduler iniciado (réplica %s)", lease_manager.owner)
+    await analysis_writer.start()
+    asyncio.create_task(analysis_pipeline.resume_unfinished_jobs())
     yield
-    print("APLICAÇÃO ENCERRADA")
+    scheduler.shutdown(wait=False)
+    await analysis_writer.stop()
+    await lease_manager.close()
+    await tratum_service.close()
+    await async_engine.dispose()
+    logger.info("Aplicação encerrada")
+    logs.shutdown_logging()
     
 
 app = FastAPI(lifespan=lifespan)
 
 tratum_service = services.TratumService()
 comparison_service = services.ComparisonService()
+analysis_writer = persistence.AnalysisWriter()
+lease_manager = leases.LeaseManager()
+analysis_pipeline = pipeline.AnalysisPipeline(tratum_service, comparison_service, writer=analysis_writer, leases=lease_manager)
+backfill_engine = backfill.BackfillEngine(tratum_service, analysis_writer)
+section_repairer = repair.SectionRepairer(tratum_service, leases=lease_manager)
+cadence_scheduler = scheduling.CadenceScheduler(analysis_pipeline)
 
+# GAUGES LIDOS NA HORA DA COLETA, DIRETO DO ESTADO DOS SERVIÇOS
+metrics.POLLER_ANALYSES.set_function(lambda: {(state,): count for state, count in tratum_service.poller.stats().items()})
+metrics.TRATUM_IN_FLIGHT.set_function(lambda: {(host,): limiter.in_flight for host, limiter in tratum_service.limiters.items()})
+metrics.TRATUM_CONCURRENCY_LIMIT.set_function(lambda: {(host,): int(limiter.limit) for host, limiter in tratum_service.limiters.items()})
+metrics.PERSISTENCE_PENDING.set_function(lambda: {(): analysis_writer.stats()["pending"]})
+metrics.LEASES_HELD.set_function(lambda: {(): lease_manager.stats()["held"]})
 
-missing_records = [
-    {'analytics_id': 42876, 'consume_unique_id': 45495, 'document': '03995458000116'},
-    {'analytics_id': 42883, 'consume_unique_id': 45502, 'document': '01440847000150'},
-    {'analytics_id': 42884, 'consume_unique_id': 45503, 'document': '07079993000188'},
-    {'analytics_id': 42886, 'consume_unique_id': 45505, 'document': '02485314000157'},
-    {'analytics_id': 42887, 'consume_unique_id': 45506, 'document': '03063198000140'},
-    {'analytics_id': 42900, 'consume_unique_id': 45519, 'document': '03693847000197'},
-    {'analytics_id': 42901, 'consume_unique_id': 45520, 'document': '01159435000146'},
-    {'analytics_id': 42903, 'consume_unique_id': 45522, 'document': '06119918000130'},
-    {'analytics_id': 42908, 'consume_unique_id': 45527, 'document': '00942557000141'},
-    {'analytics_id': 42911, 'consume_unique_id': 45530, 'document': '06097792000140'},
-    {'analytics_id': 42912, 'consume_unique_id': 45531, 'document': '01136104000190'},
-    {'analytics_id': 42916, 'consume_unique_id': 45535, 'document': '02744470000195'}
-]
 
 example_documents = [
     {'document': '26362390000133'},
@@ -54,234 +81,97 @@ example_documents = [
 
 
 async def resync_all_analyses_task():
-    print("="*50)
-    print(f"TAREFA DE RESSINCRONIZAÇÃO INICIADA: {datetime.datetime.now()}")
-    
-    db = SessionLocal()
-    try:
-        all_documents = crud.get_active_documents(db)
-        total_docs = len(all_documents)
-        print(f"ENCONTRADOS {total_docs} DOCUMENTOS PARA RESSINCRONIZAR.")
-        
-        for i, doc in enumerate(all_documents):
-            print(f"\n--- Processando {i + 1}/{total_docs}: {doc.document} (ID: {doc.id}) ---")
-            analysis_data = await tratum_service.generate_analysis(doc.document)
-            if not analysis_data:
-                print(f"Não foi possível gerar dados para o documento {doc.document}. Pulando.")
-                continue
-            crud.create_analysis(db, document_id=doc.id, analysis_data=analysis_data)
-            print(f"Análise para {doc.document} salva com sucesso no banco de dados.")
-
-    finally:
-        db.close()
-        print(f"TAREFA DE RESSINCRONIZAÇÃO FINALIZADA: {datetime.datetime.now()}")
-        print("="*50)
+    logger.info("Tarefa de ressincronização iniciada")
+    async with AsyncSessionLocal() as db:
+        documents = [(doc.id, doc.document) for doc in await async_crud.get_active_documents(db)]
+    logger.info("Encontrados %s documentos para ressincronizar", len(documents))
+    await analysis_pipeline.run(documents, label="RESSINCRONIZAÇÃO", compare=False)
+    logger.info("Tarefa de ressincronização finalizada")
 
 
 async def analysis_job():
-    print("="*50)
-    print(f"AGENDAMENTO INICIADO: {datetime.datetime.now()}")
-    db = SessionLocal()
-    try:
-        documents = crud.get_active_documents(db)
-        # documents = crud.get_active_documents_from_id(db, start_id=11) # Linha para testes
-        print(f"ENCONTRADOS {len(documents)} DOCUMENTOS PARA MONITORAR")
+    logger.info("Agendamento iniciado")
+    async with AsyncSessionLocal() as db:
+        documents = [(doc.id, doc.document) for doc in await async_crud.get_active_documents(db)]
+        # documents = [(doc.id, doc.document) for doc in await async_crud.get_active_documents_from_id(db, start_id=11)] # Linha para testes
+    logger.info("Encontrados %s documentos para monitorar", len(documents))
+    await analysis_pipeline.run(documents, label="AGENDAMENTO")
         
-        for doc in documents:
-            print(f"\n--- Processando: {doc.document} (ID: {doc.id}) ---")
-            result_data = await tratum_service.generate_analysis(doc.document)
-            if not result_data or not result_data.get("analysis_json"):
-                print(f"Não foi possível gerar dados para o documento {doc.document}. Pulando.")
-                continue
-            analysis_json = result_data["analysis_json"]
-            unique_id = result_data["unique_id"]
-            analytics_id = result_data["analytics_id"]
-            new_analysis = crud.create_analysis(
-                db, 
-                document_id=doc.id, 
-                analysis_data=analysis_json,
-                unique_id=unique_id,
-                analytics_id=analytics_id
-            )
-            
-            last_two = crud.get_last_two_analyses(db, document_id=doc.id)
-            
-            if len(last_two) == 2:
-                print("COMPARANDO ANALISES COM O GPT")
-                new_data = last_two[0].analysis_json
-                old_data = last_two[1].analysis_json
-                summary, usage_info = await comparison_service.gpt_comparer(doc.document, old_data, new_data)
-                
-                print("==== RESUMO DA COMPARAÇÃO ====")
-                print(summary)
-                
-                if usage_info:
-                    print("--- USO DE TOKENS (OpenAI) ---")
-                    print(f"   Tokens TOTAIS: {usage_info.get('total_tokens')}")
-                    print("------------------------------")
-                    crud.update_analysis_with_summary(db, analysis_id=new_analysis.id, summary=summary, usage=usage_info)
-                else:
-                    crud.update_analysis_with_summary(db, analysis_id=new_analysis.id, summary=summary, usage={})
-            else:
-                print("Análise inicial salva. Comparação ocorrerá no próximo ciclo.")
-    finally:
-        db.close()
-        print("="*50)
-        
-async def backfill_csv_task():
-    print("="*50)
-    print(f"TAREFA DE BACKFILL INICIADA: {datetime.datetime.now()}")
-    db = SessionLocal()
-    
+async def backfill_csv_task(path: str, restart: bool = False):
+    logger.info("Tarefa de backfill iniciada")
     try:
-        df_ids = pd.read_csv('ids_analytics_and_consume.csv')
-        total_rows= len(df_ids)
-        print(f"Encontrei {total_rows} registros no CSV para processar.")
-        
-        for index, row in df_ids.iterrows():
-            analytics_id = int(row['analytics_id'])
-            consume_unique_id = int(row['consume_unique_id'])
-            document_number = str(row['document'])  
-            print(f"\n--- Processando linha {index + 1}/{total_rows}: Documento {document_number} ---")
-            
-            monitored_doc = crud.get_document_by_number(db, document_number=document_number)
-            if not monitored_doc:
-                print(f"AVISO: Documento {document_number} não encontrado na tabela 'monitored_documents'. Pulando.")
-                continue
-            
-            result_data = await tratum_service.fetch_existing_analysis(
-                analytics_id=analytics_id,
-                consume_unique_id=consume_unique_id,
-                document_number=document_number
-            )
-            
-            if not result_data or not result_data.get("analysis_json"):
-                print(f"Não foi possível buscar os dados para a análise ID {analytics_id}. Pulando.")
-                continue
-            
-            crud.create_analysis(
-                db, 
-                document_id=monitored_doc.id,
-                analysis_data=result_data["analysis_json"],
-                unique_id=result_data["unique_id"],
-                analytics_id=result_data["analytics_id"]
-            )
-            print(f"Análise para o documento {document_number} (ID: {analytics_id}) salva com sucesso.")
-            
+        await backfill_engine.run_csv(path, restart=restart)
     finally:
-        db.close()
-        print(f"TAREFA DE BACKFILL FINALIZADA: {datetime.datetime.now()}")
-        print("="*50)
+        logger.info("Tarefa de backfill finalizada")
 
 
 async def generate_specific_analyses_task(documents_to_process: list[str]):
-    print("="*50)
-    print(f"TAREFA DE ANÁLISE ESPECÍFICA INICIADA: {datetime.datetime.now()}")
-    db = SessionLocal()
-    
-    try:
-        total_docs = len(documents_to_process)
-        print(f"Processando lista com {total_docs} documentos específicos.")
-        for i, doc_number in enumerate(documents_to_process):
-            print(f"\n--- Processando item {i + 1}/{total_docs}: {doc_number} ---")
-            monitored_doc = crud.get_document_by_number(db, document_number=doc_number)
+    logger.info("Tarefa de análise específica iniciada")
+    async with AsyncSessionLocal() as db:
+        logger.info("Processando lista com %s documentos específicos", len(documents_to_process))
+        documents = []
+        for doc_number in documents_to_process:
+            monitored_doc = await async_crud.get_document_by_number(db, document_number=doc_number)
             if not monitored_doc:
-                print(f"AVISO: Documento {doc_number} não está na lista de monitorados. Pulando.")
+                logger.warning("Documento %s não está na lista de monitorados. Pulando.", doc_number)
                 continue
-            result_data = await tratum_service.generate_analysis(doc_number)  
-            if not result_data or not result_data.get("analysis_json"):
-                print(f"Não foi possível gerar dados para o documento {doc_number}. Pulando.")
-                continue
-            new_analysis = crud.create_analysis(
-                db,
-                document_id=monitored_doc.id,
-                analysis_data=result_data["analysis_json"],
-                unique_id=result_data["unique_id"],
-                analytics_id=result_data["analytics_id"]
-            )
-            print(f"Nova análise para o documento {doc_number} salva com sucesso.")
-            last_two = crud.get_last_two_analyses(db, document_id=monitored_doc.id)
-            if len(last_two) == 2:
-                print("COMPARANDO NOVA ANÁLISE COM A ANTERIOR VIA GPT")
-                new_data = last_two[0].analysis_json
-                old_data = last_two[1].analysis_json
-                summary, usage_info = await comparison_service.gpt_comparer(monitored_doc.document, old_data, new_data)
-                
-                print("==== NOVO RESUMO DA COMPARAÇÃO ====")
-                print(summary)
-                if usage_info:
-                    print("--- USO DE TOKENS (OpenAI) ---")
-                    print(f"   Tokens TOTAIS: {usage_info.get('total_tokens')}")
-                    print("------------------------------")
-                    crud.update_analysis_with_summary(db, analysis_id=new_analysis.id, summary=summary, usage=usage_info)
-            else:
-                print("Esta é a primeira análise salva para este documento. A comparação ocorrerá no próximo ciclo.")
-    finally:
-        db.close()
-        print(f"TAREFA DE ANÁLISE ESPECÍFICA FINALIZADA: {datetime.datetime.now()}")
-        print("="*50)
+            documents.append((monitored_doc.id, monitored_doc.document))
+    await analysis_pipeline.run(documents, label="ANÁLISE ESPECÍFICA")
+    logger.info("Tarefa de análise específica finalizada")
         
 async def backfill_examples_tasks():
-    print("="*50)
-    print(f"TAREFA DE EXEMPLOS CRIADA: {datetime.datetime.now()}")
-    db = SessionLocal()
+    logger.info("Tarefa de exemplos criada")
+    db = AsyncSessionLocal()
     
     try: 
         total_rows = len(example_documents)
-        print(f"Processando os {total_rows} registros selecionados")
+        logger.info("Processando os %s registros selecionados", total_rows)
         for example in example_documents:
             analysis_job(example)
     finally:
-        db.close()
-        print(f"Tarefa finalizada")
+        await db.close()
+        logger.info("Tarefa de exemplos finalizada")
    
-async def backfill_missing_task():
-    print("="*50)
-    print(f"TAREFA DE BACKFILL DOS FALTANTES INICIADA: {datetime.datetime.now()}")
-    db = SessionLocal()
-    
+async def backfill_missing_task(restart: bool = False):
+    logger.info("Tarefa de backfill dos faltantes iniciada")
     try:
-        total_rows = len(missing_records)
-        print(f"Processando os {total_rows} registros faltantes.")
-        for index, record in enumerate(missing_records):
-            analytics_id = record['analytics_id']
-            consume_unique_id = record['consume_unique_id']
-            document_number = record['document']
-            print(f"\n--- Processando item {index + 1}/{total_rows}: Documento {document_number} ---")
-            monitored_doc = crud.get_document_by_number(db, document_number=document_number)
-            if not monitored_doc:
-                print(f"AVISO: Documento {document_number} não encontrado na tabela 'monitored_documents'. Pulando.")
-                continue
-            result_data = await tratum_service.fetch_existing_analysis(
-                analytics_id=analytics_id,
-                consume_unique_id=consume_unique_id,
-                document_number=document_number
-            )
-            if not result_data or not result_data.get("analysis_json"):
-                print(f"Não foi possível buscar os dados para a análise ID {analytics_id}. Pulando.")
-                continue
-            crud.create_analysis(
-                db,
-                document_id=monitored_doc.id,
-                analysis_data=result_data["analysis_json"],
-                unique_id=result_data["unique_id"],
-                analytics_id=result_data["analytics_id"]
-            )
-            print(f"Análise para o documento {document_number} (ID: {analytics_id}) salva com sucesso.")
+        await backfill_engine.run_csv(settings.BACKFILL_MISSING_CSV_PATH, restart=restart)
     finally:
-        db.close()
-        print(f"TAREFA DE BACKFILL DOS FALTANTES FINALIZADA: {datetime.datetime.now()}")
-        print("="*50)     
+        logger.info("Tarefa de backfill dos faltantes finalizada")
         
+async def compact_analyses_task():
+    logger.info("Tarefa de compactação das análises iniciada")
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            moved = await async_crud.compact_inline_analyses(db)
+        if not moved:
+            break
+        total += moved
+        logger.info("%s análises movidas para o armazenamento por seções", total)
+    logger.info("Tarefa de compactação finalizada: %s análises compactadas", total)
+
+@app.post("/maintenance/compact-analyses", status_code=202, tags=["Manutenção"])
+async def trigger_compact_analyses():
+    logger.debug("Rota de compactação das análises acionada")
+    asyncio.create_task(compact_analyses_task())
+    return {"message": "Tarefa de compactação das análises iniciada em segundo plano."}
+
+@app.post("/maintenance/repair-sections", status_code=202, tags=["Manutenção"])
+async def trigger_repair_sections():
+    logger.debug("Rota de reparo das seções acionada")
+    asyncio.create_task(section_repairer.run())
+    return {"message": "Reparo das seções que falharam iniciado em segundo plano.", "last_run": section_repairer.last_run}
+
 @app.post("/maintenance/backfill-from-csv", status_code=202, tags=["Manutenção"])
-async def trigger_backfill():
-     print(">>> Rota de Backfill acionada.")
-     asyncio.create_task(backfill_csv_task())
+async def trigger_backfill(path: str | None = None, restart: bool = False):
+     logger.debug("Rota de backfill acionada")
+     asyncio.create_task(backfill_csv_task(path or settings.BACKFILL_CSV_PATH, restart=restart))
      return {"message": "Tarefa de backfill iniciada. Olhando os logs do servidor"}  
 
 @app.post("examples", status_code=202, tags=["Analise"])
 def trigger_example():
-    print(">>> Rota de exemplos acionada.")
+    logger.debug("Rota de exemplos acionada")
     asyncio.create_task(backfill_examples_tasks())
     return {"message": "Tarefa de exemplos iniciada, Olhando os logs do servidor"}
         
@@ -296,16 +186,37 @@ def health_check(db: Session = Depends(get_db)):
             "database_connection": "Falhou",
             "detail": str(e)
         }        
+@app.get("/http-stats", summary="Reuso de conexões com a Tratum", tags=["Status"])
+def http_stats():
+    return tratum_service.connection_stats()
+
+@app.get("/metrics", summary="Métricas no formato Prometheus", tags=["Status"])
+async def prometheus_metrics():
+    # async: A COLETA RODA NO EVENT LOOP, SEM CONCORRER COM AS ATUALIZAÇÕES DAS MÉTRICAS
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/persistence/stats", summary="Gravação em lote e latência de cada lote", tags=["Status"])
+def persistence_stats():
+    return analysis_writer.stats()
+
+@app.get("/maintenance/backfill-status", summary="Progresso dos backfills desde o início do processo", tags=["Status"])
+def backfill_status():
+    return backfill_engine.progress
+
+@app.get("/comparison-cache/stats", summary="Estatísticas do cache de comparações", tags=["Status"])
+def comparison_cache_stats():
+    return {**comparison_service.cache.stats(), "skip_rate": comparison_service.skip_rate(), "openai_governor": comparison_service.governor.stats()}
+
 @app.post("/maintenance/resync-all", status_code=202, tags=["Manutenção"])
 async def trigger_resync():
-    print(">>> Rota de ressincronização acionada.")
+    logger.debug("Rota de ressincronização acionada")
     asyncio.create_task(resync_all_analyses_task())
     return {"message": "Tarefa de ressincronização iniciada em segundo plano."}
  
  
 @app.post("/analyses/generate-specific", status_code=202, tags=["Análises"])
 async def trigger_specific_analyses(request_body: schemas.GenerateAnalysesRequest):
-    print(">>> Rota de geração específica acionada...")
+    logger.debug("Rota de geração específica acionada")
     asyncio.create_task(generate_specific_analyses_task(request_body.documents))
     return {"message": f"Tarefa iniciada para gerar análises para {len(request_body.documents)} documentos. Monitore os logs do servidor."}
 
@@ -315,10 +226,62 @@ async def trigger_specific_analyses(request_body: schemas.GenerateAnalysesReques
 def add_monitored_document(doc: schemas.MonitoredDocumentCreate, db: Session = Depends(get_db)):
    return crud.create_monitored_document(db=db, doc=doc)
 
-#LISTAGEM DE TODOS OS DOCUMENTOS MONITORADOS
-@app.get("/documents/", response_model=list[schemas.MonitoredDocument]) 
-def read_all_documents(db: Session = Depends(get_db)):
-    return crud.get_active_documents(db)
+#ALTERAÇÃO DA CADÊNCIA DE UM DOCUMENTO; O PRÓXIMO HORÁRIO É RECALCULADO A PARTIR DE AGORA
+@app.put("/documents/{document_id}/cadence", response_model=schemas.DocumentCadence)
+def update_document_cadence(document_id: int, body: schemas.DocumentCadenceUpdate, db: Session = Depends(get_db)):
+    next_run_at = scheduling.next_slot(document_id, body.cadence_days, scheduling.local_now())
+    db_doc = crud.update_document_cadence(db, document_id, body.cadence_days, next_run_at)
+    if db_doc is None:
+        raise HTTPException(status_code=404, detail=f"Documento {document_id} não encontrado.")
+    return db_doc
+
+@app.get("/scheduler/stats", summary="Último tick do agendador por cadência", tags=["Status"])
+def scheduler_stats():
+    return {**(cadence_scheduler.last_tick or {}), "leases": lease_manager.stats()}
+
+def _analysis_list_item(analysis: models.Analysis, include_payload: bool) -> schemas.AnalysisListItem:
+    item = schemas.AnalysisListItem(
+        id=analysis.id,
+        document_id=analysis.document_id,
+        analysis_date=analysis.analysis_date,
+        unique_id=analysis.unique_id,
+        analytics_id=analysis.analytics_id,
+        total_tokens=analysis.total_tokens,
+        failed_sections=analysis.failed_sections
+    )
+    if include_payload:
+        item.analysis_json = analysis.analysis_json
+        item.comparison_resume = analysis.comparison_resume
+    return item
+
+#LISTAGEM PAGINADA DOS DOCUMENTOS MONITORADOS
+@app.get("/documents/", response_model=schemas.MonitoredDocumentPage, response_model_exclude_none=True)
+def read_all_documents(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: int | None = Query(None, description="Cursor: id do último documento da página anterior"),
+    analyses_limit: int = Query(1, ge=0, le=50, description="Quantidade de análises mais recentes por documento"),
+    include_payload: bool = Query(False, description="Inclui analysis_json e comparison_resume"),
+    db: Session = Depends(get_db)
+):
+    documents = crud.get_active_documents_page(db, limit=limit + 1, after_id=after_id)
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    analyses = crud.get_latest_analyses_for_documents(
+        db, [doc.id for doc in documents], per_document=analyses_limit, include_payload=include_payload
+    )
+    items = [
+        schemas.MonitoredDocumentListItem(
+            id=doc.id,
+            document=doc.document,
+            is_active=doc.is_active,
+            created_at=doc.created_at,
+            cadence_days=doc.cadence_days,
+            next_run_at=doc.next_run_at,
+            analyses=[_analysis_list_item(analysis, include_payload) for analysis in analyses[doc.id]]
+        )
+        for doc in documents
+    ]
+    return schemas.MonitoredDocumentPage(items=items, next_after_id=documents[-1].id if has_more else None)
 
 #DISPARO DA TAREFA MANUAL PRA TESTE
 @app.post("/trigger_analysis/", status_code=202)
@@ -345,7 +308,7 @@ async def get_analysis_summary(analytics_id: int, consume_unique_id: int):
     return summary_data
 
 @app.post("/maintenance/backfill-missing", status_code=202, tags=["Manutenção"])
-async def trigger_missing_backfill():
-    print(">>> Rota de backfill dos faltantes acionada...")
-    asyncio.create_task(backfill_missing_task())
+async def trigger_missing_backfill(restart: bool = False):
+    logger.debug("Rota de backfill dos faltantes acionada")
+    asyncio.create_task(backfill_missing_task(restart=restart))
     return {"message": "Tarefa de backfill para os registros faltantes iniciada."}
\ No newline at end of file
@@ -0,0 +1,172 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# MÉTRICAS NO FORMATO TEXTO DO PROMETHEUS, SEM DEPENDÊNCIA EXTERNA. TUDO RODA NO MESMO EVENT LOOP,
+# ENTÃO OS VALORES SÃO ATUALIZADOS SEM LOCK.
+# BUCKETS EM SEGUNDOS: DE REQUISIÇÕES HTTP (MILISSEGUNDOS) ATÉ A ESPERA PELO "DONE" DA TRATUM (MINUTOS)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"A métrica {self.name} espera os rótulos {self.label_names}, recebeu {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+        self._function: Callable[[], dict[tuple, float]] | None = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], dict[tuple, float]]):
+        # VALOR LIDO NA HORA DA COLETA (EX.: ESTADO DO LIMITADOR OU DA FILA DE GRAVAÇÃO)
+        self._function = function
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> list[str]:
+        values = self._function() if self._function is not None else self._values
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # POR COMBINAÇÃO DE RÓTULOS: CONTAGEM POR BUCKET (NÃO ACUMULADA), SOMA E TOTAL
+        self._series: dict[tuple, dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+        series["buckets"][bisect.bisect_left(self.buckets, value)] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series["buckets"]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica {metric.name} já registrada")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ETAPAS: login, initiate, time_to_done, aggregation, openai, db_write, document (PONTA A PONTA)
+STAGE_SECONDS = Histogram("voltz_stage_duration_seconds", "Duração de cada etapa do pipeline de análise.", ("stage",))
+TRATUM_REQUEST_SECONDS = Histogram("voltz_tratum_request_duration_seconds", "Latência das requisições HTTP à Tratum.", ("endpoint",))
+TRATUM_REQUEST_ERRORS = Counter("voltz_tratum_request_errors_total", "Requisições à Tratum com erro, por motivo.", ("endpoint", "reason"))
+SECTION_SECONDS = Histogram("voltz_tratum_section_duration_seconds", "Tempo para buscar cada seção da agregação (com páginas e novas tentativas).", ("section",))
+SECTION_FAILURES = Counter("voltz_tratum_section_failures_total", "Seções que ficaram pendentes de reparo.", ("section",))
+DOCUMENTS = Counter("voltz_documents_total", "Documentos processados por execução, por resultado.", ("run", "result"))
+JOB_FAILURES = Counter("voltz_job_failures_total", "Jobs de análise que terminaram em FAILED, pela etapa em que estavam.", ("stage",))
+COMPARISONS = Counter("voltz_comparisons_total", "Comparações por resultado (gpt, cache, sem alteração, erro).", ("outcome",))
+OPENAI_TOKENS = Counter("voltz_openai_tokens_total", "Tokens consumidos na OpenAI.", ("kind",))
+ANALYSES_IN_FLIGHT = Gauge("voltz_analyses_in_flight", "Documentos sendo processados agora pelo pipeline.")
+POLLER_ANALYSES = Gauge("voltz_poller_analyses", "Análises aguardando o DONE no poller.", ("state",))
+TRATUM_IN_FLIGHT = Gauge("voltz_tratum_requests_in_flight", "Requisições em andamento por host da Tratum.", ("host",))
+TRATUM_CONCURRENCY_LIMIT = Gauge("voltz_tratum_concurrency_limit", "Limite de concorrência atual do limitador adaptativo.", ("host",))
+PERSISTENCE_PENDING = Gauge("voltz_persistence_pending", "Itens aguardando gravação em lote.")
+LEASES_HELD = Gauge("voltz_leases_held", "Documentos com lease desta réplica (em processamento ou estacionados no poller).")
+LEASE_CONFLICTS = Counter("voltz_lease_conflicts_total", "Documentos ignorados porque outra réplica tinha o lease.")
+LEASES_LOST = Counter("voltz_leases_lost_total", "Leases que expiraram durante o processamento e foram assumidos por outra réplica.")
@@ -0,0 +1,224 @@
+import datetime
+import logging
+import time
+from contextlib import contextmanager
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import sqltypes
+from .column_types import compress_json, decompress_json, is_compressed
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# AS TABELAS NOVAS SÃO CRIADAS POR Base.metadata.create_all; AQUI FICAM AS ALTERAÇÕES EM TABELAS EXISTENTES.
+# CADA MIGRAÇÃO DEVE SER IDEMPOTENTE, POIS UM BANCO NOVO JÁ NASCE COM O SCHEMA ATUAL.
+
+
+def _columns(conn: Connection, table: str) -> dict:
+    return {column["name"]: column for column in inspect(conn).get_columns(table)}
+
+
+def _is_json(column: dict | None) -> bool:
+    return column is not None and isinstance(column["type"], sqltypes.JSON)
+
+
+def _0001_analysis_section_refs(conn: Connection):
+    columns = _columns(conn, "analyses")
+    if "section_refs" not in columns:
+        conn.execute(text("ALTER TABLE analyses ADD COLUMN section_refs JSON NULL"))
+    if conn.dialect.name == "mysql" and _is_json(columns.get("analysis_json")):
+        conn.execute(text("ALTER TABLE analyses MODIFY analysis_json JSON NULL"))
+
+
+def _recompress(engine: Engine, table: str, key: str, column: str, batch_size: int = 500):
+    # UMA TRANSAÇÃO POR LOTE: OS LOCKS DURAM SÓ O LOTE E, SE CAIR NO MEIO, AS LINHAS JÁ COMPRIMIDAS SÃO PULADAS NA PRÓXIMA SUBIDA
+    last_key = None
+    converted = 0
+    while True:
+        where = f"WHERE {key} > :last_key " if last_key is not None else ""
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT {key} AS row_key, {column} AS payload FROM {table} {where}ORDER BY {key} LIMIT {batch_size}"),
+                {"last_key": last_key}
+            ).all()
+            if not rows:
+                break
+            updates = [
+                {"row_key": row.row_key, "payload": compress_json(decompress_json(row.payload))}
+                for row in rows if row.payload is not None and not is_compressed(row.payload)
+            ]
+            if updates:
+                conn.execute(text(f"UPDATE {table} SET {column} = :payload WHERE {key} = :row_key"), updates)
+        converted += len(updates)
+        last_key = rows[-1].row_key
+    if converted:
+        logger.info("%s linhas comprimidas em %s.%s", converted, table, column)
+
+
+def _0002_compressed_payloads(engine: Engine):
+    # JSON -> LONGBLOB: O MYSQL CONVERTE O CONTEÚDO PARA TEXTO, QUE DEPOIS É COMPRIMIDO EM LOTES
+    if engine.dialect.name != "mysql":
+        return
+    with engine.begin() as conn:
+        analyses = _columns(conn, "analyses")
+        for column in ("analysis_json", "comparison_resume"):
+            if _is_json(analyses.get(column)):
+                conn.execute(text(f"ALTER TABLE analyses MODIFY {column} LONGBLOB NULL"))
+        if _is_json(_columns(conn, "analysis_sections").get("content")):
+            conn.execute(text("ALTER TABLE analysis_sections MODIFY content LONGBLOB NULL"))
+    _recompress(engine, "analyses", "id", "analysis_json")
+    _recompress(engine, "analyses", "id", "comparison_resume")
+    _recompress(engine, "analysis_sections", "content_hash", "content")
+
+
+def _indexes(conn: Connection, table: str) -> set[str]:
+    return {index["name"] for index in inspect(conn).get_indexes(table)}
+
+
+def _0003_analyses_document_date_index(conn: Connection):
+    if "ix_analyses_document_id_analysis_date" not in _indexes(conn, "analyses"):
+        conn.execute(text("CREATE INDEX ix_analyses_document_id_analysis_date ON analyses (document_id, analysis_date)"))
+
+
+def _0004_unique_analytics_id(conn: Connection):
+    # REMOVE DUPLICATAS (MANTÉM A LINHA MAIS RECENTE DE CADA analytics_id) ANTES DE CRIAR O ÍNDICE ÚNICO
+    duplicates = conn.execute(text(
+        "SELECT analytics_id, MAX(id) AS keep_id FROM analyses WHERE analytics_id IS NOT NULL "
+        "GROUP BY analytics_id HAVING COUNT(*) > 1"
+    )).all()
+    for row in duplicates:
+        params = {"analytics_id": row.analytics_id, "keep_id": row.keep_id}
+        removed_ids = [
+            removed.id for removed in conn.execute(
+                text("SELECT id FROM analyses WHERE analytics_id = :analytics_id AND id <> :keep_id"), params
+            )
+        ]
+        conn.execute(
+            text("UPDATE analysis_jobs SET analysis_id = :keep_id WHERE analysis_id IN :removed_ids")
+            .bindparams(bindparam("removed_ids", expanding=True)),
+            {"keep_id": row.keep_id, "removed_ids": removed_ids}
+        )
+        conn.execute(text("DELETE FROM analyses WHERE analytics_id = :analytics_id AND id <> :keep_id"), params)
+    if duplicates:
+        logger.info("%s analytics_id duplicados consolidados", len(duplicates))
+    if "ux_analyses_analytics_id" not in _indexes(conn, "analyses"):
+        conn.execute(text("CREATE UNIQUE INDEX ux_analyses_analytics_id ON analyses (analytics_id)"))
+
+
+def _0005_analysis_failed_sections(conn: Connection):
+    if "failed_sections" not in _columns(conn, "analyses"):
+        conn.execute(text("ALTER TABLE analyses ADD COLUMN failed_sections JSON NULL"))
+
+
+def _0006_document_cadence(conn: Connection):
+    columns = _columns(conn, "monitored_documents")
+    if "cadence_days" not in columns:
+        conn.execute(text("ALTER TABLE monitored_documents ADD COLUMN cadence_days INTEGER NULL"))
+    if "next_run_at" not in columns:
+        conn.execute(text("ALTER TABLE monitored_documents ADD COLUMN next_run_at DATETIME NULL"))
+    if "ix_monitored_documents_next_run_at" not in _indexes(conn, "monitored_documents"):
+        conn.execute(text("CREATE INDEX ix_monitored_documents_next_run_at ON monitored_documents (next_run_at)"))
+
+
+def _0007_analysis_repair_attempts(conn: Connection):
+    if "repair_attempts" not in _columns(conn, "analyses"):
+        conn.execute(text("ALTER TABLE analyses ADD COLUMN repair_attempts INTEGER NOT NULL DEFAULT 0"))
+
+
+MIGRATIONS = [
+    ("0001_analysis_section_refs", _0001_analysis_section_refs),
+    ("0002_compressed_payloads", _0002_compressed_payloads),
+    ("0003_analyses_document_date_index", _0003_analyses_document_date_index),
+    ("0004_unique_analytics_id", _0004_unique_analytics_id),
+    ("0005_analysis_failed_sections", _0005_analysis_failed_sections),
+    ("0006_document_cadence", _0006_document_cadence),
+    ("0007_analysis_repair_attempts", _0007_analysis_repair_attempts),
+]
+
+
+# MIGRAÇÕES QUE RECEBEM O ENGINE E CONTROLAM AS PRÓPRIAS TRANSAÇÕES (BACKFILLS EM LOTES); A VERSÃO SÓ É
+# REGISTRADA QUANDO TERMINAM, ENTÃO UMA INTERRUPÇÃO FAZ A MIGRAÇÃO CONTINUAR NA PRÓXIMA SUBIDA
+BATCHED_MIGRATIONS = {"0002_compressed_payloads"}
+
+
+MIGRATION_LOCK_NAME = "voltz_schema_migrations"
+
+
+@contextmanager
+def _sqlite_file_lock(path: str, timeout: float):
+    # NO SQLITE AS RÉPLICAS ESTÃO NO MESMO HOST: UM flock NO ARQUIVO AO LADO DO BANCO BASTA.
+    # fcntl SÓ EXISTE EM POSIX: É IMPORTADO AQUI PARA O MÓDULO CONTINUAR IMPORTÁVEL NO WINDOWS COM MYSQL/POSTGRES
+    import fcntl
+
+    with open(f"{path}.migrations.lock", "w") as lock_file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                # MESMA ESPERA LIMITADA DO GET_LOCK: UM DONO TRAVADO NÃO PRENDE A SUBIDA PARA SEMPRE
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"Não foi possível obter o lock das migrações em {timeout:.0f}s")
+                time.sleep(0.2)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def schema_lock(engine: Engine, timeout: float | None = None):
+    # VÁRIAS RÉPLICAS SUBINDO JUNTAS: SÓ UMA CRIA TABELAS E APLICA MIGRAÇÕES POR VEZ; AS OUTRAS ESPERAM E,
+    # AO ENTRAR, JÁ ENCONTRAM AS MIGRAÇÕES REGISTRADAS EM schema_migrations
+    timeout = timeout or settings.MIGRATION_LOCK_TIMEOUT_SECONDS
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        database = engine.url.database
+        if not database or database == ":memory:":
+            yield
+            return
+        with _sqlite_file_lock(database, timeout):
+            yield
+        return
+    if dialect not in ("mysql", "postgresql"):
+        raise RuntimeError(f"Lock de migrações não suportado para o banco '{dialect}'")
+    # O LOCK É DA SESSÃO: FICA NESTA CONEXÃO ATÉ O FIM, SEPARADA DAS CONEXÕES QUE APLICAM AS MIGRAÇÕES
+    with engine.connect() as conn:
+        if dialect == "mysql":
+            acquired = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": MIGRATION_LOCK_NAME, "timeout": int(timeout)}).scalar()
+            if acquired != 1:
+                raise RuntimeError(f"Não foi possível obter o lock das migrações em {timeout:.0f}s")
+        else:
+            conn.execute(text("SELECT pg_advisory_lock(hashtext(:name))"), {"name": MIGRATION_LOCK_NAME})
+        conn.commit()
+        try:
+            yield
+        finally:
+            if dialect == "mysql":
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+            else:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": MIGRATION_LOCK_NAME})
+            conn.commit()
+
+
+def run_migrations(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(64) NOT NULL PRIMARY KEY, applied_at DATETIME NOT NULL)"
+        ))
+        applied = {row.version for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    for version, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Aplicando migração %s", version)
+        if version in BATCHED_MIGRATIONS:
+            migration(engine)
+        with engine.begin() as conn:
+            if version not in BATCHED_MIGRATIONS:
+                migration(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {"version": version, "applied_at": datetime.datetime.now()}
+            )
@@ -1,5 +1,6 @@
-from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey, Boolean, Text, JSON)
-from sqlalchemy.orm import relationship
+from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey, Boolean, Text, JSON, Index)
+from sqlalchemy.orm import deferred, relationship
+from .column_types import CompressedJSON
 from .database import Base
 import datetime
 import pytz
@@ -13,17 +14,31 @@ class MonitoredDocument(Base):
     document = Column(String(18), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz))
+    # DIAS ENTRE ANÁLISES (NULL = SCHEDULER_DEFAULT_CADENCE_DAYS) E PRÓXIMO HORÁRIO AGENDADO PARA O DOCUMENTO
+    cadence_days = Column(Integer, nullable=True)
+    next_run_at = Column(DateTime, nullable=True, index=True)
     
     analyses = relationship("Analysis", back_populates="document_owner")
     
 class Analysis(Base):
     __tablename__ = "analyses"
+    __table_args__ = (
+        Index("ix_analyses_document_id_analysis_date", "document_id", "analysis_date"),
+        # CADA ANÁLISE DA TRATUM É GRAVADA UMA ÚNICA VEZ (NULL CONTINUA PERMITIDO EM LINHAS LEGADAS)
+        Index("ux_analyses_analytics_id", "analytics_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("monitored_documents.id"))
     analysis_date = Column(DateTime, default=lambda: datetime.datetime.now(br_tz))
-    analysis_json = Column(JSON, nullable=False)
-    comparison_resume = Column(JSON, nullable=True)
+    # RELATÓRIOS NOVOS FICAM EM analysis_sections; A COLUNA SÓ GUARDA O JSON DE LINHAS LEGADAS
+    _analysis_json = deferred(Column("analysis_json", CompressedJSON(), nullable=True))
+    section_refs = Column(JSON, nullable=True)
+    # SEÇÕES QUE FALHARAM NA AGREGAÇÃO E AGUARDAM O JOB DE REPARO (NULL QUANDO O RELATÓRIO ESTÁ COMPLETO)
+    failed_sections = Column(JSON(none_as_null=True), nullable=True)
+    # TENTATIVAS DE REPARO JÁ FEITAS; AO CHEGAR EM SECTION_REPAIR_MAX_ATTEMPTS AS SEÇÕES FICAM PENDENTES DE VEZ
+    repair_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    comparison_resume = deferred(Column(CompressedJSON(), nullable=True))
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     total_tokens = Column(Integer, nullable=True)
@@ -31,4 +46,82 @@ class Analysis(Base):
     analytics_id = Column(Integer, nullable=True)
     
     document_owner = relationship("MonitoredDocument", back_populates="analyses")
-    
\ No newline at end of file
+
+    @property
+    def analysis_json(self) -> dict | None:
+        # O RELATÓRIO É REMONTADO EM LOTE POR crud.assemble_reports AO CARREGAR AS ANÁLISES; AQUI NÃO HÁ CONSULTA,
+        # QUE SERIA I/O SÍNCRONO FORA DO run_sync NAS SESSÕES ASSÍNCRONAS E UMA CONSULTA POR ANÁLISE
+        if not self.section_refs:
+            return self._analysis_json
+        if "_assembled_json" not in self.__dict__:
+            raise RuntimeError(f"O relatório da análise {self.id} não foi carregado; use crud.assemble_reports ao buscar a análise.")
+        return self.__dict__["_assembled_json"]
+
+    @analysis_json.setter
+    def analysis_json(self, value: dict | None):
+        self.__dict__.pop("_assembled_json", None)
+        self._analysis_json = value
+        self.section_refs = None
+
+
+class AnalysisSection(Base):
+    __tablename__ = "analysis_sections"
+
+    content_hash = Column(String(64), primary_key=True)
+    content = Column(CompressedJSON(), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz))
+
+
+class JobStage:
+    INITIATED = "INITIATED"
+    POLLING = "POLLING"
+    DONE = "DONE"
+    AGGREGATED = "AGGREGATED"
+    COMPARED = "COMPARED"
+    FAILED = "FAILED"
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("monitored_documents.id"), nullable=False, index=True)
+    stage = Column(String(16), nullable=False, default=JobStage.INITIATED, index=True)
+    analytics_id = Column(Integer, nullable=True)
+    unique_id = Column(Integer, nullable=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=True)
+    compare = Column(Boolean, default=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz))
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz), onupdate=lambda: datetime.datetime.now(br_tz))
+
+    document = relationship("MonitoredDocument")
+
+
+class ComparisonCacheEntry(Base):
+    __tablename__ = "comparison_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    document = Column(String(18), nullable=False)
+    summary = Column(JSON, nullable=False)
+    usage = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz), index=True)
+    last_used_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz), index=True)
+
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+
+    # ORIGEM DO BACKFILL (EX.: CAMINHO DO CSV) E QUANTAS LINHAS, A PARTIR DO INÍCIO, JÁ FORAM CONCLUÍDAS
+    source = Column(String(255), primary_key=True)
+    rows_done = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(br_tz), onupdate=lambda: datetime.datetime.now(br_tz))
+
+
+class DocumentLease(Base):
+    __tablename__ = "document_leases"
+
+    # QUAL RÉPLICA ESTÁ PROCESSANDO O DOCUMENTO E ATÉ QUANDO; LEASE EXPIRADO PODE SER ASSUMIDO POR OUTRA
+    document_id = Column(Integer, ForeignKey("monitored_documents.id"), primary_key=True)
+    owner = Column(String(128), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .logs import trace_id_var
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceError(Exception):
+    # O ITEM NÃO FOI GRAVADO (NEM NO LOTE NEM SOZINHO); O JOB QUE O ENFILEIROU CONTINUA RETOMÁVEL
+    pass
+
+
+class AnalysisWriter:
+    # ACUMULA ANÁLISES NOVAS E RESUMOS DE COMPARAÇÃO E GRAVA TUDO EM LOTES (POR TAMANHO OU POR TEMPO),
+    # COM UM ÚNICO COMMIT POR LOTE. QUEM ENFILEIRA RECEBE O RESULTADO SÓ DEPOIS QUE O LOTE FOI GRAVADO.
+    def __init__(self, batch_size: int | None = None, flush_interval: float | None = None):
+        self.batch_size = batch_size or settings.PERSISTENCE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.PERSISTENCE_FLUSH_INTERVAL
+        self._analyses: list[tuple[dict, asyncio.Future]] = []
+        self._summaries: list[tuple[dict, asyncio.Future]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._latencies_ms: deque[float] = deque(maxlen=500)
+        self.counters = {"batches": 0, "analyses": 0, "summaries": 0, "failed_batches": 0, "failed_items": 0}
+
+    def _pending(self) -> int:
+        return len(self._analyses) + len(self._summaries)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_running()
+
+    async def stop(self):
+        # DURABILIDADE NO DESLIGAMENTO: ENCERRA O LOOP E GRAVA TUDO O QUE AINDA ESTÁ NO BUFFER
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info("Gravação em lote encerrada", extra={"stats": self.stats()})
+
+    async def _enqueue(self, buffer: list, item: dict):
+        future = asyncio.get_running_loop().create_future()
+        # O trace_id DE QUEM ENFILEIROU VAI JUNTO: O LOTE É GRAVADO NA TASK DO WRITER, FORA DO CONTEXTO DO DOCUMENTO
+        buffer.append((item, future, trace_id_var.get()))
+        if self._closing or self._task is None:
+            # SEM LOOP ATIVO (EX.: DURANTE O DESLIGAMENTO) A GRAVAÇÃO É IMEDIATA
+            await self.flush()
+        elif self._pending() >= self.batch_size:
+            self._wakeup.set()
+        return await future
+
+    async def add_analysis(self, job_id: int | None, document_id: int, analysis_data: dict, unique_id: int, analytics_id: int, failed_sections: list[str] | None = None) -> int:
+        return await self._enqueue(self._analyses, {
+            "job_id": job_id,
+            "document_id": document_id,
+            "analysis_data": analysis_data,
+            "unique_id": unique_id,
+            "analytics_id": analytics_id,
+            "failed_sections": failed_sections,
+        })
+
+    async def update_summary(self, analysis_id: int, summary, usage: dict | None, job_id: int | None = None):
+        await self._enqueue(self._summaries, {
+            "analysis_id": analysis_id,
+            "summary": summary,
+            "usage": usage or {},
+            "job_id": job_id,
+        })
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    @staticmethod
+    async def _write(analyses: list[dict], summaries: list[dict]) -> list[int]:
+        async with AsyncSessionLocal() as db:
+            return await async_crud.persist_analysis_batch(db, analyses, summaries)
+
+    async def _write_individually(self, analyses: list, summaries: list) -> int:
+        # O LOTE FALHOU: GRAVA ITEM A ITEM PARA QUE UMA LINHA RUIM (OU UMA FALHA PASSAGEIRA) NÃO DERRUBE AS OUTRAS
+        failed = 0
+        for entries, is_analysis in ((analyses, True), (summaries, False)):
+            for item, future, trace_id in entries:
+                try:
+                    ids = await self._write([item], []) if is_analysis else await self._write([], [item])
+                except Exception as e:
+                    failed += 1
+                    logger.error("Erro ao gravar item isolado do lote -> %s", e, extra={"trace_ids": [trace_id] if trace_id else []})
+                    if not future.done():
+                        future.set_exception(PersistenceError(str(e)))
+                    continue
+                self.counters["analyses" if is_analysis else "summaries"] += 1
+                if not future.done():
+                    future.set_result(ids[0] if is_analysis else None)
+        return failed
+
+    @staticmethod
+    def _trace_ids(entries: list) -> list[str]:
+        return sorted({trace_id for _, _, trace_id in entries if trace_id})
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending():
+                analyses, self._analyses = self._analyses[:self.batch_size], self._analyses[self.batch_size:]
+                summaries, self._summaries = self._summaries[:self.batch_size], self._summaries[self.batch_size:]
+                start = time.perf_counter()
+                try:
+                    analysis_ids = await self._write([item for item, _, _ in analyses], [item for item, _, _ in summaries])
+                except Exception as e:
+                    self.counters["failed_batches"] += 1
+                    logger.error(
+                        "Erro ao gravar lote (%s análises, %s resumos) -> %s. Gravando item a item.", len(analyses), len(summaries), e,
+                        extra={"trace_ids": self._trace_ids(analyses + summaries)}
+                    )
+                    self.counters["failed_items"] += await self._write_individually(analyses, summaries)
+                    continue
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                STAGE_SECONDS.observe(elapsed_ms / 1000, stage="db_write")
+                self._latencies_ms.append(elapsed_ms)
+                self.counters["batches"] += 1
+                self.counters["analyses"] += len(analyses)
+                self.counters["summaries"] += len(summaries)
+                logger.debug(
+                    "Lote gravado: %s análises, %s resumos em %.1fms", len(analyses), len(summaries), elapsed_ms,
+                    extra={"trace_ids": self._trace_ids(analyses + summaries)}
+                )
+                for (_, future, _), analysis_id in zip(analyses, analysis_ids):
+                    if not future.done():
+                        future.set_result(analysis_id)
+                for _, future, _ in summaries:
+                    if not future.done():
+                        future.set_result(None)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies_ms)
+        return {
+            **self.counters,
+            "pending": self._pending(),
+            "flush_ms_last": round(self._latencies_ms[-1], 2) if latencies else None,
+            "flush_ms_p50": round(statistics.median(latencies), 2) if latencies else None,
+            "flush_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+            "flush_ms_max": round(latencies[-1], 2) if latencies else None,
+        }
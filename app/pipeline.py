@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+from sqlalchemy.exc import SQLAlchemyError
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .leases import LeaseManager
+from .logs import log_context, new_trace_id, trace_id_var
+from .metrics import ANALYSES_IN_FLIGHT, DOCUMENTS, JOB_FAILURES, STAGE_SECONDS
+from .models import JobStage
+from .persistence import AnalysisWriter, PersistenceError
+
+logger = logging.getLogger(__name__)
+
+
+class PreviousAnalysisPrefetcher:
+    # CARREGA A ÚLTIMA ANÁLISE DE CADA DOCUMENTO DO CICLO EM LOTES (UMA CONSULTA POR LOTE).
+    # O LIMITE max_analysis_id É FIXADO NO INÍCIO DO CICLO, ENTÃO ANÁLISES GRAVADAS DURANTE O CICLO
+    # NUNCA SÃO CONFUNDIDAS COM A ANÁLISE ANTERIOR.
+    def __init__(self, document_ids: list[int], max_analysis_id: int, batch_size: int | None = None):
+        self.batch_size = batch_size or settings.PIPELINE_PREFETCH_BATCH_SIZE
+        self.max_analysis_id = max_analysis_id
+        self._batches = [document_ids[i:i + self.batch_size] for i in range(0, len(document_ids), self.batch_size)]
+        self._batch_of = {document_id: index for index, batch in enumerate(self._batches) for document_id in batch}
+        # UMA TASK POR LOTE: WORKERS QUE PEDEM O MESMO LOTE AO MESMO TEMPO AGUARDAM A MESMA CONSULTA
+        self._loads: dict[int, asyncio.Task] = {}
+        self._previous: dict[int, dict | None] = {}
+        self.counters = {"queries": 0, "prefetched": 0}
+
+    @classmethod
+    async def for_cycle(cls, document_ids: list[int]) -> "PreviousAnalysisPrefetcher":
+        async with AsyncSessionLocal() as db:
+            max_analysis_id = await async_crud.get_max_analysis_id(db)
+        return cls(document_ids, max_analysis_id)
+
+    async def _load_batch(self, index: int):
+        async with AsyncSessionLocal() as db:
+            latest = await async_crud.get_latest_analyses_for_documents(
+                db, self._batches[index], per_document=1, include_payload=True, max_analysis_id=self.max_analysis_id
+            )
+        for document_id, analyses in latest.items():
+            self._previous[document_id] = {
+                "analysis_id": analyses[0].id,
+                "report": analyses[0].analysis_json,
+                "comparison_resume": analyses[0].comparison_resume,
+                "failed_sections": analyses[0].failed_sections or [],
+            } if analyses else None
+        self.counters["queries"] += 1
+        self.counters["prefetched"] += len(self._batches[index])
+
+    async def get(self, document_id: int) -> dict | None:
+        index = self._batch_of.get(document_id)
+        if index is None:
+            return None
+        if index not in self._loads:
+            self._loads[index] = asyncio.create_task(self._load_batch(index))
+        await self._loads[index]
+        # REMOVE DA MEMÓRIA: CADA DOCUMENTO É PROCESSADO UMA ÚNICA VEZ POR CICLO
+        return self._previous.pop(document_id, None)
+
+
+class AnalysisPipeline:
+    def __init__(self, tratum_service, comparison_service, concurrency: int | None = None, writer: AnalysisWriter | None = None, leases: LeaseManager | None = None):
+        self.tratum_service = tratum_service
+        self.comparison_service = comparison_service
+        self.writer = writer or AnalysisWriter()
+        self.leases = leases or LeaseManager()
+        # DOCUMENTOS CUJA ANÁLISE FICOU NO POLLER: O LEASE CONTINUA COM ESTA RÉPLICA ATÉ resume_parked
+        self._parked: set[int] = set()
+        self.concurrency = concurrency or settings.ANALYSIS_CONCURRENCY
+        self.tratum_service.poller.on_parked_finished = self.resume_parked
+
+    @staticmethod
+    def _job_state(job, document_number: str) -> dict:
+        return {
+            "job_id": job.id,
+            "document_id": job.document_id,
+            "document_number": document_number,
+            "stage": job.stage,
+            "analytics_id": job.analytics_id,
+            "consume_unique_id": job.unique_id,
+            "analysis_id": job.analysis_id,
+            "compare": job.compare,
+        }
+
+    async def _update_job(self, job: dict, stage: str, **fields):
+        if stage == JobStage.FAILED:
+            JOB_FAILURES.inc(stage=job["stage"])
+        async with AsyncSessionLocal() as db:
+            await async_crud.update_analysis_job(db, job["job_id"], stage, **fields)
+        job["stage"] = stage
+
+    async def process_document(self, document_id: int, document_number: str, compare: bool = True, prefetcher: PreviousAnalysisPrefetcher | None = None) -> bool:
+        with log_context(document=document_number):
+            previous = await prefetcher.get(document_id) if prefetcher is not None and compare else None
+            with STAGE_SECONDS.time(stage="initiate"):
+                ids = await self.tratum_service.start_analysis(document_number)
+            if not ids:
+                logger.warning("Não foi possível iniciar a análise do documento %s. Pulando.", document_number)
+                return False
+            analytics_id, consume_unique_id = ids
+
+            # A PARTIR DAQUI A ANÁLISE JÁ FOI PAGA: PERSISTE OS IDS ANTES DE QUALQUER OUTRA ETAPA
+            async with AsyncSessionLocal() as db:
+                job = await async_crud.create_analysis_job(db, document_id, analytics_id, consume_unique_id, compare=compare)
+                job_state = self._job_state(job, document_number)
+            if prefetcher is not None and compare:
+                job_state["previous"] = previous
+            return await self.run_job(job_state)
+
+    async def run_job(self, job: dict, main_summary: dict | None = None) -> bool:
+        # O trace_id FICA NO ESTADO DO JOB: O POLLER E A RETOMADA DE ANÁLISES ESTACIONADAS CONTINUAM O MESMO TRACE
+        job.setdefault("trace_id", trace_id_var.get() or new_trace_id())
+        with log_context(trace_id=job["trace_id"], document=job["document_number"]):
+            return await self._advance_job(job, main_summary)
+
+    async def _advance_job(self, job: dict, main_summary: dict | None = None) -> bool:
+        # AVANÇA O JOB A PARTIR DA ÚLTIMA ETAPA CONCLUÍDA
+        document_number = job["document_number"]
+        try:
+            if job["stage"] in (JobStage.INITIATED, JobStage.POLLING):
+                await self._update_job(job, JobStage.POLLING)
+                logger.debug("[ETAPA 2/3] Análise ID %s registrada no poller", job["analytics_id"])
+                job["polling_started_at"] = time.monotonic()
+                main_summary = await self.tratum_service.poller.register(
+                    job["analytics_id"], job["consume_unique_id"], context=job
+                )
+                if main_summary is None:
+                    self._parked.add(job["document_id"])
+                    logger.warning("A análise de %s não está pronta. Ela será concluída quando o poller detectar 'DONE'.", document_number)
+                    return False
+                self._observe_time_to_done(job)
+                if main_summary.get("status") != "DONE":
+                    await self._update_job(job, JobStage.FAILED, error=f"Status final da análise: {main_summary.get('status')}")
+                    return False
+                await self._update_job(job, JobStage.DONE)
+
+            if job["stage"] == JobStage.DONE:
+                async with AsyncSessionLocal() as db:
+                    stored = await async_crud.get_analysis_ids_by_analytics_ids(db, {job["analytics_id"]})
+                if job["analytics_id"] in stored:
+                    # A ANÁLISE JÁ ESTÁ NO BANCO (EX.: BACKFILL OU EXECUÇÃO ANTERIOR): NADA A BUSCAR NA TRATUM
+                    logger.info("Análise ID %s de %s já está salva. Reaproveitando.", job["analytics_id"], document_number)
+                    job["analysis_id"] = stored[job["analytics_id"]]
+                    await self._update_job(job, JobStage.AGGREGATED, analysis_id=job["analysis_id"])
+
+            if job["stage"] == JobStage.DONE:
+                if main_summary is None:
+                    main_summary = await self.tratum_service.fetch_status_summary(job["analytics_id"], job["consume_unique_id"])
+                    if not main_summary:
+                        logger.warning("Não foi possível buscar o sumário da análise de %s. O job será retomado depois.", document_number)
+                        return False
+                logger.debug("[ETAPA 3/3] Buscando todos os detalhes da análise ID %s em paralelo", job["analytics_id"])
+                with STAGE_SECONDS.time(stage="aggregation"):
+                    result_data = await self.tratum_service.aggregate_analysis(
+                        job["analytics_id"], job["consume_unique_id"], document_number, main_summary
+                    )
+                if not result_data or not result_data.get("analysis_json"):
+                    logger.warning("Não foi possível agregar os dados de %s. O job será retomado depois.", document_number)
+                    return False
+                await self._persist(job, result_data)
+
+            if job["stage"] == JobStage.AGGREGATED and job["compare"]:
+                await self._compare(job)
+            return True
+        except (PersistenceError, SQLAlchemyError) as e:
+            # ERRO DE BANCO NÃO É FALHA DA ANÁLISE (JÁ PAGA): O JOB FICA NA ETAPA ATUAL E resume_unfinished_jobs TENTA DE NOVO
+            logger.error("Erro de banco no job %s de %s (etapa %s). Será retomado -> %s", job["job_id"], document_number, job["stage"], e)
+            raise
+        except Exception as e:
+            await self._update_job(job, JobStage.FAILED, error=str(e))
+            raise
+
+    @staticmethod
+    def _observe_time_to_done(job: dict):
+        # SÓ PARA JOBS QUE ENTRARAM NO POLLER NESTE PROCESSO (JOBS RETOMADOS APÓS REINÍCIO NÃO TÊM O INÍCIO)
+        started_at = job.pop("polling_started_at", None)
+        if started_at is not None:
+            STAGE_SECONDS.observe(time.monotonic() - started_at, stage="time_to_done")
+
+    async def _persist(self, job: dict, result_data: dict):
+        # A ANÁLISE E A ETAPA AGGREGATED DO JOB SÃO GRAVADAS NO MESMO LOTE
+        job["analysis_id"] = await self.writer.add_analysis(
+            job_id=job["job_id"],
+            document_id=job["document_id"],
+            analysis_data=result_data["analysis_json"],
+            unique_id=result_data["unique_id"],
+            analytics_id=result_data["analytics_id"],
+            failed_sections=result_data.get("failed_sections")
+        )
+        job["stage"] = JobStage.AGGREGATED
+        job["report"] = result_data["analysis_json"]
+        job["failed_sections"] = result_data.get("failed_sections") or []
+        logger.info("Análise de %s salva no banco de dados.", job["document_number"], extra={"analysis_id": job["analysis_id"]})
+
+    async def _comparison_inputs(self, job: dict) -> tuple[dict | None, dict | None, Any, set[str]]:
+        # NO CICLO NORMAL A ANÁLISE ANTERIOR VEM DO PREFETCH E A NOVA JÁ ESTÁ EM MEMÓRIA;
+        # JOBS RETOMADOS (REINÍCIO, POLLER) CONSULTAM O BANCO. TAMBÉM DEVOLVE AS SEÇÕES QUE FALHARAM EM QUALQUER UMA DAS DUAS
+        if "previous" in job and "report" in job:
+            previous = job["previous"]
+            if previous is None:
+                return None, job["report"], None, set()
+            failed = {*previous["failed_sections"], *job.get("failed_sections", [])}
+            return previous["report"], job["report"], previous["comparison_resume"], failed
+        async with AsyncSessionLocal() as db:
+            last_two = await async_crud.get_last_two_analyses(db, document_id=job["document_id"])
+        if len(last_two) < 2:
+            return None, None, None, set()
+        failed = {*(last_two[0].failed_sections or []), *(last_two[1].failed_sections or [])}
+        return last_two[1].analysis_json, last_two[0].analysis_json, last_two[1].comparison_resume, failed
+
+    async def _compare(self, job: dict):
+        document_number = job["document_number"]
+        old_data, new_data, previous_resume, failed_sections = await self._comparison_inputs(job)
+        if old_data is None:
+            logger.info("Análise inicial de %s salva. Comparação ocorrerá no próximo ciclo.", document_number)
+            await self._update_job(job, JobStage.COMPARED)
+            return
+        logger.debug("Comparando as análises de %s", document_number)
+        summary, usage_info = await self.comparison_service.gpt_comparer(
+            document_number, old_data, new_data, previous_resume=previous_resume, failed_sections=failed_sections
+        )
+        if usage_info:
+            logger.debug("Comparação de %s concluída", document_number, extra={"total_tokens": usage_info.get("total_tokens")})
+        # O RESUMO E A ETAPA COMPARED DO JOB SÃO GRAVADOS NO MESMO LOTE
+        await self.writer.update_summary(job["analysis_id"], summary, usage_info, job_id=job["job_id"])
+        job["stage"] = JobStage.COMPARED
+
+    async def _run_leased(self, document_id: int, handler: Callable[[], Awaitable[bool]]) -> bool:
+        # O LEASE É LIBERADO QUANDO O DOCUMENTO SAI DESTA RÉPLICA, COM SUCESSO OU ERRO
+        try:
+            return await handler()
+        finally:
+            if document_id not in self._parked:
+                await self.leases.release([document_id])
+
+    async def resume_parked(self, job: dict, main_summary: dict | None):
+        # ANÁLISE QUE PASSOU DO PRAZO DO POLLER E TERMINOU DEPOIS: CONTINUA O JOB NORMALMENTE
+        document_number = job.get("document_number")
+        self._parked.discard(job["document_id"])
+        try:
+            if main_summary is None:
+                await self._update_job(job, JobStage.FAILED, error="A análise não foi concluída dentro do prazo máximo do poller.")
+                return
+            self._observe_time_to_done(job)
+            if main_summary.get("status") != "DONE":
+                await self._update_job(job, JobStage.FAILED, error=f"Status final da análise: {main_summary.get('status')}")
+                return
+            await self._update_job(job, JobStage.DONE)
+            await self.run_job(job, main_summary=main_summary)
+        except Exception as e:
+            logger.exception("Erro ao retomar a análise estacionada de %s -> %s", document_number, e)
+        finally:
+            if job["document_id"] not in self._parked:
+                await self.leases.release([job["document_id"]])
+
+    async def resume_unfinished_jobs(self) -> dict:
+        # RETOMA OS JOBS INTERROMPIDOS (EX.: REINÍCIO DO PROCESSO OU RÉPLICA QUE CAIU) SEM PAGAR NOVAMENTE PELA ANÁLISE.
+        # JOBS EM ANDAMENTO EM OUTRA RÉPLICA (OU NESTA) TÊM LEASE VÁLIDO E FICAM DE FORA
+        async with AsyncSessionLocal() as db:
+            jobs = [self._job_state(job, job.document.document) for job in await async_crud.get_unfinished_analysis_jobs(db)]
+        claimed = await self.leases.claim(job["document_id"] for job in jobs)
+        if len(claimed) < len(jobs):
+            logger.info("%s jobs pendentes estão com lease de outra réplica ou em andamento", len(jobs) - len(claimed))
+        jobs = [job for job in jobs if job["document_id"] in claimed]
+        logger.info("Encontrados %s jobs de análise pendentes para retomar", len(jobs))
+        return await self._run_pool(
+            jobs,
+            lambda job: self._run_leased(job["document_id"], lambda: self.run_job(job)),
+            describe=lambda job: f"{job['document_number']} (JOB: {job['job_id']}, ETAPA: {job['stage']})",
+            label="RETOMADA"
+        )
+
+    async def run(self, documents: list[tuple[int, str]], label: str, compare: bool = True) -> dict:
+        async with AsyncSessionLocal() as db:
+            in_flight = await async_crud.get_document_ids_with_unfinished_jobs(db)
+        if in_flight:
+            # DOCUMENTOS COM ANÁLISE JÁ PAGA E EM ANDAMENTO NÃO SÃO INICIADOS DE NOVO
+            documents = [item for item in documents if item[0] not in in_flight]
+            logger.info("[%s] %s documentos com jobs pendentes serão ignorados neste ciclo", label, len(in_flight))
+        claimed = await self.leases.claim(item[0] for item in documents)
+        if len(claimed) < len(documents):
+            # OUTRA RÉPLICA JÁ ESTÁ COM ESSES DOCUMENTOS
+            logger.info("[%s] %s documentos estão com lease de outra réplica e serão ignorados", label, len(documents) - len(claimed))
+            documents = [item for item in documents if item[0] in claimed]
+        prefetcher = await PreviousAnalysisPrefetcher.for_cycle([item[0] for item in documents]) if compare else None
+        return await self._run_pool(
+            documents,
+            lambda item: self._run_leased(item[0], lambda: self.process_document(item[0], item[1], compare=compare, prefetcher=prefetcher)),
+            describe=lambda item: f"{item[1]} (ID: {item[0]})",
+            label=label
+        )
+
+    async def _run_pool(self, items: list, handler: Callable[[Any], Awaitable[bool]], describe: Callable[[Any], str], label: str) -> dict:
+        # EXECUTA O PIPELINE PARA VÁRIOS ITENS AO MESMO TEMPO, LIMITADO POR self.concurrency
+        total = len(items)
+        stats = {"total": total, "processed": 0, "skipped": 0, "failed": 0}
+        queue: asyncio.Queue = asyncio.Queue()
+        for index, item in enumerate(items):
+            queue.put_nowait((index, item))
+
+        async def worker():
+            while True:
+                try:
+                    index, item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # UM TRACE POR DOCUMENTO PROCESSADO
+                with log_context(trace_id=new_trace_id()):
+                    logger.debug("[%s] Processando %s/%s: %s", label, index + 1, total, describe(item))
+                    started_at = time.monotonic()
+                    try:
+                        with ANALYSES_IN_FLIGHT.track():
+                            result = "processed" if await handler(item) else "skipped"
+                        STAGE_SECONDS.observe(time.monotonic() - started_at, stage="document")
+                    except Exception as e:
+                        result = "failed"
+                        logger.exception("Erro ao processar %s -> %s", describe(item), e)
+                stats[result] += 1
+                DOCUMENTS.inc(run=label, result=result)
+
+        logger.info("[%s] Iniciando %s itens com concorrência %s", label, total, self.concurrency)
+        start = time.monotonic()
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, total))]
+        await asyncio.gather(*workers)
+        elapsed = time.monotonic() - start
+
+        stats["elapsed_seconds"] = round(elapsed, 2)
+        stats["docs_per_minute"] = round(total / (elapsed / 60), 2) if elapsed > 0 else 0.0
+        logger.info(
+            "[%s] Finalizado: %s processados, %s pulados, %s com erro em %ss (%s documentos/minuto)",
+            label, stats["processed"], stats["skipped"], stats["failed"], stats["elapsed_seconds"], stats["docs_per_minute"],
+            extra={"stats": stats}
+        )
+        return stats
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+from .config import settings
+from .logs import log_context
+
+logger = logging.getLogger(__name__)
+
+FAILED_STATUSES = {"ERROR", "FAILED", "CANCELED", "CANCELLED"}
+
+
+@dataclass
+class PollItem:
+    analytics_id: int
+    consume_unique_id: int
+    future: asyncio.Future
+    context: dict = field(default_factory=dict)
+    registered_at: float = field(default_factory=time.monotonic)
+    next_check: float = 0.0
+    attempts: int = 0
+    parked: bool = False
+    last_status: str | None = None
+
+
+class AnalysisPoller:
+    def __init__(
+        self,
+        fetch_summary: Callable[[int, int], Awaitable[dict | None]],
+        initial_interval: float | None = None,
+        max_interval: float | None = None,
+        backoff_factor: float | None = None,
+        deadline: float | None = None,
+        parked_interval: float | None = None,
+        parked_max_age: float | None = None,
+        max_requests_per_second: float | None = None,
+    ):
+        self.fetch_summary = fetch_summary
+        self.initial_interval = initial_interval or settings.POLL_INITIAL_INTERVAL
+        self.max_interval = max_interval or settings.POLL_MAX_INTERVAL
+        self.backoff_factor = backoff_factor or settings.POLL_BACKOFF_FACTOR
+        self.deadline = deadline or settings.POLL_DEADLINE_SECONDS
+        self.parked_interval = parked_interval or settings.POLL_PARKED_INTERVAL
+        self.parked_max_age = parked_max_age or settings.POLL_PARKED_MAX_AGE
+        self.max_requests_per_second = max_requests_per_second or settings.POLL_MAX_REQUESTS_PER_SECOND
+        # CHAMADO QUANDO UMA ANÁLISE ESTACIONADA (PASSOU DO PRAZO) TERMINA: COM O SUMÁRIO, OU None SE EXPIROU
+        self.on_parked_finished: Callable[[dict, dict | None], Awaitable[Any]] | None = None
+        self._items: dict[int, PollItem] = {}
+        # VERIFICAÇÕES EM ANDAMENTO POR analytics_id: O ITEM NÃO É DISPARADO DE NOVO ATÉ A RESPOSTA
+        self._checks: dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._budget = max(1.0, self.max_requests_per_second)
+        self._budget_updated_at = time.monotonic()
+
+    def register(self, analytics_id: int, consume_unique_id: int, context: dict | None = None) -> asyncio.Future:
+        # REGISTRA UMA ANÁLISE EM ANDAMENTO E DEVOLVE UM AWAITABLE COM O SUMÁRIO FINAL (OU None SE FOI ESTACIONADA)
+        existing = self._items.get(analytics_id)
+        if existing and not existing.future.done():
+            return existing.future
+        future = asyncio.get_running_loop().create_future()
+        self._items[analytics_id] = PollItem(
+            analytics_id=analytics_id,
+            consume_unique_id=consume_unique_id,
+            future=future,
+            context=context or {},
+            next_check=time.monotonic() + self.initial_interval,
+        )
+        self._ensure_running()
+        self._wakeup.set()
+        return future
+
+    def stats(self) -> dict:
+        parked = sum(1 for item in self._items.values() if item.parked)
+        return {"pending": len(self._items) - parked, "parked": parked}
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_running()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for check in self._checks.values():
+            check.cancel()
+        self._checks.clear()
+        for item in self._items.values():
+            if not item.future.done():
+                item.future.cancel()
+        self._items.clear()
+
+    def _take_budget(self, wanted: int) -> int:
+        # O BALDE GUARDA PELO MENOS UMA REQUISIÇÃO: COM TAXA ABAIXO DE 1/s O SALDO AINDA CHEGA A 1 E A VERIFICAÇÃO SAI
+        now = time.monotonic()
+        self._budget = min(
+            max(1.0, self.max_requests_per_second),
+            self._budget + (now - self._budget_updated_at) * self.max_requests_per_second,
+        )
+        self._budget_updated_at = now
+        granted = min(wanted, int(self._budget))
+        self._budget -= granted
+        return granted
+
+    def _next_interval(self, item: PollItem) -> float:
+        if item.parked:
+            return self.parked_interval
+        return min(self.initial_interval * (self.backoff_factor ** item.attempts), self.max_interval)
+
+    def _dispatch(self, item: PollItem):
+        # CADA VERIFICAÇÃO É UMA TASK PRÓPRIA: UMA RESPOSTA LENTA NÃO SEGURA O LOOP NEM AS OUTRAS ANÁLISES
+        check = asyncio.create_task(self._check(item))
+        self._checks[item.analytics_id] = check
+
+        def finished(_):
+            self._checks.pop(item.analytics_id, None)
+            self._wakeup.set()
+
+        check.add_done_callback(finished)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            waiting = [item for item in self._items.values() if item.analytics_id not in self._checks]
+            due = sorted((item for item in waiting if item.next_check <= now), key=lambda item: item.next_check)
+            if due:
+                granted = self._take_budget(len(due))
+                for item in due[:granted]:
+                    self._dispatch(item)
+                if granted == len(due):
+                    continue
+            if due:
+                # SEM ORÇAMENTO PARA TODOS: TENTA DE NOVO QUANDO ENTRAR MAIS UMA REQUISIÇÃO NO ORÇAMENTO
+                timeout = 1 / self.max_requests_per_second
+            elif waiting:
+                next_check = min(item.next_check for item in waiting)
+                timeout = max(next_check - time.monotonic(), 1 / self.max_requests_per_second)
+            else:
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify_parked(self, item: PollItem, summary: dict | None):
+        if self.on_parked_finished is not None:
+            asyncio.create_task(self.on_parked_finished(item.context, summary))
+
+    async def _check(self, item: PollItem):
+        # AS VERIFICAÇÕES RODAM NA TASK DO POLLER: RESTAURA O TRACE DO DOCUMENTO QUE REGISTROU A ANÁLISE
+        with log_context(trace_id=item.context.get("trace_id"), document=item.context.get("document_number")):
+            await self._check_item(item)
+
+    async def _check_item(self, item: PollItem):
+        try:
+            summary = await self.fetch_summary(item.analytics_id, item.consume_unique_id)
+        except Exception as e:
+            logger.error("Erro no polling da análise ID %s: %s", item.analytics_id, e)
+            summary = None
+        item.attempts += 1
+        elapsed = time.monotonic() - item.registered_at
+        status = summary.get("status") if summary else None
+        if status != item.last_status:
+            logger.debug("Status da análise ID %s: %s (tempo decorrido: %.0fs)", item.analytics_id, status, elapsed)
+            item.last_status = status
+
+        if status == "DONE" or status in FAILED_STATUSES:
+            if status != "DONE":
+                logger.error("A análise ID %s terminou com status %s.", item.analytics_id, status)
+            self._items.pop(item.analytics_id, None)
+            if not item.parked:
+                if not item.future.done():
+                    item.future.set_result(summary)
+            else:
+                logger.info("Análise estacionada ID %s terminou com status %s. Retomando o processamento.", item.analytics_id, status)
+                self._notify_parked(item, summary)
+            return
+
+        if item.parked and elapsed >= self.parked_max_age:
+            logger.error("A análise estacionada ID %s não concluiu em %.0fs. Descartando.", item.analytics_id, self.parked_max_age)
+            self._items.pop(item.analytics_id, None)
+            self._notify_parked(item, None)
+            return
+
+        if not item.parked and elapsed >= self.deadline:
+            # A ANÁLISE JÁ FOI PAGA: ESTACIONA E CONTINUA VERIFICANDO EM RITMO LENTO
+            logger.warning("A análise ID %s não concluiu em %.0fs. Estacionando.", item.analytics_id, self.deadline)
+            item.parked = True
+            if not item.future.done():
+                item.future.set_result(None)
+
+        item.next_check = time.monotonic() + self._next_interval(item)
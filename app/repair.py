@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import logging
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .leases import LeaseManager
+from .logs import log_context, new_trace_id
+
+logger = logging.getLogger(__name__)
+
+
+class SectionRepairer:
+    # RECUPERA AS SEÇÕES QUE FALHARAM NA AGREGAÇÃO, SEM PAGAR POR UMA NOVA ANÁLISE
+    def __init__(self, tratum_service, batch_size: int | None = None, leases: LeaseManager | None = None):
+        self.tratum_service = tratum_service
+        self.leases = leases or LeaseManager()
+        self.batch_size = batch_size or settings.SECTION_REPAIR_BATCH_SIZE
+        self.max_attempts = settings.SECTION_REPAIR_MAX_ATTEMPTS
+        self._lock = asyncio.Lock()
+        self.last_run: dict | None = None
+
+    async def _skip(self, analysis) -> str:
+        # CONTA COMO TENTATIVA: SEM ISSO A ANÁLISE VOLTARIA EM TODA EXECUÇÃO
+        async with AsyncSessionLocal() as db:
+            await async_crud.record_repair_attempt(db, analysis.id)
+        return "skipped"
+
+    async def _repair(self, analysis) -> str:
+        report = analysis.analysis_json or {}
+        main_summary = report.get("summary")
+        if not main_summary:
+            logger.warning("Análise %s não tem sumário gravado; não é possível reparar as seções.", analysis.id)
+            return await self._skip(analysis)
+        result = await self.tratum_service.repair_sections(
+            analysis.analytics_id,
+            analysis.unique_id,
+            analysis.document_owner.document,
+            main_summary,
+            list(analysis.failed_sections)
+        )
+        if result is None:
+            return await self._skip(analysis)
+        repaired, still_failed = result
+        recovered = {name: content for name, content in repaired.items() if name not in still_failed}
+        async with AsyncSessionLocal() as db:
+            await async_crud.save_repaired_sections(db, analysis.id, recovered, still_failed)
+        if still_failed:
+            if (analysis.repair_attempts or 0) + 1 >= self.max_attempts:
+                logger.error(
+                    "Análise %s: seções %s continuam falhando após %s tentativas. Reparo abandonado.",
+                    analysis.id, ", ".join(still_failed), self.max_attempts
+                )
+            else:
+                logger.warning("Análise %s: seções ainda pendentes após o reparo: %s", analysis.id, ", ".join(still_failed))
+            return "still_failed"
+        logger.info("Análise %s: seções %s reparadas.", analysis.id, ", ".join(recovered))
+        return "repaired"
+
+    async def run(self) -> dict:
+        if self._lock.locked():
+            logger.warning("O reparo de seções já está em execução.")
+            return self.last_run or {}
+        async with self._lock:
+            logger.info("Reparo de seções iniciado")
+            stats = {"checked": 0, "repaired": 0, "still_failed": 0, "skipped": 0, "leased": 0, "errors": 0}
+            after_id = 0
+            while True:
+                async with AsyncSessionLocal() as db:
+                    batch = await async_crud.get_analyses_with_failed_sections(db, self.batch_size, after_id, self.max_attempts)
+                if not batch:
+                    break
+                after_id = batch[-1].id
+                # COM VÁRIAS RÉPLICAS, CADA DOCUMENTO É REPARADO POR QUEM CONSEGUIR O LEASE
+                claimed = await self.leases.claim({analysis.document_id for analysis in batch})
+                stats["leased"] += sum(1 for analysis in batch if analysis.document_id not in claimed)
+                stats["checked"] += len(batch)
+                batch = [analysis for analysis in batch if analysis.document_id in claimed]
+                tasks = []
+                for analysis in batch:
+                    with log_context(trace_id=new_trace_id(), document=analysis.document_owner.document):
+                        tasks.append(asyncio.create_task(self._repair(analysis)))
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                await self.leases.release(claimed)
+                for analysis, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        logger.error("Erro ao reparar a análise %s -> %s", analysis.id, result)
+                        try:
+                            await self._skip(analysis)
+                        except Exception as e:
+                            logger.error("Não foi possível registrar a tentativa de reparo da análise %s -> %s", analysis.id, e)
+                        result = "errors"
+                    stats[result] += 1
+            self.last_run = {**stats, "finished_at": datetime.datetime.now().isoformat()}
+            logger.info("Reparo de seções finalizado", extra={"stats": stats})
+            return stats
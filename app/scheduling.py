@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+import logging
+from . import async_crud
+from .config import settings
+from .database import AsyncSessionLocal
+from .models import br_tz
+
+logger = logging.getLogger(__name__)
+
+# INÍCIO FIXO DOS PERÍODOS: O HORÁRIO DE CADA DOCUMENTO NÃO MUDA ENTRE REINÍCIOS DO PROCESSO
+SCHEDULE_ANCHOR = datetime.datetime(2024, 1, 1)
+# HASH MULTIPLICATIVO DE KNUTH: IDS SEQUENCIAIS FICAM ESPALHADOS DE FORMA UNIFORME NA JANELA
+_JITTER_MULTIPLIER = 2654435761
+_JITTER_MODULUS = 2 ** 32
+
+
+def local_now() -> datetime.datetime:
+    # AS COLUNAS DateTime GUARDAM O HORÁRIO LOCAL (BRASÍLIA) SEM FUSO
+    return datetime.datetime.now(br_tz).replace(tzinfo=None)
+
+
+def document_jitter(document_id: int) -> float:
+    return (document_id * _JITTER_MULTIPLIER % _JITTER_MODULUS) / _JITTER_MODULUS
+
+
+def cadence_period(cadence_days: int | None) -> datetime.timedelta:
+    return datetime.timedelta(days=cadence_days or settings.SCHEDULER_DEFAULT_CADENCE_DAYS)
+
+
+def next_slot(document_id: int, cadence_days: int | None, after: datetime.datetime) -> datetime.datetime:
+    # CADA PERÍODO DA CADÊNCIA TEM UM HORÁRIO FIXO PARA O DOCUMENTO: INÍCIO DO PERÍODO + JITTER(ID) * JANELA.
+    # COM A JANELA IGUAL AO PERÍODO, A CARGA FICA PLANA O TEMPO TODO; COM UMA JANELA MENOR, CONCENTRA-SE NELA
+    period = cadence_period(cadence_days)
+    window = period
+    if settings.SCHEDULER_WINDOW_HOURS:
+        window = min(datetime.timedelta(hours=settings.SCHEDULER_WINDOW_HOURS), period)
+    offset = window * document_jitter(document_id)
+    periods = max((after - SCHEDULE_ANCHOR - offset) // period + 1, 0)
+    return SCHEDULE_ANCHOR + offset + period * periods
+
+
+def retry_slot(regular_slot: datetime.datetime, now: datetime.datetime) -> datetime.datetime:
+    # NOVA TENTATIVA EM BREVE, MAS NUNCA DEPOIS DO PRÓXIMO HORÁRIO NORMAL DO DOCUMENTO
+    return min(now + datetime.timedelta(minutes=settings.SCHEDULER_RETRY_MINUTES), regular_slot)
+
+
+class CadenceScheduler:
+    # A CADA TICK ANALISA SÓ OS DOCUMENTOS QUE VENCERAM DESDE O ÚLTIMO, EM VEZ DE TODOS DE UMA VEZ
+    def __init__(self, pipeline, max_documents: int | None = None, batch_size: int | None = None):
+        self.pipeline = pipeline
+        self.max_documents = max_documents or settings.SCHEDULER_MAX_DOCUMENTS_PER_TICK
+        self.batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+        self._lock = asyncio.Lock()
+        self.last_tick: dict | None = None
+
+    async def _schedule_new(self, now: datetime.datetime) -> int:
+        # DOCUMENTOS SEM HORÁRIO (ANTERIORES À CADÊNCIA) RECEBEM O PRÓXIMO HORÁRIO, SEM RODAR TODOS AGORA
+        scheduled = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                documents = await async_crud.get_unscheduled_documents(db, self.max_documents)
+                if not documents:
+                    return scheduled
+                scheduled += await async_crud.schedule_documents(
+                    db, {doc.id: next_slot(doc.id, doc.cadence_days, now) for doc in documents}
+                )
+
+    async def _schedule_retries(self, documents: list, slots: dict, period_starts: dict) -> int:
+        # QUEM NÃO GANHOU UM JOB NESTE PERÍODO (FALHA AO INICIAR, JOB FAILED, LEASE OU JOB PENDENTE EM CONFLITO)
+        # VOLTA EM SCHEDULER_RETRY_MINUTES EM VEZ DE ESPERAR O PERÍODO INTEIRO; FAILED DEMAIS NO PERÍODO ESPERA O PRÓXIMO
+        now = local_now()
+        async with AsyncSessionLocal() as db:
+            jobs = await async_crud.get_jobs_since(db, {doc.id: period_starts[doc.id] for doc in documents})
+            retries = {
+                doc.id: retry_slot(slots[doc.id], now) for doc in documents
+                if not jobs[doc.id]["live"] and jobs[doc.id]["failed"] < settings.SCHEDULER_MAX_FAILED_PER_PERIOD
+            }
+            await async_crud.schedule_documents(db, retries)
+        if retries:
+            logger.warning("%s documentos não foram analisados e terão nova tentativa em %s minutos", len(retries), settings.SCHEDULER_RETRY_MINUTES)
+        return len(retries)
+
+    async def tick(self) -> dict:
+        if self._lock.locked():
+            logger.warning("O tick anterior do agendador ainda está em execução.")
+            return self.last_tick or {}
+        async with self._lock:
+            now = local_now()
+            scheduled = await self._schedule_new(now)
+            if scheduled:
+                logger.info("%s documentos receberam o primeiro horário de análise", scheduled)
+            stats = {"scheduled": scheduled, "due": 0, "already_analyzed": 0, "processed": 0, "skipped": 0, "failed": 0, "retries": 0}
+            # LOTES PEQUENOS EM VEZ DE TODOS OS VENCIDOS DE UMA VEZ: COM VÁRIAS RÉPLICAS, CADA TICK PEGA O PRÓXIMO LOTE
+            # AINDA LIVRE E O ATRASO É DIVIDIDO ENTRE ELAS (OS LEASES DO PIPELINE EVITAM QUE DUAS PEGUEM O MESMO DOCUMENTO)
+            while stats["due"] < self.max_documents:
+                async with AsyncSessionLocal() as db:
+                    due = await async_crud.get_due_documents(db, now, min(self.batch_size, self.max_documents - stats["due"]))
+                    slots = {doc.id: next_slot(doc.id, doc.cadence_days, now) for doc in due}
+                    period_starts = {doc.id: slots[doc.id] - cadence_period(doc.cadence_days) for doc in due}
+                    jobs = await async_crud.get_jobs_since(db, period_starts)
+                    # O PRÓXIMO HORÁRIO É GRAVADO ANTES DE RODAR: UMA FALHA NÃO FAZ O DOCUMENTO REPETIR A CADA TICK.
+                    # O HORÁRIO É DETERMINÍSTICO, ENTÃO DUAS RÉPLICAS GRAVANDO O MESMO DOCUMENTO CHEGAM AO MESMO VALOR
+                    await async_crud.schedule_documents(db, slots)
+                if not due:
+                    break
+                stats["due"] += len(due)
+                # JÁ TEM JOB NESTE PERÍODO (OUTRA RÉPLICA, OU NOVA TENTATIVA DEPOIS QUE O JOB ANTERIOR TERMINOU): NÃO PAGA DE NOVO
+                pending = [doc for doc in due if not jobs[doc.id]["live"]]
+                stats["already_analyzed"] += len(due) - len(pending)
+                if not pending:
+                    continue
+                logger.info("Encontrados %s documentos com análise vencida", len(pending))
+                result = await self.pipeline.run([(doc.id, doc.document) for doc in pending], label="AGENDAMENTO")
+                for key in ("processed", "skipped", "failed"):
+                    stats[key] += result[key]
+                stats["retries"] += await self._schedule_retries(pending, slots, period_starts)
+            self.last_tick = {**stats, "finished_at": datetime.datetime.now().isoformat()}
+            return stats
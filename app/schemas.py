@@ -1,5 +1,5 @@
 from typing import List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import datetime
 
 class AnalysisBase(BaseModel):
@@ -15,25 +15,58 @@ class Analysis(AnalysisBase):
     id: int
     document_id: int
     analysis_date: datetime.datetime
-    comparison_resume: str | None = None
+    comparison_resume: dict | str | None = None
     
     class Config:
          from_attributes = True
+
+class AnalysisListItem(BaseModel):
+    id: int
+    document_id: int
+    analysis_date: datetime.datetime
+    unique_id: int | None = None
+    analytics_id: int | None = None
+    total_tokens: int | None = None
+    failed_sections: list[str] | None = None
+    analysis_json: dict | None = None
+    comparison_resume: dict | str | None = None
         
 class MonitoredDocumentBase(BaseModel):
     document: str
     is_active: bool = True
+    cadence_days: int | None = Field(None, ge=1)
     
 class MonitoredDocumentCreate(MonitoredDocumentBase):
     pass
 
+class DocumentCadenceUpdate(BaseModel):
+    # None VOLTA PARA A CADÊNCIA PADRÃO (SCHEDULER_DEFAULT_CADENCE_DAYS)
+    cadence_days: int | None = Field(None, ge=1)
+
+class DocumentCadence(BaseModel):
+    id: int
+    document: str
+    cadence_days: int | None = None
+    next_run_at: datetime.datetime | None = None
+
+    class Config:
+         from_attributes = True
+
 class MonitoredDocument(MonitoredDocumentBase):
     id: int
     created_at: datetime.datetime
+    next_run_at: datetime.datetime | None = None
     analyses: list[Analysis] = []
 
     class Config:
          from_attributes = True
-         
-         
 
+class MonitoredDocumentListItem(MonitoredDocumentBase):
+    id: int
+    created_at: datetime.datetime
+    next_run_at: datetime.datetime | None = None
+    analyses: list[AnalysisListItem] = []
+
+class MonitoredDocumentPage(BaseModel):
+    items: list[MonitoredDocumentListItem]
+    next_after_id: int | None = None
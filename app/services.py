@@ -1,51 +1,256 @@
 import httpx
 import asyncio
 import datetime
-from openai import OpenAI
+import random
+import re
+import time
+from openai import AsyncOpenAI
 import json
+import logging
 from .config import settings
+from .comparison_cache import ComparisonCache
+from .diff import COMPARED_SECTIONS, ReportDiff, diff_reports
+from .features import estimate_tokens, extract_features, feature_deltas, trim_to_budget
+from .governor import RateGovernor
+from .limiter import OVERLOAD_STATUSES, AdaptiveLimiter
+from .metrics import COMPARISONS, OPENAI_TOKENS, SECTION_FAILURES, SECTION_SECONDS, STAGE_SECONDS, TRATUM_REQUEST_ERRORS, TRATUM_REQUEST_SECONDS
+from .poller import AnalysisPoller
+
+logger = logging.getLogger(__name__)
+
+# ERROS TRANSITÓRIOS: VALEM NOVA TENTATIVA. 4xx (EXCETO ESTES) INDICA ERRO PERMANENTE DA REQUISIÇÃO
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_TRANSPORT_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+# CAMPOS DE PAGINAÇÃO QUE A TRATUM PODE DEVOLVER (NA RAIZ OU DENTRO DO "register")
+# SÓ CHAVES EXPLÍCITAS DE PAGINAÇÃO: "total" NOS REGISTROS COSTUMA SER VALOR EM REAIS, NÃO QUANTIDADE DE ITENS
+TOTAL_PAGES_KEYS = ("totalPages",)
+TOTAL_ITEMS_KEYS = ("totalElements", "totalRecords")
+# SEGMENTOS NUMÉRICOS DA URL (IDS, CNPJ/CPF) PARA AGRUPAR A LATÊNCIA POR ROTA
+_PATH_IDS = re.compile(r"(?<=/)\d+(?=/|$)")
+
+
+class SectionFetchError(Exception):
+    def __init__(self, url: str, reason: str, attempts: int):
+        super().__init__(f"{url}: {reason} (após {attempts} tentativa(s))")
+        self.url = url
+        self.reason = reason
+        self.attempts = attempts
+
 
 class TratumService:
     def __init__(self):
         self._token: str | None = None
         self._expires_at: datetime.datetime | None = None
-        self._lock = asyncio.Lock()
-        self.base_url = "https://search.tratum.com.br"
+        # LOGIN EM ANDAMENTO, COMPARTILHADO POR TODAS AS REQUISIÇÕES QUE PRECISAM DE UM TOKEN NOVO
+        self._login_task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._auth_stats = {"logins": 0, "proactive_refreshes": 0, "unauthorized_retries": 0}
         self.settings = settings
+        self.base_url = self.settings.TRATUM_BASE_URL
+        self._client: httpx.AsyncClient | None = None
+        self._connection_stats = {"requests": 0, "new_connections": 0, "tls_handshakes": 0}
+        self.timeouts = {
+            "login": self.settings.TRATUM_LOGIN_TIMEOUT,
+            "initiate": self.settings.TRATUM_INITIATE_TIMEOUT,
+            "summary": self.settings.TRATUM_SUMMARY_TIMEOUT,
+            "detail": self.settings.TRATUM_DETAIL_TIMEOUT,
+        }
+        self.poller = AnalysisPoller(self.fetch_status_summary)
+        # UM LIMITADOR ADAPTATIVO POR HOST, COMPARTILHADO POR TODOS OS DOCUMENTOS EM PROCESSAMENTO
+        self.limiters: dict[str, AdaptiveLimiter] = {}
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = self.settings.TRATUM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("TRATUM_HTTP2 habilitado, mas o pacote 'h2' não está instalado. Usando HTTP/1.1.")
+                http2 = False
+        limits = httpx.Limits(
+            max_connections=self.settings.TRATUM_MAX_CONNECTIONS,
+            max_keepalive_connections=self.settings.TRATUM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=self.settings.TRATUM_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(self.timeouts["detail"], connect=self.settings.TRATUM_CONNECT_TIMEOUT)
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+            event_hooks={"request": [self._on_request]},
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # CLIENTE ÚNICO E COMPARTILHADO, CRIADO SOB DEMANDA CASO start() NÃO TENHA SIDO CHAMADO
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def start(self):
+        _ = self.client
+        await self.poller.start()
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        await self.poller.stop()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        logger.info("Cliente HTTP da Tratum encerrado", extra={"stats": self.connection_stats()})
+
+    async def _on_request(self, request: httpx.Request):
+        self._connection_stats["requests"] += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self._connection_stats["new_connections"] += 1
+        elif event_name == "connection.start_tls.complete":
+            self._connection_stats["tls_handshakes"] += 1
+
+    def connection_stats(self) -> dict:
+        stats = dict(self._connection_stats)
+        requests = stats["requests"]
+        stats["reused_connections"] = max(requests - stats["new_connections"], 0)
+        stats["reuse_ratio"] = round(stats["reused_connections"] / requests, 4) if requests else 0.0
+        stats["limiters"] = {host: limiter.stats() for host, limiter in self.limiters.items()}
+        stats["auth"] = {**self._auth_stats, "token_expires_at": self._expires_at.isoformat() if self._expires_at else None}
+        return stats
+
+    def _limiter_for(self, url: str) -> AdaptiveLimiter:
+        host = httpx.URL(url).host or self.client.base_url.host
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveLimiter()
+        return self.limiters[host]
+
+    @staticmethod
+    def _latency_key(endpoint: str, url: str) -> str:
+        # CADA SEÇÃO/ROTA TEM SUA PRÓPRIA LINHA DE BASE: IDS E NÚMEROS DE DOCUMENTO VIRAM {id}
+        return f"{endpoint} {_PATH_IDS.sub('{id}', httpx.URL(url).path)}"
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float | None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    async def _request(self, method: str, url: str, endpoint: str = "detail", **kwargs) -> httpx.Response:
+        if endpoint == "login":
+            return await self._send(method, url, endpoint, **kwargs)
+        # O TOKEN É SEMPRE O ATUAL, NÃO O QUE O CHAMADOR LEU ANTES; UM 401 FORÇA UM NOVO LOGIN (COMPARTILHADO) E UMA NOVA TENTATIVA
+        token = await self.get_token()
+        if not token:
+            raise RuntimeError("Não foi possível obter o token de autenticação da Tratum.")
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), "Authorization": f"Bearer {token}"}
+        response = await self._send(method, url, endpoint, **kwargs)
+        if response.status_code != 401:
+            return response
+        logger.warning("Token recusado pela Tratum em %s. Renovando o login e tentando de novo.", url)
+        self._auth_stats["unauthorized_retries"] += 1
+        token = await self._login(stale_token=token)
+        if not token:
+            return response
+        kwargs["headers"]["Authorization"] = f"Bearer {token}"
+        return await self._send(method, url, endpoint, **kwargs)
+
+    async def _send(self, method: str, url: str, endpoint: str, **kwargs) -> httpx.Response:
+        limiter = self._limiter_for(url)
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = await self.client.request(method, url, timeout=self.timeouts[endpoint], **kwargs)
+        except (httpx.TimeoutException, httpx.NetworkError) as e:
+            limiter.release(endpoint, None, overloaded=True)
+            TRATUM_REQUEST_ERRORS.inc(endpoint=endpoint, reason=type(e).__name__)
+            raise
+        except BaseException:
+            limiter.release(endpoint, None)
+            raise
+        latency = time.monotonic() - start
+        TRATUM_REQUEST_SECONDS.observe(latency, endpoint=endpoint)
+        if response.status_code >= 400:
+            TRATUM_REQUEST_ERRORS.inc(endpoint=endpoint, reason=str(response.status_code))
+        overloaded = response.status_code in OVERLOAD_STATUSES or response.status_code >= 500
+        limiter.release(
+            self._latency_key(endpoint, url),
+            latency,
+            overloaded=overloaded,
+            retry_after=self._retry_after(response) if overloaded else None
+        )
+        return response
         
     async def _fetch_new_token(self):
-        print("=======BUSCANDO NOVO TOKEN========")
-        login_url = f"{self.base_url}/v1/login"
+        logger.info("Buscando novo token")
         payload = {
             "email": self.settings.TRATUM_EMAIL,
             "password": self.settings.TRATUM_PASSWORD
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(login_url, json=payload)
-                response.raise_for_status()
-                data = response.json()
-                self._token = data.get('token')
-                self._expires_at = datetime.datetime.now() + datetime.timedelta(hours=23, minutes=50)
-                print(f">>> TOKEN RENOVADO. VÁLIDO ATÉ: {self._expires_at}")
-            except Exception as e: 
-                print(f"ERRO AO BUSCAR TOKEN: {e}")
-                self._token = None
-        
+        try:
+            with STAGE_SECONDS.time(stage="login"):
+                response = await self._request("POST", "/v1/login", endpoint="login", json=payload)
+            response.raise_for_status()
+            data = response.json()
+            self._token = data.get('token')
+            self._expires_at = datetime.datetime.now() + datetime.timedelta(hours=23, minutes=50)
+            self._auth_stats["logins"] += 1
+            logger.info("Token renovado. Válido até %s", self._expires_at)
+        except Exception as e: 
+            # SE O LOGIN FALHAR, O TOKEN ANTERIOR CONTINUA EM USO ATÉ EXPIRAR
+            logger.error("Erro ao buscar token: %s", e)
+
+    def _token_is_valid(self) -> bool:
+        return self._token is not None and self._expires_at is not None and datetime.datetime.now() < self._expires_at
+
+    async def _login(self, stale_token: str | None = None) -> str | None:
+        # UM ÚNICO LOGIN POR VEZ: QUEM CHEGA DURANTE O LOGIN AGUARDA O MESMO TASK
+        if stale_token is not None and self._token == stale_token:
+            # TOKEN RECUSADO (401): DEIXA DE SER USADO MESMO QUE AINDA NÃO TENHA EXPIRADO
+            self._token = None
+            self._expires_at = None
+        elif stale_token is not None:
+            # OUTRA REQUISIÇÃO JÁ TROCOU O TOKEN RECUSADO
+            if self._login_task is None or self._login_task.done():
+                return self._token
+        if self._login_task is None or self._login_task.done():
+            self._login_task = asyncio.create_task(self._fetch_new_token())
+        # shield: O CANCELAMENTO DE UM CHAMADOR NÃO CANCELA O LOGIN DOS DEMAIS
+        await asyncio.shield(self._login_task)
+        return self._token if self._token_is_valid() else None
+
     async def get_token(self) -> str | None:
-            async with self._lock:
-                if self._token is None or datetime.datetime.now() >= self._expires_at:
-                    await self._fetch_new_token()
-                return self._token 
-            
-    async def _initiate_analysis(self, token:str, document_number: str, document_type:str) -> dict | None:
-            url = f"{self.base_url}/v2/analytics"
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+        # CAMINHO RÁPIDO SEM LOCK: COM TOKEN VÁLIDO, NENHUMA ESPERA
+        if self._token_is_valid():
+            return self._token
+        return await self._login()
+
+    async def _refresh_loop(self):
+        # RENOVA O TOKEN ANTES DE EXPIRAR, EM SEGUNDO PLANO, PARA NENHUMA REQUISIÇÃO ESPERAR PELO LOGIN
+        margin = datetime.timedelta(minutes=self.settings.TRATUM_TOKEN_REFRESH_MARGIN_MINUTES)
+        while True:
+            if self._expires_at is None:
+                delay = 0.0 if self._token is None else self.settings.TRATUM_TOKEN_RETRY_SECONDS
+            else:
+                delay = max((self._expires_at - margin - datetime.datetime.now()).total_seconds(), 0.0)
+            await asyncio.sleep(delay)
+            expires_at, was_valid = self._expires_at, self._token_is_valid()
+            await self._login()
+            if self._expires_at == expires_at:
+                # O LOGIN FALHOU (OU NINGUÉM PRECISOU DELE): TENTA DE NOVO EM BREVE, SEM REPETIR EM LAÇO APERTADO
+                await asyncio.sleep(self.settings.TRATUM_TOKEN_RETRY_SECONDS)
+            elif was_valid:
+                self._auth_stats["proactive_refreshes"] += 1
             
+    async def _initiate_analysis(self, document_number: str, document_type:str) -> dict | None:
             payload = {
                 "holderId": self.settings.TRATUM_HOLDER_ID,
                 "organizationId": self.settings.TRATUM_ORGANIZATION_ID,
@@ -54,223 +259,293 @@ class TratumService:
                 "documentNumber": document_number
             }
             
-            async with httpx.AsyncClient() as client:
-                try:
-                    print(f"[ETAPA 1/3] INICIANDO ANÁLISE PARA: {document_number}")
-                    response = await client.post(url, headers=headers, json=payload, timeout=300.0)
-                    response.raise_for_status()
-                    data = response.json()
-                    return data.get("result")
-                except Exception as e:
-                    print(f"ERRO AO INICIAR ANALISE PARA: {document_number} -> {e}")
-                    return None
-        
-    async def _fetch_generic_detail(self, client: httpx.AsyncClient, url: str, headers: dict, data_key: str = "register", method: str = "GET", payload: dict | None = None) -> dict | None:
-        try:
-            if method.upper() == "POST":
-                response = await client.post(url, headers=headers, json=payload, timeout=120.0)
-            else:
-                response = await client.get(url, headers=headers, timeout=120.0)
-            response.raise_for_status()
-            return response.json().get(data_key)
-        except Exception as e:
-            print(f"ERRO: A busca de dados ({method}) na {url}: {e} falhou")
-            return None
-        
-    async def _fetch_analysis_details(self, token: str, ids: dict) -> dict | None:
-            consume_unique_id = ids.get("userPlanConsumeUniqueId") 
-            analytics_id = ids.get("userPlanConsumeAnalyticsId")
-            
-            if not all([consume_unique_id, analytics_id]):
-                print("ERRO: IDS de consumo nao encontrados na resposta")
+            try:
+                logger.debug("[ETAPA 1/3] Iniciando análise para %s", document_number)
+                response = await self._request("POST", "/v2/analytics", endpoint="initiate", json=payload)
+                response.raise_for_status()
+                data = response.json()
+                return data.get("result")
+            except Exception as e:
+                logger.error("Erro ao iniciar análise para %s -> %s", document_number, e)
                 return None
-            
-            url = (
-                f"{self.base_url}/v2/analytics/{analytics_id}"
-            )
-            
-            payload = {
-                "holderId": self.settings.TRATUM_HOLDER_ID,
-                "organizationId": self.settings.TRATUM_ORGANIZATION_ID,
-                "userPlanConsumeUniqueId": consume_unique_id
-                }
-            
-            headers = {
-                "Authorization": f"Bearer {token}"
-            }
-            async with httpx.AsyncClient() as client:
-                try:
-                    print(f">>> [ETAPA 3/3] Buscando detalhes da análise ID {analytics_id}...")
-                    response = await client.post(url, headers=headers, json=payload, timeout=120.0)
-                    response.raise_for_status()
-                    data = response.json()
-                    return data.get("register")
-                except Exception as e:
-                    print(f"!!! ERRO ao buscar detalhes da análise: {e}")
-                    return None
-     
+        
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, RETRYABLE_TRANSPORT_ERRORS):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRYABLE_STATUSES
+        # JSON INVÁLIDO COSTUMA SER RESPOSTA TRUNCADA
+        return isinstance(error, ValueError)
 
-    async def fetch_summary_by_id(self, analytics_id: int, consume_unique_id: int) -> dict | None:
-        token = await self.get_token()
-        if not token:
-            print("ERRO: Não foi possível obter o token de autenticação.")
-            return None
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.settings.TRATUM_RETRY_MAX_DELAY, self.settings.TRATUM_RETRY_BASE_DELAY * (2 ** attempt)))
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+            # LIMITE DE REQUISIÇÕES: RESPEITA O Retry-After E NUNCA ESPERA MENOS QUE O ATRASO BASE
+            delay = max(delay, self._retry_after(error.response) or 0.0, self.settings.TRATUM_RETRY_BASE_DELAY)
+        return delay
 
-        url = f"{self.base_url}/v2/analytics/{analytics_id}"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+    async def _fetch_generic_detail(self, url: str, data_key: str | None = "register", method: str = "GET", payload: dict | None = None, endpoint: str = "detail", max_retries: int | None = None) -> dict | None:
+        # NOVAS TENTATIVAS COM BACKOFF SÓ PARA ERROS TRANSITÓRIOS; SE AINDA FALHAR, LEVANTA SectionFetchError
+        max_retries = self.settings.TRATUM_DETAIL_MAX_RETRIES if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            try:
+                if method.upper() == "POST":
+                    response = await self._request("POST", url, endpoint=endpoint, json=payload)
+                else:
+                    response = await self._request("GET", url, endpoint=endpoint)
+                response.raise_for_status()
+                body = response.json()
+                return body if data_key is None else body.get(data_key)
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+                if not self._is_retryable(e) or attempt >= max_retries:
+                    logger.error("A busca de dados (%s) em %s falhou -> %s", method, url, reason)
+                    raise SectionFetchError(url, reason, attempt + 1) from e
+                delay = self._retry_delay(attempt, e)
+                logger.warning("Falha transitória em %s (%s). Nova tentativa em %.1fs.", url, type(e).__name__, delay)
+            attempt += 1
+            await asyncio.sleep(delay)
+        
+    async def fetch_summary_by_id(self, analytics_id: int, consume_unique_id: int) -> dict | None:
+        url = f"/v2/analytics/{analytics_id}"
         payload = {
             "holderId": self.settings.TRATUM_HOLDER_ID,
             "organizationId": self.settings.TRATUM_ORGANIZATION_ID,
             "userPlanConsumeUniqueId": consume_unique_id
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f">>> Buscando sumário específico da análise ID {analytics_id}...")
-                response = await client.post(url, headers=headers, json=payload, timeout=120.0)
-                response.raise_for_status()
-                data = response.json()
-                return data.get("register")
-            except Exception as e:
-                print(f"!!! ERRO ao buscar o sumário da análise ID {analytics_id}: {e}")
-                return None 
+        try:
+            logger.debug("Buscando sumário específico da análise ID %s", analytics_id)
+            response = await self._request("POST", url, endpoint="summary", json=payload)
+            response.raise_for_status()
+            data = response.json()
+            return data.get("register")
+        except Exception as e:
+            logger.error("Erro ao buscar o sumário da análise ID %s: %s", analytics_id, e)
+            return None 
     
-    async def fetch_existing_analysis(self, analytics_id: int, consume_unique_id: int, document_number: str) -> dict | None:
-        token = await self.get_token()
-        if not token: return None
-        
-        print(f">>> Buscando detalhes agregados para a análise ID {analytics_id}...")
-        headers = {"Authorization": f"Bearer {token}"}
-        holder_id = self.settings.TRATUM_HOLDER_ID
-        org_id = self.settings.TRATUM_ORGANIZATION_ID
-        
+    async def fetch_status_summary(self, analytics_id: int, consume_unique_id: int) -> dict | None:
         summary_payload = {
-            "holderId": holder_id,
-            "organizationId": org_id,
+            "holderId": self.settings.TRATUM_HOLDER_ID,
+            "organizationId": self.settings.TRATUM_ORGANIZATION_ID,
             "userPlanConsumeUniqueId": consume_unique_id
         }
-        main_summary = await self._fetch_generic_detail(
-            httpx.AsyncClient(),
-            url=f"{self.base_url}/v2/analytics/{analytics_id}",
-            headers=headers,
-            method="POST",
-            payload=summary_payload
-        )
-        if not main_summary:
-            print(f"ERRO: Falha ao buscar o sumário principal da análise {analytics_id}")
-        debtor_id = main_summary.get("userPlanConsumeGovernmentDebtorSummaryId")
-        
-        async with httpx.AsyncClient() as client:
-            tasks = {
-                        "history_rfb": self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/history-rfb/detail?page=1", headers),
-                        "faturamento": self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/activity-indicator/detail", headers),
-                        "certidoes": self._fetch_generic_detail(client, f"{self.base_url}/v1/certification/fake/{analytics_id}", headers, data_key="list"),
-                        "qsa": self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/qsa?level=1st-LEVEL", headers, data_key="result"),
-                        "relacionamentos": self._fetch_generic_detail(client, f"{self.base_url}/v1/organizations/{org_id}/qsa/{document_number}", headers=headers, method="POST")
-            }
-            if debtor_id: 
-                tasks["divida_ativa"] = self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/debtor/{debtor_id}/detail?size=100", headers)
-            results = await asyncio.gather(*tasks.values())
-            final_analysis = dict(zip(tasks.keys(), results))
-            final_analysis["summary"] = main_summary
-        print(f">>> Detalhes para análise ID {analytics_id} agregados com sucesso.")
-        return {
-            "analysis_json": final_analysis,
-            "unique_id": consume_unique_id,
-            "analytics_id": analytics_id
-        }
-               
-    async def generate_analysis(self, document_number: str) -> dict | None:
-        token = await self.get_token()
-        if not token: return None
+        try:
+            # SEM NOVAS TENTATIVAS AQUI: O POLLER JÁ CONSULTA DE NOVO NO PRÓXIMO INTERVALO
+            return await self._fetch_generic_detail(
+                url=f"/v2/analytics/{analytics_id}",
+                method="POST",
+                payload=summary_payload,
+                endpoint="summary",
+                max_retries=0
+            )
+        except SectionFetchError:
+            return None
 
+    async def start_analysis(self, document_number: str) -> tuple[int, int] | None:
         doc_type = "CNPJ" if len(document_number) == 14 else "CPF"
-        initiation_result = await self._initiate_analysis(token, document_number, doc_type)
+        initiation_result = await self._initiate_analysis(document_number, doc_type)
         if not initiation_result: return None
         
         analytics_id = initiation_result.get("userPlanConsumeAnalyticsId")
         consume_unique_id = initiation_result.get("userPlanConsumeUniqueId")
         
         if not all([analytics_id, consume_unique_id]):
-            print("ERRO: IDs de consumo ou de análise não encontrados.")
+            logger.error("IDs de consumo ou de análise não encontrados.")
             return None
-        
-        polling_interval = 30  
-        total_timeout = 360 
-        start_time = datetime.datetime.now()
-        main_certification = None
-        main_summary = None
-        
-        print(f">>> [ETAPA 2/3] Iniciando polling do status da análise ID {analytics_id}...")
-        
-        headers = {"Authorization": f"Bearer {token}"}
+        return analytics_id, consume_unique_id
+
+    def _section_requests(self, analytics_id: int, consume_unique_id: int, document_number: str, main_summary: dict, request_certification: bool = True) -> dict[str, dict]:
         holder_id = self.settings.TRATUM_HOLDER_ID
         org_id = self.settings.TRATUM_ORGANIZATION_ID
-        summary_payload = {"holderId": holder_id, "organizationId": org_id, "userPlanConsumeUniqueId": consume_unique_id}
-
-        while (datetime.datetime.now() - start_time).total_seconds() < total_timeout:
-            async with httpx.AsyncClient() as client:
-                current_summary = await self._fetch_generic_detail(
-                    client,
-                    url=f"{self.base_url}/v2/analytics/{analytics_id}",
-                    headers=headers,
-                    method="POST",
-                    payload=summary_payload
-                )
-            if current_summary:
-                status = current_summary.get("status")
-                elapsed_time = (datetime.datetime.now() - start_time).total_seconds()
-                print(f"--- Status atual: {status} (Tempo decorrido: {elapsed_time:.0f}s)")
-                if status == "DONE":
-                    print(f">>> Análise concluída com status {status}. Prosseguindo para agregação.")
-                    main_summary = current_summary
-                    break
-            await asyncio.sleep(polling_interval)
-        if not main_summary:
-            print(f"ERRO: Timeout. A análise não foi concluída com 'DONE' em {total_timeout} segundos.")
-            return None
-        print(f">>> [ETAPA 3/3] Buscando todos os detalhes para a análise ID {analytics_id} em paralelo...")
-        
         debtor_id = main_summary.get("userPlanConsumeGovernmentDebtorSummaryId")
+        base = f"/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}"
+
+        sections = {
+            "history_rfb": {"url": f"{base}/history-rfb/detail", "paginated": True},
+            "faturamento": {"url": f"{base}/activity-indicator/detail"},
+            "certidoes": {"url": f"/v1/certification/fake/{analytics_id}", "data_key": "list"},
+            "qsa": {"url": f"{base}/qsa?level=1st-LEVEL", "data_key": "result"},
+            "relacionamentos": {"url": f"/v1/organizations/{org_id}/qsa/{document_number}", "method": "POST"},
+        }
+        if request_certification:
+            sections["gerar_certidao"] = {"url": f"/v1/certification/{analytics_id}", "data_key": "list"}
+        if debtor_id:
+            sections["divida_ativa"] = {"url": f"{base}/debtor/{debtor_id}/detail", "paginated": True}
+        return sections
+
+    @staticmethod
+    def _page_url(url: str, page: int, size: int) -> str:
+        return f"{url}{'&' if '?' in url else '?'}page={page}&size={size}"
+
+    @staticmethod
+    def _total_pages(body: dict, size: int) -> int:
+        # A PAGINAÇÃO VEM NA RAIZ DA RESPOSTA, AO LADO DO "register" (QUE TEM OS DADOS DO RELATÓRIO E NÃO É CONSULTADO);
+        # SEM O TOTAL DE PÁGINAS, CALCULA PELO TOTAL DE ITENS
+        for key in TOTAL_PAGES_KEYS:
+            if isinstance(body.get(key), int) and not isinstance(body[key], bool):
+                return max(body[key], 1)
+        for key in TOTAL_ITEMS_KEYS:
+            if isinstance(body.get(key), int) and not isinstance(body[key], bool):
+                return max(-(-body[key] // size), 1)
+        return 1
+
+    @staticmethod
+    def _merge_page(merged, page):
+        # LISTAS SÃO ESTENDIDAS; EM DICIONÁRIOS, SÓ OS CAMPOS DE LISTA RECEBEM OS ITENS DA NOVA PÁGINA
+        if merged is None:
+            return page
+        if isinstance(merged, list) and isinstance(page, list):
+            merged.extend(page)
+        elif isinstance(merged, dict) and isinstance(page, dict):
+            for key, value in page.items():
+                if isinstance(value, list) and isinstance(merged.get(key), list):
+                    merged[key].extend(value)
+                elif key not in merged:
+                    merged[key] = value
+        return merged
+
+    async def _fetch_paginated_detail(self, url: str, data_key: str = "register", **kwargs):
+        # A PRIMEIRA PÁGINA INFORMA O TOTAL; AS DEMAIS SAEM TODAS DE UMA VEZ (O LIMITADOR CONTROLA A CONCORRÊNCIA)
+        # E SÃO INCORPORADAS CONFORME CHEGAM, MANTENDO A ORDEM: UMA PÁGINA ADIANTADA ESPERA SÓ ATÉ AS ANTERIORES CHEGAREM
+        size = self.settings.TRATUM_PAGE_SIZE
+        first = await self._fetch_generic_detail(self._page_url(url, 1, size), data_key=None, **kwargs)
+        if not isinstance(first, dict):
+            return first
+        merged = first.get(data_key)
+        total_pages = self._total_pages(first, size)
+        if total_pages > self.settings.TRATUM_MAX_PAGES:
+            logger.warning("%s tem %s páginas; buscando apenas as primeiras %s.", url, total_pages, self.settings.TRATUM_MAX_PAGES)
+            total_pages = self.settings.TRATUM_MAX_PAGES
+        if total_pages <= 1:
+            return merged
+
+        async def fetch_page(page: int):
+            return page, await self._fetch_generic_detail(self._page_url(url, page, size), data_key=data_key, **kwargs)
+
+        tasks = [asyncio.create_task(fetch_page(page)) for page in range(2, total_pages + 1)]
+        pending, next_page = {}, 2
+        try:
+            for finished in asyncio.as_completed(tasks):
+                page, content = await finished
+                pending[page] = content
+                while next_page in pending:
+                    merged = self._merge_page(merged, pending.pop(next_page))
+                    next_page += 1
+        finally:
+            # UMA PÁGINA QUE FALHOU DERRUBA A SEÇÃO INTEIRA (VAI PARA REPARO): CANCELA AS QUE AINDA ESTÃO EM VOO
+            for task in tasks:
+                task.cancel()
+        return merged
+
+    async def _fetch_section(self, paginated: bool = False, **request):
+        if paginated:
+            return await self._fetch_paginated_detail(**request)
+        return await self._fetch_generic_detail(**request)
+
+    async def _timed_section(self, name: str, request: dict):
+        with SECTION_SECONDS.time(section=name):
+            return await self._fetch_section(**request)
+
+    async def _fetch_sections(self, sections: dict[str, dict]) -> tuple[dict, list[str]]:
+        # SEÇÕES QUE FALHAM FICAM COMO None NO RELATÓRIO E SÃO DEVOLVIDAS EM failed_sections PARA REPARO POSTERIOR
+        results = await asyncio.gather(
+            *[self._timed_section(name, request) for name, request in sections.items()],
+            return_exceptions=True
+        )
+        fetched, failed = {}, []
+        for name, result in zip(sections, results):
+            if isinstance(result, SectionFetchError):
+                fetched[name] = None
+                failed.append(name)
+                SECTION_FAILURES.inc(section=name)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                fetched[name] = result
+        return fetched, failed
+
+    async def aggregate_analysis(self, analytics_id: int, consume_unique_id: int, document_number: str, main_summary: dict, request_certification: bool = True) -> dict | None:
+        sections = self._section_requests(analytics_id, consume_unique_id, document_number, main_summary, request_certification)
+        final_analysis, failed_sections = await self._fetch_sections(sections)
+        final_analysis["summary"] = main_summary
         
-        async with httpx.AsyncClient() as client:
-            tasks = {
-                "history_rfb": self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/history-rfb/detail?page=1", headers),
-                "faturamento": self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/activity-indicator/detail", headers),
-                "certidoes": self._fetch_generic_detail(client, f"{self.base_url}/v1/certification/fake/{analytics_id}", headers, data_key="list"),
-                "qsa": self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/qsa?level=1st-LEVEL", headers, data_key="result"),
-                "relacionamentos": self._fetch_generic_detail(client, f"{self.base_url}/v1/organizations/{org_id}/qsa/{document_number}", headers=headers, method="POST"),
-                "gerar_certidao": self._fetch_generic_detail(client, f"{self.base_url}/v1/certification/{analytics_id}", headers=headers, data_key="list")
-            }
-            
-            if debtor_id:
-                tasks["divida_ativa"] = self._fetch_generic_detail(client, f"{self.base_url}/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{consume_unique_id}/analytics/{analytics_id}/debtor/{debtor_id}/detail?size=100", headers)
-            
-            results = await asyncio.gather(*tasks.values())
-            
-            final_analysis = dict(zip(tasks.keys(), results))
-            final_analysis["summary"] = main_summary
-        
-        print(">>> Detalhes agregados com sucesso.")
+        if failed_sections:
+            logger.warning("Análise ID %s agregada com seções pendentes de reparo: %s", analytics_id, ", ".join(failed_sections))
+        else:
+            logger.debug("Detalhes da análise ID %s agregados com sucesso.", analytics_id)
         return {
             "analysis_json": final_analysis,
             "unique_id": consume_unique_id,
-            "analytics_id": analytics_id
+            "analytics_id": analytics_id,
+            "failed_sections": failed_sections
         }
 
+    async def repair_sections(self, analytics_id: int, consume_unique_id: int, document_number: str, main_summary: dict, section_names: list[str]) -> tuple[dict, list[str]] | None:
+        # BUSCA DE NOVO APENAS AS SEÇÕES QUE FALHARAM, USANDO OS IDS JÁ GRAVADOS (SEM NOVA ANÁLISE PAGA)
+        requests = self._section_requests(
+            analytics_id, consume_unique_id, document_number, main_summary, request_certification="gerar_certidao" in section_names
+        )
+        sections = {name: requests[name] for name in section_names if name in requests}
+        return await self._fetch_sections(sections)
+
+    async def fetch_existing_analysis(self, analytics_id: int, consume_unique_id: int, document_number: str) -> dict | None:
+        logger.debug("Buscando detalhes agregados para a análise ID %s", analytics_id)
+        main_summary = await self.fetch_status_summary(analytics_id, consume_unique_id)
+        if not main_summary:
+            logger.error("Falha ao buscar o sumário principal da análise %s", analytics_id)
+            return None
+        return await self.aggregate_analysis(analytics_id, consume_unique_id, document_number, main_summary, request_certification=False)
+
 class ComparisonService:
+    # ALTERAR SEMPRE QUE O PROMPT OU O MODELO MUDAREM, PARA INVALIDAR O CACHE DE COMPARAÇÕES
+    PROMPT_VERSION = "gpt-4o/features-v1"
+
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # AS NOVAS TENTATIVAS FICAM A CARGO DO RateGovernor
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+        self.governor = RateGovernor()
+        self.cache = ComparisonCache()
+        self.stats = {"compared": 0, "skipped_unchanged": 0, "cached": 0}
+
+    def skip_rate(self) -> float:
+        total = sum(self.stats.values())
+        return round(self.stats["skipped_unchanged"] / total, 4) if total else 0.0
+
+    def _stable_summary(self, report_diff: ReportDiff, previous_resume: dict | None) -> dict:
+        # RESUMO DETERMINÍSTICO PARA QUANDO NADA MATERIAL MUDOU: REAPROVEITA OS NÚMEROS DA COMPARAÇÃO ANTERIOR
+        previous_resume = previous_resume if isinstance(previous_resume, dict) else {}
+        general_analysis = dict(previous_resume.get("general_analysis") or {})
+        general_analysis["situation"] = "estável"
+        general_analysis["corporate_structure"] = {"has_changed": False}
+        comparison_table = []
+        for row in previous_resume.get("comparison_table") or []:
+            if isinstance(row, dict):
+                comparison_table.append({
+                    "metric": row.get("metric"),
+                    "previous_analysis": row.get("current_analysis"),
+                    "current_analysis": row.get("current_analysis"),
+                    "percentage_change": "0%"
+                })
+        return {
+            "resume_description": (
+                "Nenhuma alteração material foi identificada em relação à análise anterior "
+                f"(seções comparadas: {', '.join(report_diff.sections)}). O perfil de risco permanece estável."
+            ),
+            "general_analysis": general_analysis,
+            "comparison_table": comparison_table,
+            "generated_by": "diff"
+        }
         
-    def _generate_prompt(self, document: str, old_data: dict, new_data: dict) -> str:
-        old_data_str = json.dumps(old_data, indent=2, ensure_ascii=False)
-        new_data_str = json.dumps(new_data, indent=2, ensure_ascii=False)
+    def _render_prompt(self, document: str, old_features: dict, new_features: dict, deltas: dict) -> str:
+        old_data_str = json.dumps(old_features, ensure_ascii=False, separators=(",", ":"), default=str)
+        new_data_str = json.dumps(new_features, ensure_ascii=False, separators=(",", ":"), default=str)
+        deltas_str = json.dumps(deltas, ensure_ascii=False, separators=(",", ":"), default=str)
         
         return f"""
-        Sua tarefa é atuar como uma API. Compare os dois relatórios JSON (antigo e novo) para o documento {document} e retorne um único e válido objeto JSON.
+        Sua tarefa é atuar como uma API. Compare os indicadores extraídos dos dois relatórios (antigo e novo) para o documento {document} e retorne um único e válido objeto JSON.
         NÃO inclua nenhum texto explicativo antes ou depois do JSON. Sua resposta DEVE começar com `{{` e terminar com `}}`.
 
         O formato de saída JSON OBRIGATÓRIO é o seguinte, com as chaves (nomes dos campos) em inglês:
@@ -293,51 +568,107 @@ class ComparisonService:
           ]
         }}
 
+        Seções marcadas com "omitted" foram resumidas apenas pela contagem para caber no limite de tokens.
+
         --- DADOS PARA ANÁLISE ---
 
-        RELATÓRIO ANTIGO:
+        INDICADORES DO RELATÓRIO ANTIGO:
         ```json
         {old_data_str}
         ```
 
-        RELATÓRIO NOVO:
+        INDICADORES DO RELATÓRIO NOVO:
         ```json
         {new_data_str}
         ```
 
+        DIFERENÇAS JÁ CALCULADAS:
+        ```json
+        {deltas_str}
+        ```
+
         Gere o objeto JSON de resposta agora.
         """
+
+    def _generate_prompt(self, document: str, old_data: dict, new_data: dict, report_diff: ReportDiff | None = None) -> str:
+        old_features = extract_features(old_data)
+        new_features = extract_features(new_data)
+        deltas = feature_deltas(old_features, new_features, report_diff)
+        prompt, trimmed = trim_to_budget(
+            old_features,
+            new_features,
+            deltas,
+            lambda old, new, changes: self._render_prompt(document, old, new, changes),
+            settings.COMPARISON_PROMPT_TOKEN_BUDGET
+        )
+        if trimmed:
+            logger.warning("Prompt de %s reduzido para caber em %s tokens. Seções resumidas: %s", document, settings.COMPARISON_PROMPT_TOKEN_BUDGET, ", ".join(trimmed))
+        return prompt
         
-    async def gpt_comparer(self, document:str, old_data:dict, new_data:dict) -> tuple[dict, dict | None]:
-        prompt = self._generate_prompt(document, old_data, new_data)
+    async def gpt_comparer(self, document:str, old_data:dict, new_data:dict, previous_resume: dict | None = None, failed_sections: set[str] | None = None) -> tuple[dict, dict | None]:
+        summary, usage = await self._compare_reports(document, old_data, new_data, previous_resume, failed_sections)
+        if failed_sections and isinstance(summary, dict) and "error" not in summary:
+            summary = {**summary, "excluded_sections": sorted(failed_sections)}
+        return summary, usage
+
+    async def _compare_reports(self, document: str, old_data: dict, new_data: dict, previous_resume: dict | None, failed_sections: set[str] | None) -> tuple[dict, dict | None]:
+        if failed_sections:
+            # SEÇÃO QUE FALHOU (None NO RELATÓRIO) EM QUALQUER UMA DAS ANÁLISES NÃO ENTRA NO DIFF, NOS INDICADORES NEM NO PROMPT:
+            # UMA FALHA PASSAGEIRA NÃO PODE VIRAR "MUDANÇA MATERIAL" NEM ALERTA DE QUADRO SOCIETÁRIO
+            logger.info("Seções fora da comparação de %s por falha na busca: %s", document, ", ".join(sorted(failed_sections)))
+            old_data = {name: content for name, content in old_data.items() if name not in failed_sections}
+            new_data = {name: content for name, content in new_data.items() if name not in failed_sections}
+        report_diff = diff_reports(old_data, new_data, sections=tuple(name for name in COMPARED_SECTIONS if name not in (failed_sections or ())))
+        if settings.COMPARISON_SKIP_UNCHANGED and not report_diff.has_material_changes:
+            self.stats["skipped_unchanged"] += 1
+            COMPARISONS.inc(outcome="skipped_unchanged")
+            logger.info("Nenhuma alteração material entre as análises de %s. Comparação via GPT dispensada.", document)
+            return self._stable_summary(report_diff, previous_resume), {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        cache_key = self.cache.make_key(document, old_data, new_data, self.PROMPT_VERSION)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            self.stats["cached"] += 1
+            COMPARISONS.inc(outcome="cached")
+            logger.info("Comparação de %s encontrada no cache.", document)
+            return cached[0], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        self.stats["compared"] += 1
+        prompt = self._generate_prompt(document, old_data, new_data, report_diff)
         try:
-            loop = asyncio.get_running_loop()
-            response_object = await loop.run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.2,
-                    response_format={"type": "json_object"}
+            estimated_tokens = estimate_tokens(prompt) + settings.OPENAI_ESTIMATED_COMPLETION_TOKENS
+            with STAGE_SECONDS.time(stage="openai"):
+                response_object = await self.governor.run(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o",
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.2,
+                        response_format={"type": "json_object"}
+                    ),
+                    estimated_tokens
                 )
-            )
             
             summary_json_string = response_object.choices[0].message.content
             summary_dict = json.loads(summary_json_string)
             
             usage = response_object.usage
             usage_dict = None
+            self.governor.settle(estimated_tokens, usage.total_tokens if usage else None)
             if usage:
-                print("--- USO DE TOKENS (OpenAI) ---")
-                print(f"   Tokens do Prompt..: {usage.prompt_tokens}")
-                print(f"   Tokens da Resposta: {usage.completion_tokens}")
-                print(f"   Tokens TOTAIS....: {usage.total_tokens}")
-                print("------------------------------")
+                logger.debug(
+                    "Uso de tokens da OpenAI",
+                    extra={"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens, "total_tokens": usage.total_tokens}
+                )
                 usage_dict = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens, "total_tokens": usage.total_tokens}
-                
+                OPENAI_TOKENS.inc(usage.prompt_tokens, kind="prompt")
+                OPENAI_TOKENS.inc(usage.completion_tokens, kind="completion")
+            COMPARISONS.inc(outcome="gpt")
+            
+            await self.cache.set(cache_key, document, summary_dict, usage_dict)
             return summary_dict, usage_dict
             
         except Exception as e:
-            print(f"ERRO AO CONECTAR COM A OPENAI OU PARSEAR JSON -> {e}")
+            logger.error("Erro ao conectar com a OpenAI ou parsear o JSON da comparação de %s -> %s", document, e)
+            COMPARISONS.inc(outcome="error")
             error_response = {"error": "Could not generate JSON summary.", "detail": str(e)}
             return error_response, None
\ No newline at end of file
@@ -0,0 +1,103 @@
+# COMPARA O ESPAÇO EM DISCO E O TEMPO DE CONSULTA ENTRE JSON PURO E CompressedJSON
+# USO: python -m benchmarks.compressed_json [--rows 2000] [--database-url sqlite:///bench.db]
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import JSON, Column, Integer, create_engine, func, select
+from sqlalchemy.orm import declarative_base, deferred, sessionmaker, undefer
+from app.column_types import CompressedJSON, zstandard
+
+BenchBase = declarative_base()
+
+
+class PlainAnalysis(BenchBase):
+    __tablename__ = "bench_plain"
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, index=True)
+    payload = Column(JSON)
+
+
+def compressed_model(codec: str):
+    return type(f"Compressed{codec.title()}", (BenchBase,), {
+        "__tablename__": f"bench_{codec}",
+        "id": Column(Integer, primary_key=True),
+        "document_id": Column(Integer, index=True),
+        "payload": deferred(Column(CompressedJSON(codec=codec))),
+    })
+
+
+def sample_report(seed: int) -> dict:
+    rng = random.Random(seed)
+    return {
+        "summary": {"status": "DONE", "lawsuitsCount": rng.randint(0, 50), "protestCount": rng.randint(0, 5)},
+        "qsa": [{"name": f"Sócio {i}", "qualification": "Sócio-Administrador"} for i in range(rng.randint(1, 6))],
+        "divida_ativa": {"items": [
+            {"inscricao": f"{rng.randint(10**9, 10**10)}", "valorConsolidado": round(rng.random() * 10**5, 2), "situacao": "ATIVA"}
+            for _ in range(rng.randint(0, 100))
+        ]},
+        "history_rfb": [{"event": "Alteração cadastral registrada na Receita Federal", "eventDate": f"2024-0{rng.randint(1, 9)}-01"} for _ in range(rng.randint(10, 200))],
+        "certidoes": [{"name": name, "status": rng.choice(["NEGATIVA", "POSITIVA"])} for name in ("CND Federal", "FGTS", "Trabalhista")],
+    }
+
+
+def measure(engine, model, rows: list[dict]) -> dict:
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        start = time.perf_counter()
+        db.add_all(model(document_id=index % 100, payload=row) for index, row in enumerate(rows))
+        db.commit()
+        write_seconds = time.perf_counter() - start
+
+        stored_bytes = db.execute(select(func.sum(func.length(model.payload)))).scalar()
+
+        db.expunge_all()
+        start = time.perf_counter()
+        listed = db.query(model).filter(model.document_id < 50).all()
+        _ = [item.document_id for item in listed]
+        list_seconds = time.perf_counter() - start
+
+        db.expunge_all()
+        start = time.perf_counter()
+        loaded = db.query(model).options(undefer(model.payload)).filter(model.document_id < 50).all()
+        _ = [item.payload for item in loaded]
+        full_seconds = time.perf_counter() - start
+    return {
+        "bytes": stored_bytes,
+        "write_s": write_seconds,
+        "list_s": list_seconds,
+        "full_s": full_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(database_url)
+    models = {"json": PlainAnalysis, "zlib": compressed_model("zlib")}
+    if zstandard is not None:
+        models["zstd"] = compressed_model("zstd")
+    BenchBase.metadata.drop_all(engine)
+    BenchBase.metadata.create_all(engine)
+
+    rows = [sample_report(seed) for seed in range(args.rows)]
+    print(f"{args.rows} RELATÓRIOS SINTÉTICOS EM {engine.url.render_as_string(hide_password=True)}")
+    baseline = None
+    for name, model in models.items():
+        result = measure(engine, model, rows)
+        baseline = baseline or result["bytes"]
+        print(
+            f"   {name:5s} bytes={result['bytes']:>12,} ({result['bytes'] / baseline:6.1%})  "
+            f"escrita={result['write_s'] * 1000:8.1f}ms  listagem={result['list_s'] * 1000:7.1f}ms  "
+            f"payload completo={result['full_s'] * 1000:7.1f}ms"
+        )
+    BenchBase.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# MEDE QUANTAS COMPARAÇÕES VIA GPT SERIAM DISPENSADAS PELO DIFF ESTRUTURAL
+# USO: python -m benchmarks.diff_skip_rate [--documents 500]
+import argparse
+import time
+from app import crud, models
+from app.database import SessionLocal
+from app.diff import diff_reports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=500, help="Quantidade máxima de documentos avaliados")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    pairs = skipped = 0
+    changed_sections: dict[str, int] = {}
+    diff_seconds = 0.0
+    try:
+        document_ids = [
+            row.id for row in db.query(models.MonitoredDocument.id).order_by(models.MonitoredDocument.id).limit(args.documents)
+        ]
+        for document_id in document_ids:
+            analyses = (
+                db.query(models.Analysis)
+                .filter(models.Analysis.document_id == document_id)
+                .order_by(models.Analysis.analysis_date.asc())
+                .all()
+            )
+            crud.assemble_reports(db, analyses)
+            for old, new in zip(analyses, analyses[1:]):
+                start = time.perf_counter()
+                report_diff = diff_reports(old.analysis_json, new.analysis_json)
+                diff_seconds += time.perf_counter() - start
+                pairs += 1
+                if not report_diff.has_material_changes:
+                    skipped += 1
+                for section in report_diff.changed_sections:
+                    changed_sections[section] = changed_sections.get(section, 0) + 1
+            db.expunge_all()
+    finally:
+        db.close()
+
+    print(f"PARES DE ANÁLISES AVALIADOS: {pairs}")
+    if not pairs:
+        return
+    print(f"COMPARAÇÕES DISPENSADAS (SEM MUDANÇA MATERIAL): {skipped} ({skipped / pairs:.1%})")
+    print(f"TEMPO MÉDIO DO DIFF: {diff_seconds / pairs * 1000:.2f} ms")
+    for section, count in sorted(changed_sections.items(), key=lambda item: -item[1]):
+        print(f"   {section}: alterada em {count} pares ({count / pairs:.1%})")
+
+
+if __name__ == "__main__":
+    main()
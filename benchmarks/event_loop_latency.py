@@ -0,0 +1,112 @@
+# MEDE O ATRASO DO EVENT LOOP ENQUANTO O BANCO RECEBE GRAVAÇÕES PESADAS: SESSÃO SÍNCRONA x SESSÃO ASSÍNCRONA
+# USO: python -m benchmarks.event_loop_latency [--batches 40] [--batch-size 25] [--database-url sqlite:///bench.db]
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app import async_crud, crud, models
+from app.database import to_async_url
+from benchmarks.compressed_json import sample_report
+
+HEARTBEAT_INTERVAL = 0.005
+
+
+async def heartbeat(lags: list[float], stop: asyncio.Event):
+    # CADA BATIDA DEVERIA ACORDAR EM HEARTBEAT_INTERVAL; O EXCESSO É O TEMPO EM QUE O LOOP FICOU BLOQUEADO
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append((time.perf_counter() - start - HEARTBEAT_INTERVAL) * 1000)
+
+
+def make_batches(batches: int, batch_size: int, document_id: int, offset: int) -> list[list[dict]]:
+    return [
+        [
+            {
+                "job_id": None,
+                "document_id": document_id,
+                "analysis_data": sample_report(offset + batch * batch_size + index),
+                "unique_id": offset + batch * batch_size + index,
+                "analytics_id": offset + batch * batch_size + index,
+            }
+            for index in range(batch_size)
+        ]
+        for batch in range(batches)
+    ]
+
+
+async def run_sync_writes(Session, batches: list[list[dict]]):
+    for batch in batches:
+        with Session() as db:
+            crud.persist_analysis_batch(db, batch, [])
+        await asyncio.sleep(0)
+
+
+async def run_async_writes(AsyncSession, batches: list[list[dict]]):
+    for batch in batches:
+        async with AsyncSession() as db:
+            await async_crud.persist_analysis_batch(db, batch, [])
+
+
+async def measure(name: str, writes) -> dict:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await writes
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    lags.sort()
+    return {
+        "name": name,
+        "write_s": elapsed,
+        "p50": statistics.median(lags),
+        "p99": lags[int(0.99 * (len(lags) - 1))],
+        "max": lags[-1],
+        "beats": len(lags),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(database_url)
+    async_engine = create_async_engine(to_async_url(database_url))
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+    with Session() as db:
+        document = models.MonitoredDocument(document="00000000000000", is_active=True)
+        db.add(document)
+        db.commit()
+        document_id = document.id
+
+    total = args.batches * args.batch_size
+    print(f"{total} ANÁLISES EM {args.batches} LOTES POR MODO, EM {engine.url.render_as_string(hide_password=True)}")
+    results = [
+        await measure("sync", run_sync_writes(Session, make_batches(args.batches, args.batch_size, document_id, 0))),
+        await measure("async", run_async_writes(AsyncSession, make_batches(args.batches, args.batch_size, document_id, total))),
+    ]
+    for result in results:
+        print(
+            f"   {result['name']:5s} gravação={result['write_s']:6.2f}s  atraso do loop: "
+            f"p50={result['p50']:6.2f}ms  p99={result['p99']:7.2f}ms  max={result['max']:7.2f}ms  ({result['beats']} batidas)"
+        )
+    await async_engine.dispose()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
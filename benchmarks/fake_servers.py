@@ -0,0 +1,209 @@
+# SERVIDORES LOCAIS QUE IMITAM A TRATUM E A API DE CHAT COMPLETIONS DA OPENAI, PARA MEDIR O PIPELINE SEM GASTAR CRÉDITOS.
+# CADA SERVIDOR RODA EM UM PROCESSO PRÓPRIO (uvicorn), ASSIM A LATÊNCIA E A MEMÓRIA DELES NÃO CONTAMINAM A MEDIÇÃO.
+import asyncio
+import json
+import multiprocessing
+import random
+import socket
+import time
+from dataclasses import asdict, dataclass
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+BENCH_TOKEN = "bench-token"
+
+
+@dataclass
+class TratumFakeConfig:
+    latency: float = 0.05
+    error_rate: float = 0.0
+    done_after: float = 1.0
+    history_items: int = 250
+    debt_items: int = 120
+    item_padding: int = 64
+    change_rate: float = 0.3
+    seed: int = 7
+
+
+@dataclass
+class OpenAIFakeConfig:
+    latency: float = 1.5
+    error_rate: float = 0.0
+    completion_tokens: int = 300
+
+
+async def _simulate_network(latency: float, error_rate: float, rng: random.Random) -> JSONResponse | None:
+    await asyncio.sleep(latency * rng.uniform(0.5, 1.5))
+    if rng.random() < error_rate:
+        return JSONResponse({"message": "Serviço temporariamente indisponível"}, status_code=503, headers={"Retry-After": "1"})
+    return None
+
+
+def _page(items: list, request: Request) -> tuple[list, int]:
+    page = int(request.query_params.get("page", 1))
+    size = int(request.query_params.get("size", 100))
+    return items[(page - 1) * size:page * size], max(-(-len(items) // size), 1)
+
+
+def build_tratum_app(config: TratumFakeConfig) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(config.seed)
+    # analytics_id -> (DOCUMENTO, INSTANTE DA SOLICITAÇÃO, VERSÃO DO CONTEÚDO). A CADA NOVA ANÁLISE DE UM DOCUMENTO,
+    # A VERSÃO AVANÇA COM PROBABILIDADE change_rate: É A FRAÇÃO DE DOCUMENTOS COM MUDANÇA MATERIAL ENTRE CICLOS
+    analyses: dict[int, tuple[str, float, int]] = {}
+    versions: dict[str, int] = {}
+    next_id = iter(range(1_000_000, 10_000_000, 2))
+    padding = "x" * config.item_padding
+
+    @app.middleware("http")
+    async def network(request: Request, call_next):
+        if request.url.path != "/v1/login":
+            if request.headers.get("authorization") != f"Bearer {BENCH_TOKEN}":
+                return JSONResponse({"message": "Token inválido"}, status_code=401)
+            failure = await _simulate_network(config.latency, config.error_rate, rng)
+            if failure is not None:
+                return failure
+        return await call_next(request)
+
+    def document_of(analytics_id: int) -> tuple[str, int]:
+        document, _, version = analyses.get(analytics_id, ("00000000000000", 0.0, 0))
+        return document, version
+
+    def history(analytics_id: int) -> list[dict]:
+        document, version = document_of(analytics_id)
+        count = config.history_items + version
+        return [{"event": f"Alteração cadastral {index} de {document}", "detail": padding, "eventDate": f"2024-{index % 12 + 1:02d}-01"} for index in range(count)]
+
+    def debts(analytics_id: int) -> list[dict]:
+        document, version = document_of(analytics_id)
+        local = random.Random(document)
+        items = [
+            {"inscricao": f"{document}-{index}", "valorConsolidado": round(local.random() * 10**5, 2), "situacao": "ATIVA", "detail": padding}
+            for index in range(config.debt_items)
+        ]
+        items += [
+            {"inscricao": f"{document}-novo-{index}", "valorConsolidado": 12345.67, "situacao": "ATIVA", "detail": padding}
+            for index in range(version)
+        ]
+        return items
+
+    @app.post("/v1/login")
+    async def login():
+        return {"token": BENCH_TOKEN}
+
+    @app.post("/v2/analytics")
+    async def initiate(request: Request):
+        document = (await request.json())["documentNumber"]
+        if document in versions and rng.random() < config.change_rate:
+            versions[document] += 1
+        versions.setdefault(document, 0)
+        analytics_id = next(next_id)
+        analyses[analytics_id] = (document, time.monotonic(), versions[document])
+        return {"result": {"userPlanConsumeAnalyticsId": analytics_id, "userPlanConsumeUniqueId": analytics_id + 1}}
+
+    @app.post("/v2/analytics/{analytics_id}")
+    async def summary(analytics_id: int):
+        document, requested_at, version = analyses.get(analytics_id, ("00000000000000", 0.0, 0))
+        done = time.monotonic() - requested_at >= config.done_after
+        local = random.Random(document)
+        return {"register": {
+            "status": "DONE" if done else "PROCESSING",
+            "document": document,
+            "lawsuitsCount": local.randint(0, 50) + version,
+            "protestCount": local.randint(0, 5),
+            "userPlanConsumeGovernmentDebtorSummaryId": analytics_id,
+        }}
+
+    base = "/v1/holder/{holder_id}/organization/{org_id}/consumeunique/{unique_id}/analytics/{analytics_id}"
+
+    @app.get(base + "/history-rfb/detail")
+    async def history_rfb(analytics_id: int, request: Request):
+        items, total_pages = _page(history(analytics_id), request)
+        return {"register": {"items": items}, "totalPages": total_pages}
+
+    @app.get(base + "/debtor/{debtor_id}/detail")
+    async def debtor(analytics_id: int, request: Request):
+        all_items = debts(analytics_id)
+        items, _ = _page(all_items, request)
+        return {"register": {"debts": items}, "totalElements": len(all_items)}
+
+    @app.get(base + "/activity-indicator/detail")
+    async def activity(analytics_id: int):
+        document, _ = document_of(analytics_id)
+        return {"register": {"faixaFaturamento": random.Random(document).choice(["ATÉ 360 MIL", "ATÉ 4,8 MI", "ACIMA DE 4,8 MI"])}}
+
+    @app.get(base + "/qsa")
+    async def qsa(analytics_id: int):
+        document, _ = document_of(analytics_id)
+        return {"result": [{"name": f"Sócio {index} de {document}", "qualification": "Sócio-Administrador"} for index in range(3)]}
+
+    @app.post("/v1/organizations/{org_id}/qsa/{document}")
+    async def relationships(document: str):
+        return {"register": {"document": document, "companies": [{"document": f"{document[:8]}000{index}"} for index in range(2)]}}
+
+    @app.get("/v1/certification/fake/{analytics_id}")
+    async def certificates(analytics_id: int):
+        return {"list": [{"name": name, "status": "NEGATIVA"} for name in ("CND Federal", "FGTS", "Trabalhista")]}
+
+    @app.get("/v1/certification/{analytics_id}")
+    async def request_certificates(analytics_id: int):
+        return {"list": []}
+
+    return app
+
+
+def build_openai_app(config: OpenAIFakeConfig) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(11)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = await _simulate_network(config.latency, config.error_rate, rng)
+        if failure is not None:
+            return failure
+        prompt_tokens = sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4
+        content = json.dumps({"resumo": "Comparação gerada pelo servidor de benchmark.", "alteracoes": [], "risco": "BAIXO"})
+        return {
+            "id": f"chatcmpl-bench-{rng.randrange(10**9)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": config.completion_tokens,
+                "total_tokens": prompt_tokens + config.completion_tokens,
+            },
+        }
+
+    return app
+
+
+def _serve(kind: str, config: dict, port: int):
+    import uvicorn
+    app = build_tratum_app(TratumFakeConfig(**config)) if kind == "tratum" else build_openai_app(OpenAIFakeConfig(**config))
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, config: TratumFakeConfig | OpenAIFakeConfig, timeout: float = 15.0) -> tuple[multiprocessing.Process, str]:
+    port = free_port()
+    process = multiprocessing.Process(target=_serve, args=(kind, asdict(config), port), daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            if not process.is_alive():
+                break
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"O servidor falso '{kind}' não subiu na porta {port}")
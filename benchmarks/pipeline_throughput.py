@@ -0,0 +1,175 @@
+# MEDE A VAZÃO DO PIPELINE REAL (TratumService, ComparisonService, crud) CONTRA SERVIDORES FALSOS LOCAIS E SQLITE.
+# O PRIMEIRO CICLO GRAVA A ANÁLISE INICIAL DE CADA DOCUMENTO; OS SEGUINTES COMPARAM COM A ANTERIOR (OPENAI FALSA).
+# USO: python -m benchmarks.pipeline_throughput [--documents 200] [--cycles 2] [--concurrency 8]
+#      [--tratum-latency 0.05] [--tratum-error-rate 0.0] [--done-after 1.0] [--history-items 250]
+#      [--openai-latency 1.5] [--change-rate 0.3] [--json]
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import tempfile
+import time
+from benchmarks.fake_servers import OpenAIFakeConfig, TratumFakeConfig, start_server
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def peak_rss_mb() -> float:
+    # NO LINUX ru_maxrss VEM EM KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def configure_environment(args, tratum_url: str, openai_url: str, database_url: str):
+    # AS CONFIGURAÇÕES SÃO LIDAS NA IMPORTAÇÃO DE app.config: PRECISAM ESTAR NO AMBIENTE ANTES DE IMPORTAR O app
+    os.environ.update({
+        "DATABASE_URL": database_url,
+        "TRATUM_BASE_URL": tratum_url,
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "ANALYSIS_CONCURRENCY": str(args.concurrency),
+        "POLL_INITIAL_INTERVAL": str(args.poll_interval),
+        "POLL_MAX_INTERVAL": str(max(args.poll_interval, args.done_after)),
+        "POLL_MAX_REQUESTS_PER_SECOND": "1000",
+        "LOG_LEVEL": args.log_level,
+    })
+    for name, value in (("DB_HOST", "bench"), ("DB_USER", "bench"), ("DB_PASSWORD", "bench"), ("DB_DATABASE", "bench"),
+                        ("TRATUM_EMAIL", "bench@example.com"), ("TRATUM_PASSWORD", "bench"), ("TRATUM_HOLDER_ID", "1"),
+                        ("TRATUM_ORGANIZATION_ID", "1"), ("TRATUM_PLAN_ID", "1")):
+        os.environ.setdefault(name, value)
+
+
+async def run_benchmark(args) -> dict:
+    from app import logs, metrics, migrations, models, persistence, pipeline, services
+    from app.database import SessionLocal, async_engine, engine
+
+    logs.configure_logging(args.log_level)
+    models.Base.metadata.create_all(bind=engine)
+    migrations.run_migrations(engine)
+    with SessionLocal() as db:
+        db.add_all(models.MonitoredDocument(document=f"{10**13 + index:014d}", is_active=True) for index in range(args.documents))
+        db.commit()
+        documents = [(doc.id, doc.document) for doc in db.query(models.MonitoredDocument).order_by(models.MonitoredDocument.id)]
+
+    # AMOSTRAS BRUTAS POR ETAPA (O HISTOGRAMA DO /metrics SÓ GUARDA BUCKETS)
+    samples: dict[str, list[float]] = {}
+    observe = metrics.STAGE_SECONDS.observe
+
+    def record(value: float, **labels):
+        samples.setdefault(labels["stage"], []).append(value)
+        observe(value, **labels)
+
+    metrics.STAGE_SECONDS.observe = record
+
+    tratum_service = services.TratumService()
+    comparison_service = services.ComparisonService()
+    writer = persistence.AnalysisWriter()
+    analysis_pipeline = pipeline.AnalysisPipeline(tratum_service, comparison_service, concurrency=args.concurrency, writer=writer)
+    await tratum_service.start()
+    await writer.start()
+    await analysis_pipeline.leases.start()
+    cycles = []
+    try:
+        for cycle in range(1, args.cycles + 1):
+            samples.clear()
+            compared_before = dict(comparison_service.stats)
+            start = time.monotonic()
+            stats = await analysis_pipeline.run(documents, label=f"BENCH CICLO {cycle}")
+            elapsed = time.monotonic() - start
+            cycles.append({
+                "cycle": cycle,
+                "documents": len(documents),
+                "processed": stats["processed"],
+                "skipped": stats["skipped"],
+                "failed": stats["failed"],
+                "elapsed_seconds": round(elapsed, 2),
+                "docs_per_minute": round(len(documents) / (elapsed / 60), 1) if elapsed > 0 else 0.0,
+                "comparisons": {key: value - compared_before.get(key, 0) for key, value in comparison_service.stats.items()},
+                "stages": {
+                    stage: {
+                        "count": len(values),
+                        "p50_ms": round(statistics.median(values) * 1000, 1),
+                        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                    }
+                    for stage, values in sorted(samples.items())
+                },
+            })
+    finally:
+        await writer.stop()
+        await analysis_pipeline.leases.close()
+        await tratum_service.close()
+        await async_engine.dispose()
+        engine.dispose()
+        metrics.STAGE_SECONDS.observe = observe
+        logs.shutdown_logging()
+    return {
+        "cycles": cycles,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "tratum_requests": tratum_service.connection_stats()["requests"],
+    }
+
+
+def print_report(report: dict, args):
+    print(
+        f"{args.documents} DOCUMENTOS, CONCORRÊNCIA {args.concurrency}, LATÊNCIA TRATUM {args.tratum_latency * 1000:.0f}ms "
+        f"(ERRO {args.tratum_error_rate:.0%}), DONE APÓS {args.done_after}s, OPENAI {args.openai_latency * 1000:.0f}ms"
+    )
+    for cycle in report["cycles"]:
+        print(
+            f"   CICLO {cycle['cycle']}: {cycle['docs_per_minute']:8.1f} docs/min em {cycle['elapsed_seconds']:7.2f}s  "
+            f"({cycle['processed']} processados, {cycle['skipped']} pulados, {cycle['failed']} com erro)  comparações: {cycle['comparisons']}"
+        )
+        for stage, values in cycle["stages"].items():
+            print(f"      {stage:13s} n={values['count']:5d}  p50={values['p50_ms']:9.1f}ms  p99={values['p99_ms']:9.1f}ms")
+    print(f"   PICO DE MEMÓRIA (RSS): {report['peak_rss_mb']} MB  |  REQUISIÇÕES À TRATUM: {report['tratum_requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tratum-latency", type=float, default=0.05)
+    parser.add_argument("--tratum-error-rate", type=float, default=0.0)
+    parser.add_argument("--done-after", type=float, default=1.0)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--history-items", type=int, default=250)
+    parser.add_argument("--debt-items", type=int, default=120)
+    parser.add_argument("--item-padding", type=int, default=64)
+    parser.add_argument("--change-rate", type=float, default=0.3)
+    parser.add_argument("--openai-latency", type=float, default=1.5)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args()
+
+    tratum_process, tratum_url = start_server("tratum", TratumFakeConfig(
+        latency=args.tratum_latency,
+        error_rate=args.tratum_error_rate,
+        done_after=args.done_after,
+        history_items=args.history_items,
+        debt_items=args.debt_items,
+        item_padding=args.item_padding,
+        change_rate=args.change_rate,
+    ))
+    openai_process, openai_url = start_server("openai", OpenAIFakeConfig(latency=args.openai_latency, error_rate=args.openai_error_rate))
+    try:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        configure_environment(args, tratum_url, openai_url, database_url)
+        report = asyncio.run(run_benchmark(args))
+    finally:
+        tratum_process.terminate()
+        openai_process.terminate()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report, args)
+
+
+if __name__ == "__main__":
+    main()
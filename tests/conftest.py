@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+# AS CONFIGURAÇÕES OBRIGATÓRIAS PRECISAM EXISTIR ANTES DE IMPORTAR O app
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("DB_DATABASE", "test")
+os.environ.setdefault("TRATUM_EMAIL", "test@example.com")
+os.environ.setdefault("TRATUM_PASSWORD", "test")
+os.environ.setdefault("TRATUM_HOLDER_ID", "1")
+os.environ.setdefault("TRATUM_ORGANIZATION_ID", "1")
+os.environ.setdefault("TRATUM_PLAN_ID", "1")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# SEMPRE SOBRESCRITOS (INCLUSIVE O QUE VIER DO .env): O FIXTURE db APAGA AS TABELAS AO FINAL DE CADA TESTE
+_TEST_DATABASE = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TEST_DATABASE}"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_TEST_DATABASE}"
+
+import pytest  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
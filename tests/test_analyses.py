@@ -0,0 +1,40 @@
+from app import crud, models
+
+
+def _item(analytics_id, unique_id):
+    return {"document_id": 1, "analysis_data": {"qsa": [unique_id]}, "unique_id": unique_id, "analytics_id": analytics_id}
+
+
+def _rows(db):
+    return [(row.id, row.analytics_id, row.unique_id) for row in db.query(models.Analysis).order_by(models.Analysis.id)]
+
+
+def _document(db):
+    db.add(models.MonitoredDocument(id=1, document="00000000000001"))
+    db.commit()
+
+
+def test_upsert_updates_existing_analytics_id_and_inserts_rows_without_it(db):
+    _document(db)
+    first = crud.upsert_analyses(db, [_item(10, 1), _item(None, 2)])
+    second = crud.upsert_analyses(db, [_item(None, 3), _item(10, 4)])
+    db.commit()
+    assert second[1] == first[0]
+    assert len(set(first + second)) == 3
+    assert _rows(db) == [(first[0], 10, 4), (first[1], None, 2), (second[0], None, 3)]
+
+
+def test_upsert_fallback_for_dialects_without_native_upsert(db, monkeypatch):
+    _document(db)
+    existing = crud.upsert_analyses(db, [_item(10, 1)])[0]
+    monkeypatch.setattr(crud, "UPSERT_DIALECTS", ())
+    ids = crud.upsert_analyses(db, [_item(10, 2), _item(11, 3), _item(11, 4)])
+    db.commit()
+    assert ids[0] == existing
+    assert ids[1] == ids[2]
+    assert _rows(db) == [(existing, 10, 2), (ids[1], 11, 4)]
+
+
+def test_create_analysis_returns_assembled_report(db):
+    _document(db)
+    assert crud.create_analysis(db, 1, {"qsa": [1]}, 1, None).analysis_json == {"qsa": [1]}
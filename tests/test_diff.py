@@ -0,0 +1,26 @@
+from app.diff import diff_reports, is_volatile_key
+
+
+def _report(**debt):
+    return {"divida_ativa": {"debts": [{"value": 1500.0, "dueDate": "2024-05-10", "creditorId": 7, **debt}]}}
+
+
+def test_volatile_only_change_is_not_material():
+    old = {**_report(), "summary": {"status": "DONE", "updatedAt": "2024-06-01T10:00:00", "userPlanConsumeAnalyticsId": 1}}
+    new = {**_report(), "summary": {"status": "DONE", "updatedAt": "2024-07-01T10:00:00", "userPlanConsumeAnalyticsId": 2}}
+    assert not diff_reports(old, new).has_material_changes
+
+
+def test_changed_due_date_is_material():
+    result = diff_reports(_report(), _report(dueDate="2024-08-10"))
+    assert result.has_material_changes
+    assert result.changed_sections == ["divida_ativa"]
+
+
+def test_changed_creditor_is_material():
+    assert diff_reports(_report(), _report(creditorId=8)).has_material_changes
+
+
+def test_business_fields_with_id_or_date_suffix_are_not_volatile():
+    for key in ("dueDate", "protestDate", "debtDate", "contractId", "creditorId", "settledAt"):
+        assert not is_volatile_key(key)
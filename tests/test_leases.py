@@ -0,0 +1,60 @@
+import datetime
+from app import crud, models
+
+NOW = datetime.datetime(2024, 3, 15, 12, 0)
+TTL = datetime.timedelta(minutes=5)
+
+
+def _documents(db, ids):
+    for document_id in ids:
+        db.add(models.MonitoredDocument(id=document_id, document=f"{document_id:014d}"))
+    db.commit()
+
+
+def _lease(db, document_id, owner, expires_at):
+    db.add(models.DocumentLease(document_id=document_id, owner=owner, expires_at=expires_at))
+    db.commit()
+
+
+def test_claim_creates_missing_leases(db):
+    _documents(db, [1, 2])
+    assert crud.claim_document_leases(db, [1, 2], "a", NOW, NOW + TTL) == {1, 2}
+
+
+def test_claim_takes_over_expired_lease(db):
+    _documents(db, [1])
+    _lease(db, 1, "b", NOW - datetime.timedelta(seconds=1))
+    assert crud.claim_document_leases(db, [1], "a", NOW, NOW + TTL) == {1}
+    db.expire_all()
+    assert db.get(models.DocumentLease, 1).owner == "a"
+
+
+def test_claim_does_not_take_live_lease_of_another_owner(db):
+    _documents(db, [1, 2])
+    _lease(db, 1, "b", NOW + TTL)
+    assert crud.claim_document_leases(db, [1, 2], "a", NOW, NOW + TTL) == {2}
+    db.expire_all()
+    assert db.get(models.DocumentLease, 1).owner == "b"
+
+
+def test_claim_extends_own_live_lease(db):
+    _documents(db, [1])
+    _lease(db, 1, "a", NOW + datetime.timedelta(seconds=10))
+    assert crud.claim_document_leases(db, [1], "a", NOW, NOW + TTL) == {1}
+    db.expire_all()
+    assert db.get(models.DocumentLease, 1).expires_at == NOW + TTL
+
+
+def test_renew_returns_only_leases_still_owned(db):
+    _documents(db, [1, 2])
+    _lease(db, 1, "a", NOW)
+    _lease(db, 2, "b", NOW + TTL)
+    assert crud.renew_document_leases(db, [1, 2], "a", NOW + TTL) == {1}
+
+
+def test_release_only_removes_own_leases(db):
+    _documents(db, [1, 2])
+    _lease(db, 1, "a", NOW + TTL)
+    _lease(db, 2, "b", NOW + TTL)
+    assert crud.release_document_leases(db, [1, 2], "a") == 1
+    assert db.get(models.DocumentLease, 2) is not None
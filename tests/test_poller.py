@@ -0,0 +1,38 @@
+from app.poller import AnalysisPoller
+
+
+async def _fetch_summary(analytics_id, consume_unique_id):
+    return None
+
+
+def _poller(rate: float) -> AnalysisPoller:
+    return AnalysisPoller(_fetch_summary, max_requests_per_second=rate)
+
+
+def _advance(poller: AnalysisPoller, seconds: float):
+    poller._budget_updated_at -= seconds
+
+
+def test_take_budget_grants_up_to_rate():
+    poller = _poller(5)
+    assert poller._take_budget(10) == 5
+    assert poller._take_budget(10) == 0
+    _advance(poller, 0.4)
+    assert poller._take_budget(10) == 2
+
+
+def test_take_budget_does_not_accumulate_beyond_one_second():
+    poller = _poller(5)
+    poller._take_budget(5)
+    _advance(poller, 60)
+    assert poller._take_budget(100) == 5
+
+
+def test_take_budget_below_one_request_per_second():
+    poller = _poller(0.5)
+    assert poller._take_budget(3) == 1
+    assert poller._take_budget(3) == 0
+    _advance(poller, 1)
+    assert poller._take_budget(3) == 0
+    _advance(poller, 1)
+    assert poller._take_budget(3) == 1
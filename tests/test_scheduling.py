@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+from app import models
+from app.config import settings
+from app.scheduling import CadenceScheduler, cadence_period, local_now, next_slot, retry_slot
+
+NOW = datetime.datetime(2024, 3, 15, 12, 0)
+
+
+def test_next_slot_is_after_reference_and_within_one_period():
+    for document_id in range(1, 200):
+        slot = next_slot(document_id, 7, NOW)
+        assert NOW < slot <= NOW + datetime.timedelta(days=7)
+
+
+def test_next_slot_is_stable_inside_the_period():
+    slot = next_slot(42, 7, NOW)
+    assert next_slot(42, 7, NOW + datetime.timedelta(days=1)) == slot
+    assert next_slot(42, 7, slot) == slot + datetime.timedelta(days=7)
+
+
+def test_next_slot_spreads_documents_over_the_window():
+    days = {next_slot(document_id, 7, NOW).date() for document_id in range(1, 100)}
+    assert len(days) >= 7
+
+
+def test_next_slot_uses_default_cadence():
+    assert cadence_period(None) == datetime.timedelta(days=settings.SCHEDULER_DEFAULT_CADENCE_DAYS)
+    assert next_slot(5, None, NOW) == next_slot(5, settings.SCHEDULER_DEFAULT_CADENCE_DAYS, NOW)
+
+
+def test_next_slot_respects_window(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_WINDOW_HOURS", 6)
+    for document_id in range(1, 100):
+        slot = next_slot(document_id, 1, NOW)
+        assert slot.hour < 6
+
+
+def test_retry_slot_is_short():
+    regular = NOW + datetime.timedelta(days=30)
+    assert retry_slot(regular, NOW) == NOW + datetime.timedelta(minutes=settings.SCHEDULER_RETRY_MINUTES)
+
+
+def test_retry_slot_is_capped_at_next_regular_slot():
+    regular = NOW + datetime.timedelta(minutes=1)
+    assert retry_slot(regular, NOW) == regular
+
+
+class FakePipeline:
+    def __init__(self, db, stages: dict[int, str]):
+        self.db = db
+        self.stages = stages
+        self.runs: list[list[int]] = []
+
+    async def run(self, documents, label):
+        ids = [document_id for document_id, _ in documents]
+        self.runs.append(ids)
+        for document_id in ids:
+            if document_id in self.stages:
+                self.db.add(models.AnalysisJob(document_id=document_id, stage=self.stages[document_id]))
+        self.db.commit()
+        return {"processed": 0, "skipped": 0, "failed": 0}
+
+
+def _due_documents(db, ids):
+    overdue = local_now() - datetime.timedelta(hours=1)
+    for document_id in ids:
+        db.add(models.MonitoredDocument(id=document_id, document=f"{document_id:014d}", cadence_days=30, next_run_at=overdue))
+    db.commit()
+
+
+def _minutes_until_next_run(db, document_id):
+    db.expire_all()
+    return (db.get(models.MonitoredDocument, document_id).next_run_at - local_now()).total_seconds() / 60
+
+
+def test_tick_retries_documents_without_a_live_job(db):
+    _due_documents(db, [1, 2, 3])
+    pipeline = FakePipeline(db, {1: models.JobStage.COMPARED, 2: models.JobStage.FAILED})
+    stats = asyncio.run(CadenceScheduler(pipeline).tick())
+    assert pipeline.runs == [[1, 2, 3]]
+    assert stats["retries"] == 2
+    assert _minutes_until_next_run(db, 1) > settings.SCHEDULER_RETRY_MINUTES
+    for document_id in (2, 3):
+        assert _minutes_until_next_run(db, document_id) <= settings.SCHEDULER_RETRY_MINUTES
+
+
+def test_tick_skips_documents_already_analyzed_in_the_period(db):
+    _due_documents(db, [1, 2])
+    db.add(models.AnalysisJob(document_id=1, stage=models.JobStage.POLLING))
+    db.commit()
+    pipeline = FakePipeline(db, {2: models.JobStage.COMPARED})
+    stats = asyncio.run(CadenceScheduler(pipeline).tick())
+    assert pipeline.runs == [[2]]
+    assert stats["already_analyzed"] == 1
+    assert stats["retries"] == 0
+
+
+def test_tick_stops_retrying_after_too_many_failures(db, monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_MAX_FAILED_PER_PERIOD", 1)
+    _due_documents(db, [1])
+    stats = asyncio.run(CadenceScheduler(FakePipeline(db, {1: models.JobStage.FAILED})).tick())
+    assert stats["retries"] == 0
+    assert _minutes_until_next_run(db, 1) > settings.SCHEDULER_RETRY_MINUTES
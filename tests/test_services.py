@@ -0,0 +1,22 @@
+from app.services import TratumService
+
+
+def test_total_pages_from_explicit_page_count():
+    assert TratumService._total_pages({"totalPages": 4, "register": {"items": []}}, 100) == 4
+
+
+def test_total_pages_from_item_count():
+    assert TratumService._total_pages({"totalElements": 250}, 100) == 3
+    assert TratumService._total_pages({"totalRecords": 100}, 100) == 1
+
+
+def test_total_pages_ignores_amounts_and_register():
+    assert TratumService._total_pages({"register": {"total": 15000}}, 100) == 1
+    assert TratumService._total_pages({"total": 15000}, 100) == 1
+    assert TratumService._total_pages({"register": {"totalPages": 9}}, 100) == 1
+
+
+def test_total_pages_defaults_to_one_page():
+    assert TratumService._total_pages({}, 100) == 1
+    assert TratumService._total_pages({"totalPages": 0}, 100) == 1
+    assert TratumService._total_pages({"totalPages": True}, 100) == 1